@@ -0,0 +1,84 @@
+"""
+Benchmark - Parser do comando `status`
+Author: adamguedesmtm
+Created: 2025-02-25 15:22:09
+
+Compara o parser de passada única (`parse_status`) com o parsing antigo
+do RCONManager, que percorria a mesma resposta duas vezes (get_status e
+get_player_list). Os dois montam o status e a lista de jogadores em
+dicts. Os dumps ficam em benchmarks/dumps/.
+
+O parsing antigo só reconhecia linhas de jogador começando com `#`
+(CS:GO), então no dump do CS2 ele devolve a lista vazia: a coluna
+`jogadores` mostra quantos cada um encontrou.
+
+Uso: python benchmarks/bench_status_parser.py [iterações]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR.parent / "src" / "bot"))
+
+from utils.server_status import parse_status  # noqa: E402
+
+
+def legacy_parse(response: str):
+    """Parsing antigo: get_status + get_player_list sobre a mesma resposta"""
+    status = {}
+    for line in response.split("\n"):
+        try:
+            if "udp/ip" in line.lower():
+                parts = line.split()
+                status["ip"] = parts[1]
+                status["port"] = int(parts[2].split('/')[0])
+            elif "map" in line.lower():
+                status["map"] = line.split(":")[1].strip()
+            elif "players" in line.lower():
+                status["players_online"] = int(line.split(":")[1].split("/")[0].strip())
+        except (IndexError, ValueError):
+            pass
+
+    players = []
+    for line in response.split("\n"):
+        if line.startswith("#"):
+            parts = line.split()
+            if len(parts) >= 6:
+                players.append({
+                    "index": parts[0],
+                    "steam_id": parts[1],
+                    "name": " ".join(parts[2:-3]),
+                    "ping": parts[-3],
+                    "loss": parts[-2],
+                    "state": parts[-1]
+                })
+
+    return status, players
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    for dump in sorted((BASE_DIR / "dumps").glob("*.txt")):
+        response = dump.read_text()
+        legacy_players = len(legacy_parse(response)[1])
+        players = len(parse_status(response)['players'])
+
+        # Melhor de 5 rodadas de cada, alternadas: ruído da máquina não
+        # pesa só para um lado
+        legacy = single = float('inf')
+        for _ in range(5):
+            legacy = min(legacy, timeit.timeit(lambda: legacy_parse(response), number=iterations))
+            single = min(single, timeit.timeit(lambda: parse_status(response), number=iterations))
+
+        print(
+            f"{dump.name:<20} jogadores={legacy_players}/{players:<3} "
+            f"antigo={legacy / iterations * 1e6:8.1f}us "
+            f"novo={single / iterations * 1e6:8.1f}us ({legacy / single:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ Created: 2025-02-21 14:18:04
 import discord
 from discord.ext import commands
 from typing import Optional
+from utils.tracing import TRACER
 
 class Admin(commands.Cog):
     def __init__(self, bot):
@@ -85,5 +86,65 @@ class Admin(commands.Cog):
             self.bot.logger.error(f"Erro ao definir role: {e}")
             await ctx.send("❌ Ocorreu um erro ao definir role!")
 
+    @commands.command(name="tracing")
+    @commands.has_permissions(administrator=True)
+    async def tracing(self, ctx, state: str):
+        """Ligar/desligar tracing dos hot paths (on/off/clear)"""
+        try:
+            state = state.lower()
+            if state == "on":
+                TRACER.configure(enabled=True)
+                await ctx.send("✅ Tracing ligado!")
+            elif state == "off":
+                TRACER.configure(enabled=False)
+                await ctx.send("✅ Tracing desligado!")
+            elif state == "clear":
+                TRACER.clear()
+                await ctx.send("✅ Spans descartados!")
+            else:
+                await ctx.send("❌ Use: on, off ou clear")
+
+        except Exception as e:
+            self.bot.logger.error(f"Erro ao configurar tracing: {e}")
+            await ctx.send("❌ Ocorreu um erro ao configurar tracing!")
+
+    @commands.command(name="slowcalls")
+    @commands.has_permissions(administrator=True)
+    async def slow_calls(self, ctx, limit: int = 10):
+        """Mostrar as chamadas recentes mais lentas"""
+        try:
+            spans = TRACER.slowest(min(max(limit, 1), 25))
+            if not spans:
+                status = "ligado" if TRACER.enabled else "desligado (use `!tracing on`)"
+                await ctx.send(f"❌ Nenhum span registrado. Tracing {status}")
+                return
+
+            embed = discord.Embed(
+                title="🐢 Chamadas mais lentas",
+                color=discord.Color.orange()
+            )
+
+            for span in spans:
+                details = f"<t:{int(span['started_at'])}:R>"
+                if span['parent']:
+                    details += f"\nDentro de: {span['parent']}"
+                if span['error']:
+                    details += f"\nErro: {span['error']}"
+                embed.add_field(
+                    name=f"{span['duration'] * 1000:.1f}ms · {span['name']}",
+                    value=details,
+                    inline=False
+                )
+
+            summary = TRACER.summary()
+            embed.set_footer(
+                text=f"{len(TRACER.spans)} spans recentes de {len(summary)} funções"
+            )
+            await ctx.send(embed=embed)
+
+        except Exception as e:
+            self.bot.logger.error(f"Erro ao listar chamadas lentas: {e}")
+            await ctx.send("❌ Ocorreu um erro ao listar chamadas lentas!")
+
 async def setup(bot):
     await bot.add_cog(Admin(bot))
\ No newline at end of file
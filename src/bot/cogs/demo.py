@@ -5,9 +5,11 @@ Created: 2025-02-21 14:18:04
 """
 
 import discord
-from discord.ext import commands, tasks
+import io
+from discord.ext import commands
 from typing import Optional
-from ..utils.demo_manager import DemoManager
+from ..utils.demo_manager import DemoManager, PRIORITY_BACKFILL, PRIORITY_LIVE
+from ..utils.heatmap import LAYERS, SIDES
 
 class Demo(commands.Cog):
     def __init__(self, bot):
@@ -15,28 +17,30 @@ class Demo(commands.Cog):
         self.demo_manager = DemoManager(
             logger=bot.logger,
             metrics=bot.metrics,
-            stats_manager=bot.stats_manager
+            stats_manager=bot.stats_manager,
+            db=bot.db,
+            workers=bot.config.get("demos.workers", 2),
+            demo_timeout=bot.config.get("demos.timeout", 900.0),
+            lease_seconds=bot.config.get("demos.lease", 60.0),
+            max_attempts=bot.config.get("demos.max_attempts", 3)
         )
-        
-        # Iniciar processador de demos
-        self.start_processor.start()
 
-    def cog_unload(self):
-        self.start_processor.cancel()
-
-    @tasks.loop(seconds=1)
-    async def start_processor(self):
-        """Iniciar processador de demos"""
+    async def cog_load(self):
+        # Iniciar workers de processamento de demos
         await self.demo_manager.start_processor()
 
+    async def cog_unload(self):
+        await self.demo_manager.stop_processor()
+
     @commands.command(name="demo")
     @commands.has_permissions(administrator=True)
-    async def process_demo(self, ctx, match_id: str):
-        """Processar demo manualmente"""
+    async def process_demo(self, ctx, match_id: str, backfill: bool = False):
+        """Processar demo manualmente (backfill: atrás das partidas ao vivo)"""
         try:
             success = await self.demo_manager.queue_demo(
                 match_id,
-                f"/opt/cs2server/demos/{match_id}.dem"
+                f"/opt/cs2server/demos/{match_id}.dem",
+                priority=PRIORITY_BACKFILL if backfill else PRIORITY_LIVE
             )
             
             if success:
@@ -48,11 +52,26 @@ class Demo(commands.Cog):
             self.bot.logger.error(f"Erro ao processar demo: {e}")
             await ctx.send("❌ Ocorreu um erro ao processar demo!")
 
+    @commands.command(name="democancel")
+    @commands.has_permissions(administrator=True)
+    async def cancel_demo(self, ctx, match_id: str):
+        """Cancelar processamento de uma demo"""
+        try:
+            if await self.demo_manager.cancel_demo(match_id):
+                await ctx.send(f"✅ Processamento da demo {match_id} cancelado!")
+            else:
+                await ctx.send(f"❌ Demo {match_id} não está na fila!")
+
+        except Exception as e:
+            self.bot.logger.error(f"Erro ao cancelar demo: {e}")
+            await ctx.send("❌ Ocorreu um erro ao cancelar demo!")
+
     @commands.command(name="demostatus")
     async def demo_status(self, ctx):
         """Ver status do processamento de demos"""
         try:
-            queue_size = self.demo_manager.processing_queue.qsize()
+            status = await self.demo_manager.get_queue_status()
+            counts = status['counts']
             is_processing = self.demo_manager.is_processing
 
             embed = discord.Embed(
@@ -68,15 +87,73 @@ class Demo(commands.Cog):
             
             embed.add_field(
                 name="Demos na Fila",
-                value=str(queue_size),
+                value=str(counts['queued']),
+                inline=True
+            )
+
+            embed.add_field(
+                name="Concluídas / Falhas",
+                value=f"{counts['done']} / {counts['failed']}",
                 inline=True
             )
 
+            # Jobs em andamento em qualquer processo (lease ativo)
+            running = [
+                f"{job['match_id']} (tentativa {job['attempts']}/{job['max_attempts']})"
+                for job in status['running']
+            ]
+            embed.add_field(
+                name=f"Em Processamento ({counts['running']}, {self.demo_manager.workers} workers)",
+                value="\n".join(running) or "Nenhuma",
+                inline=False
+            )
+
+            if status['failed']:
+                embed.add_field(
+                    name="Últimas Falhas",
+                    value="\n".join(
+                        f"{job['match_id']}: {(job['last_error'] or '?')[:80]}"
+                        for job in status['failed']
+                    ),
+                    inline=False
+                )
+
             await ctx.send(embed=embed)
 
         except Exception as e:
             self.bot.logger.error(f"Erro ao mostrar status de demos: {e}")
             await ctx.send("❌ Ocorreu um erro ao verificar status!")
 
+    @commands.command(name="heatmap")
+    async def heatmap(self, ctx, map_name: str, layer: str = "kills", side: str = "all", last: int = 0):
+        """Heatmap de um mapa somando as partidas (últimas N; 0 = todas)"""
+        try:
+            side = side.upper()
+            if layer not in LAYERS or side not in SIDES + ('ALL',) or last < 0:
+                await ctx.send(
+                    f"❌ Uso: !heatmap <mapa> [{'|'.join(LAYERS)}] [CT|T|all] [últimas N]"
+                )
+                return
+
+            result = await self.demo_manager.heatmaps.render(
+                map_name,
+                layer,
+                side=None if side == 'ALL' else side,
+                last=last or None
+            )
+            if not result:
+                await ctx.send(f"❌ Nenhum heatmap registrado para {map_name}!")
+                return
+
+            image, matches = result
+            await ctx.send(
+                f"🔥 {map_name} - {layer} ({side}) em {matches} partidas",
+                file=discord.File(io.BytesIO(image), f"heatmap_{map_name}_{layer}.png")
+            )
+
+        except Exception as e:
+            self.bot.logger.error(f"Erro ao mostrar heatmap: {e}")
+            await ctx.send("❌ Ocorreu um erro ao gerar heatmap!")
+
 async def setup(bot):
     await bot.add_cog(Demo(bot))
\ No newline at end of file
@@ -108,7 +108,7 @@ class EloCog(commands.Cog):
         
         try:
             # Buscar top players
-            top_players = self.bot.metrics.get_top_players(page)
+            top_players = self.bot.metrics.get_top_players(page=page)
             
             if not top_players:
                 await interaction.followup.send("❌ Nenhum jogador encontrado")
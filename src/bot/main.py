@@ -4,6 +4,12 @@ Author: adamguedesmtm
 Created: 2025-02-21 15:58:46
 """
 import os
+import sys
+from pathlib import Path
+
+# src/ no path: os utils importam módulos compartilhados como `shared.*`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 import discord
 from discord.ext import commands
 from utils.config_manager import ConfigManager
@@ -20,9 +26,9 @@ from utils.elo_manager import EloManager
 from utils.role_system import RoleSystem
 from utils.channel_manager import ChannelManager
 from utils.stats_manager import StatsManager
-from utils.rcon_manager import RCONManager
+from utils.rcon_pool import RCONPool
 from utils.steam_manager import SteamManager
-from pathlib import Path
+from utils.tracing import TRACER
 import asyncio
 
 class CS2Bot(commands.Bot):
@@ -45,33 +51,65 @@ class CS2Bot(commands.Bot):
         # Managers principais
         self.config = ConfigManager()
         self.logger = Logger("cs2bot")
+        TRACER.configure(
+            enabled=self.config.get("tracing.enabled", False),
+            capacity=self.config.get("tracing.capacity", 500)
+        )
         self.db = DatabaseManager(self.config.get("database"), logger=self.logger)
-        self.metrics = MetricsManager(data_dir=str(self.data_dir), logger=self.logger)
+        self.metrics = MetricsManager(
+            data_dir=str(self.data_dir),
+            logger=self.logger,
+            flush_interval=self.config.get("metrics.flush_interval", 5.0),
+            flush_threshold=self.config.get("metrics.flush_threshold", 100)
+        )
         self.server_manager = ServerManager(logger=self.logger)
-        self.stats_manager = StatsManager(self.db, logger=self.logger, metrics=self.metrics)
+        self.stats_manager = StatsManager(
+            self.db,
+            logger=self.logger,
+            metrics=self.metrics,
+            leaderboard_ttl=self.config.get("stats.leaderboard_ttl", 30.0)
+        )
         self.role_system = RoleSystem(self.stats_manager, logger=self.logger, metrics=self.metrics)
         self.channel_manager = ChannelManager(self, logger=self.logger)
 
+        # Pool RCON compartilhado (uma conexão por servidor)
+        self.rcon_pool = RCONPool(
+            logger=self.logger,
+            timeout=self.config.get("rcon.timeout", 5.0),
+            keepalive_interval=self.config.get("rcon.keepalive_interval", 30.0),
+            backoff_base=self.config.get("rcon.backoff_base", 1.0),
+            backoff_max=self.config.get("rcon.backoff_max", 60.0),
+            status_interval=self.config.get("rcon.status_interval", 10.0),
+            status_ttl=self.config.get("rcon.status_ttl", 10.0)
+        )
+
         # Game managers
         self.queue = QueueManager(logger=self.logger, metrics=self.metrics)
-        self.matchzy = MatchzyManager(logger=self.logger, metrics=self.metrics, stats_manager=self.stats_manager)
+        self.matchzy = MatchzyManager(
+            logger=self.logger,
+            metrics=self.metrics,
+            stats_manager=self.stats_manager,
+            rcon=self.rcon_pool.get(
+                self.config.get("servers.competitive.host", "localhost"),
+                self.config.get("servers.competitive.port", 27015),
+                self.config.get("servers.competitive.rcon_password", "")
+            )
+        )
         self.wingman = WingmanManager(
-            rcon=RCONManager(
-                host=self.config.get("servers.wingman.host", "localhost"),
-                port=self.config.get("servers.wingman.port", 27016),
-                password=self.config.get("servers.wingman.rcon_password", ""),
-                logger=self.logger
+            rcon=self.rcon_pool.get(
+                self.config.get("servers.wingman.host", "localhost"),
+                self.config.get("servers.wingman.port", 27016),
+                self.config.get("servers.wingman.rcon_password", "")
             ),
             map_manager=MapManager(logger=self.logger),
             logger=self.logger,
             metrics=self.metrics
         )
         self.retake = RetakeManager(
-            rcon=RCONManager(
-                host=self.config.get("servers.retake.host", "localhost"),
-                port=self.config.get("servers.retake.port", 27017),
-                password=self.config.get("servers.retake.rcon_password", ""),
-                logger=self.logger
+            rcon=self.rcon_pool.get(
+                self.config.get("servers.retake.host", "localhost"),
+                self.config.get("servers.retake.port", 27017),
+                self.config.get("servers.retake.rcon_password", "")
             ),
             logger=self.logger,
             metrics=self.metrics
@@ -85,6 +123,10 @@ class CS2Bot(commands.Bot):
 
     async def setup_hook(self):
         """Setup do bot."""
+        await self.db.init()
+        self.metrics.start()
+        self.rcon_pool.start()
+
         cogs_dir = Path(__file__).parent / "cogs"
         for filename in os.listdir(cogs_dir):
             if filename.endswith(".py"):
@@ -106,6 +148,16 @@ class CS2Bot(commands.Bot):
         )
         await self.change_presence(activity=activity)
 
+    async def close(self):
+        """Encerrar bot e conexões."""
+        # Descarregar as cogs primeiro: os workers de demo devolvem os jobs
+        # em andamento à fila e precisam do banco aberto para isso
+        await super().close()
+        await self.rcon_pool.close()
+        await self.db.close()
+        # Gravar métricas ainda no buffer antes de sair
+        await self.metrics.close()
+
 def main():
     """Função principal."""
     try:
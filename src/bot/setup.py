@@ -8,7 +8,7 @@ from discord.ext import commands
 from utils.config_manager import ConfigManager
 from utils.logger import Logger
 from utils.metrics import MetricsManager
-from utils.rcon_manager import RCONManager
+from utils.rcon_pool import RCONPool
 from utils.queue_manager import QueueManager
 from utils.matchzy_manager import MatchzyManager
 from utils.wingman_manager import WingmanManager
@@ -42,18 +42,19 @@ class SetupBot(commands.Bot):
         self.metrics = MetricsManager(data_dir=str(self.data_dir), logger=self.logger)
         self.elo = EloManager(self.metrics)
 
-        # RCON managers
-        self.rcon_5v5 = RCONManager(
+        # RCON managers (compartilhados via pool)
+        self.rcon_pool = RCONPool(logger=self.logger)
+        self.rcon_5v5 = self.rcon_pool.get(
             self.config.get('servers.competitive.host', 'localhost'),
             self.config.get('servers.competitive.port', 27015),
             self.config.get('servers.competitive.rcon_password', '')
         )
-        self.rcon_2v2 = RCONManager(
+        self.rcon_2v2 = self.rcon_pool.get(
             self.config.get('servers.wingman.host', 'localhost'),
             self.config.get('servers.wingman.port', 27016),
             self.config.get('servers.wingman.rcon_password', '')
         )
-        self.rcon_retake = RCONManager(
+        self.rcon_retake = self.rcon_pool.get(
             self.config.get('servers.retake.host', 'localhost'),
             self.config.get('servers.retake.port', 27017),
             self.config.get('servers.retake.rcon_password', '')
@@ -65,18 +66,18 @@ class SetupBot(commands.Bot):
             logger=self.logger,
             metrics=self.metrics,
             elo_manager=self.elo,
-            rcon_manager=self.rcon_5v5
+            rcon=self.rcon_5v5
         )
         self.wingman = WingmanManager(
             logger=self.logger,
             metrics=self.metrics,
             elo_manager=self.elo,
-            rcon_manager=self.rcon_2v2
+            rcon=self.rcon_2v2
         )
         self.retake = RetakeManager(
             logger=self.logger,
             metrics=self.metrics,
-            rcon_manager=self.rcon_retake
+            rcon=self.rcon_retake
         )
 
         # Utils
@@ -88,6 +89,8 @@ class SetupBot(commands.Bot):
 
     async def setup_hook(self):
         """Setup do bot"""
+        self.rcon_pool.start()
+
         # Carregar cogs
         cogs_dir = Path(__file__).parent / "cogs"
         for filename in os.listdir(cogs_dir):
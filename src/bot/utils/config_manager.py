@@ -95,6 +95,31 @@ class ConfigManager:
                     'timeout': 120
                 }
             },
+            'rcon': {
+                'timeout': 5.0,
+                'keepalive_interval': 30.0,
+                'backoff_base': 1.0,
+                'backoff_max': 60.0,
+                'status_interval': 10.0,
+                'status_ttl': 10.0
+            },
+            'stats': {
+                'leaderboard_ttl': 30.0
+            },
+            'metrics': {
+                'flush_interval': 5.0,
+                'flush_threshold': 100
+            },
+            'demos': {
+                'workers': 2,
+                'timeout': 900.0,
+                'lease': 60.0,
+                'max_attempts': 3
+            },
+            'tracing': {
+                'enabled': False,
+                'capacity': 500
+            },
             'matchzy': {
                 'api_key': '',
                 'api_url': 'http://localhost:8080'
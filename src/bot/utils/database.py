@@ -5,65 +5,23 @@ Created: 2025-02-21 14:16:08
 """
 
 import asyncpg
-from typing import Dict, Optional
+import hashlib
+import json
+from typing import Dict, List, Optional
 from .logger import Logger
 
-class DatabaseManager:
-    def __init__(self, 
-                 config: Dict,
-                 logger: Optional[Logger] = None):
-        self.config = config
-        self.logger = logger or Logger('database')
-        self.pool = None
-
-    async def init(self):
-        """Inicializar conexão com banco de dados e criar tabelas"""
-        try:
-            self.pool = await asyncpg.create_pool(**self.config)
-            await self._run_migrations()
-            self.logger.logger.info("Banco de dados inicializado com sucesso")
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao inicializar banco: {e}")
-            raise
+# Chave do advisory lock que serializa migrações entre processos
+MIGRATION_LOCK_ID = 7_402_118_301
 
-    async def _run_migrations(self):
-        """Executar migrações do banco de dados"""
-        async with self.pool.acquire() as conn:
-            # Tabela de controle de versão
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS migrations (
-                    version INTEGER PRIMARY KEY,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Verificar última versão
-            current_version = await conn.fetchval(
-                "SELECT MAX(version) FROM migrations"
-            ) or 0
-
-            # Lista de migrações
-            migrations = [
-                self._create_base_tables,
-                self._create_stats_tables,
-                self._create_match_tables,
-                self._create_demo_tables,
-                self._create_role_tables
-            ]
-
-            # Executar migrações pendentes
-            for version, migration in enumerate(migrations, start=1):
-                if version > current_version:
-                    self.logger.logger.info(f"Aplicando migração {version}...")
-                    await migration(conn)
-                    await conn.execute(
-                        "INSERT INTO migrations (version) VALUES ($1)",
-                        version
-                    )
-
-    async def _create_base_tables(self, conn):
-        """Criar tabelas base"""
-        await conn.execute("""
+# Migrações versionadas. Cada passo roda em sua própria transação e o
+# checksum do SQL fica registrado na tabela `migrations`; alterar um passo
+# já aplicado é detectado na inicialização. Novas mudanças de schema
+# entram sempre como um passo novo no fim da lista.
+MIGRATIONS: List[Dict] = [
+    {
+        'version': 1,
+        'name': 'base_tables',
+        'sql': """
             CREATE TABLE IF NOT EXISTS players (
                 id BIGINT PRIMARY KEY,
                 discord_id BIGINT UNIQUE,
@@ -71,10 +29,8 @@ class DatabaseManager:
                 name VARCHAR(64),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            );
 
-        await conn.execute("""
             CREATE TABLE IF NOT EXISTS servers (
                 id SERIAL PRIMARY KEY,
                 name VARCHAR(32) UNIQUE,
@@ -82,12 +38,13 @@ class DatabaseManager:
                 port INTEGER,
                 rcon_password VARCHAR(64),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-    async def _create_stats_tables(self, conn):
-        """Criar tabelas de estatísticas"""
-        await conn.execute("""
+            );
+        """
+    },
+    {
+        'version': 2,
+        'name': 'stats_tables',
+        'sql': """
             CREATE TABLE IF NOT EXISTS player_stats (
                 player_id BIGINT REFERENCES players(id),
                 kills INTEGER DEFAULT 0,
@@ -104,10 +61,8 @@ class DatabaseManager:
                 playtime_seconds BIGINT DEFAULT 0,
                 last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (player_id)
-            )
-        """)
+            );
 
-        await conn.execute("""
             CREATE TABLE IF NOT EXISTS player_weapons (
                 player_id BIGINT REFERENCES players(id),
                 weapon VARCHAR(32),
@@ -117,12 +72,13 @@ class DatabaseManager:
                 headshots INTEGER DEFAULT 0,
                 damage_dealt BIGINT DEFAULT 0,
                 PRIMARY KEY (player_id, weapon)
-            )
-        """)
-
-    async def _create_match_tables(self, conn):
-        """Criar tabelas de partidas"""
-        await conn.execute("""
+            );
+        """
+    },
+    {
+        'version': 3,
+        'name': 'match_tables',
+        'sql': """
             CREATE TABLE IF NOT EXISTS matches (
                 id SERIAL PRIMARY KEY,
                 match_type VARCHAR(16),
@@ -135,10 +91,8 @@ class DatabaseManager:
                 team2_score INTEGER,
                 demo_path VARCHAR(255),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            );
 
-        await conn.execute("""
             CREATE TABLE IF NOT EXISTS match_players (
                 match_id INTEGER REFERENCES matches(id),
                 player_id BIGINT REFERENCES players(id),
@@ -152,12 +106,13 @@ class DatabaseManager:
                 score INTEGER DEFAULT 0,
                 ping_avg INTEGER DEFAULT 0,
                 PRIMARY KEY (match_id, player_id)
-            )
-        """)
-
-    async def _create_demo_tables(self, conn):
-        """Criar tabelas para dados de demos"""
-        await conn.execute("""
+            );
+        """
+    },
+    {
+        'version': 4,
+        'name': 'demo_tables',
+        'sql': """
             CREATE TABLE IF NOT EXISTS demo_stats (
                 match_id INTEGER REFERENCES matches(id),
                 player_id BIGINT REFERENCES players(id),
@@ -172,10 +127,8 @@ class DatabaseManager:
                 utility_damage INTEGER DEFAULT 0,
                 enemies_flashed INTEGER DEFAULT 0,
                 PRIMARY KEY (match_id, player_id, round_number)
-            )
-        """)
+            );
 
-        await conn.execute("""
             CREATE TABLE IF NOT EXISTS demo_positions (
                 match_id INTEGER REFERENCES matches(id),
                 round_number INTEGER,
@@ -190,12 +143,13 @@ class DatabaseManager:
                 armor INTEGER,
                 active_weapon VARCHAR(32),
                 PRIMARY KEY (match_id, round_number, tick, player_id)
-            )
-        """)
-
-    async def _create_role_tables(self, conn):
-        """Criar tabelas para sistema de roles"""
-        await conn.execute("""
+            );
+        """
+    },
+    {
+        'version': 5,
+        'name': 'role_tables',
+        'sql': """
             CREATE TABLE IF NOT EXISTS role_history (
                 id SERIAL PRIMARY KEY,
                 player_id BIGINT REFERENCES players(id),
@@ -205,10 +159,8 @@ class DatabaseManager:
                 is_unique BOOLEAN DEFAULT FALSE,
                 position INTEGER,
                 stat_value FLOAT
-            )
-        """)
+            );
 
-        await conn.execute("""
             CREATE TABLE IF NOT EXISTS role_stats (
                 player_id BIGINT REFERENCES players(id),
                 role_name VARCHAR(64),
@@ -218,19 +170,359 @@ class DatabaseManager:
                 best_position INTEGER,
                 highest_stat_value FLOAT,
                 PRIMARY KEY (player_id, role_name)
-            )
-        """)
+            );
 
-        # Índices para performance
-        await conn.execute("""
+            -- Índices para performance
             CREATE INDEX IF NOT EXISTS idx_player_stats_kills ON player_stats(kills DESC);
             CREATE INDEX IF NOT EXISTS idx_player_stats_headshots ON player_stats(headshots DESC);
             CREATE INDEX IF NOT EXISTS idx_match_players_score ON match_players(score DESC);
             CREATE INDEX IF NOT EXISTS idx_role_history_dates ON role_history(assigned_at, removed_at);
             CREATE INDEX IF NOT EXISTS idx_demo_positions_match ON demo_positions(match_id, round_number);
-        """)
+        """
+    },
+    {
+        # O StatsManager grava player_stats por partida e matches com
+        # score_team1/score_team2; os passos 2 e 3 criaram o formato antigo.
+        # Bancos criados pelo antigo StatsManager._create_tables já estão no
+        # formato novo, por isso cada ajuste verifica o schema atual.
+        'version': 6,
+        'name': 'unify_stats_schema',
+        'sql': """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                      AND table_name = 'player_stats' AND column_name = 'match_id'
+                ) THEN
+                    ALTER TABLE player_stats RENAME TO player_lifetime_stats;
+                END IF;
+
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                      AND table_name = 'matches' AND column_name = 'team1_score'
+                ) THEN
+                    ALTER TABLE matches RENAME COLUMN team1_score TO score_team1;
+                    ALTER TABLE matches RENAME COLUMN team2_score TO score_team2;
+                END IF;
+            END
+            $$;
+
+            ALTER TABLE matches ALTER COLUMN winner_team TYPE VARCHAR(16);
+
+            CREATE TABLE IF NOT EXISTS player_stats (
+                player_id BIGINT REFERENCES players(id),
+                match_id INTEGER REFERENCES matches(id),
+                team VARCHAR(16),
+                kills INTEGER DEFAULT 0,
+                deaths INTEGER DEFAULT 0,
+                assists INTEGER DEFAULT 0,
+                headshots INTEGER DEFAULT 0,
+                score INTEGER DEFAULT 0,
+                mvps INTEGER DEFAULT 0,
+                PRIMARY KEY (player_id, match_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS player_ratings (
+                player_id BIGINT REFERENCES players(id),
+                rating_type VARCHAR(16),
+                rating FLOAT DEFAULT 1000,
+                games_played INTEGER DEFAULT 0,
+                wins INTEGER DEFAULT 0,
+                last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (player_id, rating_type)
+            );
+
+            -- Linhas de uma partida (atualização de agregados em record_match)
+            CREATE INDEX IF NOT EXISTS idx_player_stats_match
+                ON player_stats (match_id);
+        """
+    },
+    {
+        'version': 7,
+        'name': 'player_aggregates',
+        'sql': """
+            -- Agregados mantidos incrementalmente por StatsManager.record_match
+            CREATE TABLE IF NOT EXISTS player_totals (
+                player_id BIGINT PRIMARY KEY REFERENCES players(id),
+                matches INTEGER DEFAULT 0,
+                wins INTEGER DEFAULT 0,
+                kills INTEGER DEFAULT 0,
+                deaths INTEGER DEFAULT 0,
+                assists INTEGER DEFAULT 0,
+                headshots INTEGER DEFAULT 0,
+                mvps INTEGER DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS player_map_totals (
+                player_id BIGINT REFERENCES players(id),
+                map VARCHAR(32),
+                matches INTEGER DEFAULT 0,
+                PRIMARY KEY (player_id, map)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_player_map_totals_matches
+                ON player_map_totals (player_id, matches DESC);
+
+            -- Popular a partir do histórico existente
+            INSERT INTO player_totals (
+                player_id, matches, wins, kills, deaths,
+                assists, headshots, mvps
+            )
+            SELECT
+                ps.player_id,
+                COUNT(*),
+                SUM(CASE WHEN ps.team = m.winner_team THEN 1 ELSE 0 END),
+                SUM(ps.kills),
+                SUM(ps.deaths),
+                SUM(ps.assists),
+                SUM(ps.headshots),
+                SUM(ps.mvps)
+            FROM player_stats ps
+            JOIN matches m ON ps.match_id = m.id
+            GROUP BY ps.player_id
+            ON CONFLICT (player_id) DO NOTHING;
+
+            INSERT INTO player_map_totals (player_id, map, matches)
+            SELECT ps.player_id, m.map, COUNT(*)
+            FROM player_stats ps
+            JOIN matches m ON ps.match_id = m.id
+            WHERE m.map IS NOT NULL
+            GROUP BY ps.player_id, m.map
+            ON CONFLICT (player_id, map) DO NOTHING;
+        """
+    },
+    {
+        # Índices de cobertura para as consultas do StatsManager
+        # (verificados por benchmarks/explain_stats_queries.py)
+        'version': 8,
+        'name': 'stats_covering_indexes',
+        'sql': """
+            -- Leaderboard: filtro por tipo e ordem por (rating, player_id)
+            -- sem heap fetch; o player_id é coluna de ordenação para a
+            -- paginação por keyset
+            CREATE INDEX IF NOT EXISTS idx_player_ratings_leaderboard
+                ON player_ratings (rating_type, rating DESC, player_id DESC)
+                INCLUDE (games_played, wins);
+
+            -- Top jogadores por mapa: partidas do mapa e suas linhas de stats
+            CREATE INDEX IF NOT EXISTS idx_matches_map
+                ON matches (map) INCLUDE (id, winner_team);
+
+            CREATE INDEX IF NOT EXISTS idx_player_stats_match_cover
+                ON player_stats (match_id)
+                INCLUDE (player_id, team, kills, deaths, headshots, mvps);
+
+            DROP INDEX IF EXISTS idx_player_stats_match;
+        """
+    },
+    {
+        'version': 9,
+        'name': 'demo_jobs',
+        'sql': """
+            -- Fila persistente de processamento de demos
+            CREATE TABLE IF NOT EXISTS demo_jobs (
+                id BIGSERIAL PRIMARY KEY,
+                match_id VARCHAR(64) NOT NULL,
+                demo_path TEXT NOT NULL,
+                priority SMALLINT NOT NULL DEFAULT 0,
+                state VARCHAR(16) NOT NULL DEFAULT 'queued'
+                    CHECK (state IN ('queued', 'running', 'done', 'failed')),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+                lease_owner TEXT,
+                lease_until TIMESTAMPTZ,
+                last_error TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+
+            -- Só jobs pendentes entram no índice usado para reservar
+            CREATE INDEX idx_demo_jobs_pending
+                ON demo_jobs (priority, id)
+                WHERE state IN ('queued', 'running');
+
+            CREATE INDEX idx_demo_jobs_match ON demo_jobs (match_id);
+        """
+    },
+    {
+        'version': 10,
+        'name': 'heatmaps',
+        'sql': """
+            -- Heatmap binado de cada partida (grade comprimida, ver heatmap.py)
+            CREATE TABLE IF NOT EXISTS match_heatmaps (
+                match_id VARCHAR(64) PRIMARY KEY,
+                map_name VARCHAR(64) NOT NULL,
+                grid_size SMALLINT NOT NULL,
+                grid BYTEA NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+
+            -- Últimas N partidas de um mapa
+            CREATE INDEX idx_match_heatmaps_map
+                ON match_heatmaps (map_name, grid_size, created_at DESC);
+
+            -- Soma de todas as partidas por (mapa, lado, camada), atualizada
+            -- a cada partida salva
+            CREATE TABLE IF NOT EXISTS heatmap_aggregates (
+                map_name VARCHAR(64) NOT NULL,
+                grid_size SMALLINT NOT NULL,
+                side VARCHAR(2) NOT NULL,
+                layer VARCHAR(16) NOT NULL,
+                grid BYTEA NOT NULL,
+                matches INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (map_name, grid_size, side, layer)
+            );
+        """
+    },
+    {
+        # Posições por tick ficam em arquivos colunares por partida
+        # (positions.py); a tabela de uma linha por tick nunca foi preenchida
+        'version': 11,
+        'name': 'drop_demo_positions',
+        'sql': """
+            DROP TABLE IF EXISTS demo_positions;
+        """
+    },
+    {
+        'version': 12,
+        'name': 'match_demo_stats',
+        'sql': """
+            -- Análise da demo de cada partida (ver demo_analysis.py);
+            -- reprocessar a demo substitui a linha
+            CREATE TABLE IF NOT EXISTS match_demo_stats (
+                match_id VARCHAR(64) PRIMARY KEY,
+                map_name VARCHAR(64),
+                rounds_played SMALLINT NOT NULL,
+                score_team1 SMALLINT,
+                score_team2 SMALLINT,
+                players JSON NOT NULL,
+                rounds JSON NOT NULL,
+                economy JSON NOT NULL,
+                processed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """
+    }
+]
+
+
+class MigrationError(Exception):
+    """Migração aplicada difere da definida no código"""
+
+
+def migration_checksum(sql: str) -> str:
+    """Calcular checksum do SQL de uma migração (ignora indentação)"""
+    normalized = "\n".join(line.strip() for line in sql.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class DatabaseManager:
+    """Dono do pool asyncpg compartilhado e do schema do banco.
+
+    Todos os managers que acessam o Postgres recebem este objeto e usam
+    `pool`, então o bot mantém um único pool de conexões.
+    """
+
+    def __init__(self,
+                 config: Dict,
+                 logger: Optional[Logger] = None):
+        self.config = config
+        self.logger = logger or Logger('database')
+        self.pool = None
+
+    def _pool_config(self) -> Dict:
+        """Converter configuração do bot em argumentos do asyncpg"""
+        config = dict(self.config or {})
+        # O config do bot usa `name` para o banco; o asyncpg espera `database`
+        if 'name' in config:
+            config.setdefault('database', config.pop('name'))
+        return config
+
+    async def init(self):
+        """Inicializar conexão com banco de dados e criar tabelas"""
+        if self.pool is not None:
+            return
+
+        try:
+            self.pool = await asyncpg.create_pool(
+                init=self._init_connection,
+                **self._pool_config()
+            )
+            await self._run_migrations()
+            self.logger.logger.info("Banco de dados inicializado com sucesso")
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao inicializar banco: {e}")
+            raise
+
+    async def _init_connection(self, conn):
+        """Configurar cada conexão nova do pool"""
+        # Colunas json chegam como dict/list em vez de texto
+        await conn.set_type_codec(
+            'json',
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema='pg_catalog'
+        )
+
+    async def _run_migrations(self):
+        """Executar migrações pendentes, verificando as já aplicadas"""
+        async with self.pool.acquire() as conn:
+            # Tabela de controle de versão
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS migrations (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                ALTER TABLE migrations ADD COLUMN IF NOT EXISTS name VARCHAR(64);
+                ALTER TABLE migrations ADD COLUMN IF NOT EXISTS checksum CHAR(64);
+            """)
+
+            # Evitar que duas instâncias migrem ao mesmo tempo
+            await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                applied = {
+                    row['version']: row['checksum']
+                    for row in await conn.fetch(
+                        "SELECT version, checksum FROM migrations"
+                    )
+                }
+
+                for migration in MIGRATIONS:
+                    version = migration['version']
+                    checksum = migration_checksum(migration['sql'])
+
+                    if version in applied:
+                        if applied[version] is None:
+                            # Aplicada pelo motor antigo, sem checksum registrado
+                            await conn.execute("""
+                                UPDATE migrations SET name = $2, checksum = $3
+                                WHERE version = $1
+                            """, version, migration['name'], checksum)
+                        elif applied[version] != checksum:
+                            raise MigrationError(
+                                f"Checksum da migração {version} ({migration['name']}) "
+                                f"não confere com a aplicada no banco"
+                            )
+                        continue
+
+                    self.logger.logger.info(
+                        f"Aplicando migração {version} ({migration['name']})..."
+                    )
+                    async with conn.transaction():
+                        await conn.execute(migration['sql'])
+                        await conn.execute("""
+                            INSERT INTO migrations (version, name, checksum)
+                            VALUES ($1, $2, $3)
+                        """, version, migration['name'], checksum)
+
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
 
     async def close(self):
         """Fechar conexão com banco de dados"""
         if self.pool:
-            await self.pool.close()
\ No newline at end of file
+            await self.pool.close()
+            self.pool = None
@@ -0,0 +1,298 @@
+"""
+Demo Analysis - Incremental match statistics from demo parser events
+Author: adamguedesmtm
+Created: 2025-02-27 18:52:40
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from .logger import Logger
+from .heatmap import SIDES, Heatmap
+from .positions import POSITION_PATH, PositionWriter
+
+# Arrays da saída do parser consumidos elemento a elemento
+STREAM_PATHS = (
+    'rounds',
+    'players',
+    'positions.kills',
+    'positions.bomb_plants',
+    'positions.grenades',
+    POSITION_PATH
+)
+
+OPPOSITE_SIDE = {'CT': 'T', 'T': 'CT'}
+
+# Valores avulsos usados; o resto do documento é descartado na leitura
+KEEP_PATHS = ('map', 'duration', 'team1_score', 'team2_score')
+
+
+class MatchAnalysis:
+    """Estatísticas de uma partida montadas a partir de eventos (caminho, valor).
+
+    Cada round, jogador e posição é processado assim que chega do parser
+    (ver json_stream), então a memória não depende do tamanho da demo.
+    Um erro em um item invalida só a seção dele (rounds, economy,
+    positions...), que sai vazia no resultado. As posições viram um
+    `Heatmap` (grade fixa do mapa) no resultado; as amostras por tick, se
+    houver um `PositionWriter`, são gravadas no arquivo da partida.
+    """
+
+    def __init__(self, logger: Optional[Logger] = None,
+                 positions: Optional[PositionWriter] = None):
+        self.logger = logger or Logger('demo_analysis')
+        self.general: Dict[str, Any] = {}
+        self.players: Dict[str, Dict] = {}
+
+        self.rounds = {
+            'pistol_rounds': {'ct_wins': 0, 't_wins': 0},
+            'force_buy_rounds': {'ct_wins': 0, 't_wins': 0},
+            'eco_rounds': {'ct_wins': 0, 't_wins': 0},
+            'retakes': {'attempts': 0, 'successful': 0},
+            'average_round_time': 0,
+            'round_win_reasons': {}
+        }
+        self._round_count = 0
+        self._round_time = 0
+
+        self.economy = {
+            'average_team_value': {'CT': 0, 'T': 0},
+            'max_team_value': {'CT': 0, 'T': 0},
+            'eco_success_rate': {'CT': 0, 'T': 0},
+            'force_buy_success_rate': {'CT': 0, 'T': 0},
+            'equipment_value_distribution': {
+                'low': 0,    # < $10000
+                'medium': 0, # $10000-$20000
+                'high': 0    # > $20000
+            }
+        }
+        self._eco_rounds = {'CT': {'total': 0, 'won': 0}, 'T': {'total': 0, 'won': 0}}
+        self._force_rounds = {'CT': {'total': 0, 'won': 0}, 'T': {'total': 0, 'won': 0}}
+
+        # (camada, lado) -> coordenadas x, y; binadas na grade do mapa no
+        # resultado, quando o mapa já é conhecido
+        self._points: Dict[Tuple[str, str], Tuple[List[float], List[float]]] = {}
+        self.positions = {
+            'common_angles': {
+                'CT': [],
+                'T': []
+            },
+            'entry_paths': {
+                'successful': [],
+                'failed': []
+            }
+        }
+
+        # Seções com erro (não recebem mais itens)
+        self.failed: Dict[str, str] = {}
+
+        # Caminho -> [(seção, função)]; cada round alimenta duas seções
+        self._handlers = {
+            'players': [('players', self._add_player)],
+            'rounds': [('rounds', self._add_round), ('economy', self._add_round_economy)],
+            'positions.kills': [('positions', self._add_kill)],
+            'positions.bomb_plants': [('positions', self._add_bomb_plant)],
+            'positions.grenades': [('positions', self._add_grenade)]
+        }
+        # Amostras por tick vão direto para o arquivo de posições
+        if positions is not None:
+            self._handlers[POSITION_PATH] = [('position_samples', positions.add)]
+
+    def add(self, path: str, value: Any):
+        """Processar um evento do parser"""
+        if path in KEEP_PATHS:
+            self.general[path] = value
+            return
+
+        if path == 'rounds':
+            self._round_count += 1
+
+        for section, add in self._handlers.get(path, ()):
+            if section in self.failed:
+                continue
+            try:
+                add(value)
+            except Exception as e:
+                self.failed[section] = str(e)
+                self.logger.logger.error(f"Erro ao analisar {section} da demo: {e}")
+
+    def _add_player(self, player_data: Dict):
+        """Estatísticas por jogador"""
+        self.players[player_data['steam_id']] = {
+            'team': player_data['team'],
+            'name': player_data['name'],
+            'kills': player_data['kills'],
+            'deaths': player_data['deaths'],
+            'assists': player_data['assists'],
+            'kd_ratio': player_data['kd_ratio'],
+            'hs_kills': player_data['hs_kills'],
+            'hs_ratio': player_data['hs_ratio'],
+            'entry_kills': player_data['entry_kills'],
+            'clutches_won': player_data['clutches_won'],
+            'damage_dealt': player_data['damage_dealt'],
+            'utility_damage': player_data['utility_damage'],
+            'flash_assists': player_data['flash_assists'],
+            'enemies_flashed': player_data['enemies_flashed'],
+            'mvps': player_data['mvps'],
+            'score': player_data['score'],
+            'rounds': {
+                'played': player_data['rounds_played'],
+                'survived': player_data['rounds_survived'],
+                'with_kills': player_data['rounds_with_kills'],
+                'with_damage': player_data['rounds_with_damage'],
+                'trade_kills': player_data['trade_kills']
+            },
+            'weapons': {
+                'kills_by_weapon': player_data['kills_by_weapon'],
+                'favorite_weapon': player_data['favorite_weapon']
+            }
+        }
+
+    def _add_point(self, layer: str, side: str, x: float, y: float):
+        if side not in SIDES:
+            return
+        xs, ys = self._points.setdefault((layer, side), ([], []))
+        xs.append(x)
+        ys.append(y)
+
+    def _add_round(self, round_data: Dict):
+        """Detalhes da round"""
+        analysis = self.rounds
+
+        # Analisar tipo de round
+        if round_data['round_number'] in (1, 16):  # Pistol rounds
+            if round_data['winner'] == 'CT':
+                analysis['pistol_rounds']['ct_wins'] += 1
+            else:
+                analysis['pistol_rounds']['t_wins'] += 1
+
+        # Analisar compras
+        if round_data['is_force_buy']:
+            if round_data['winner'] == 'CT':
+                analysis['force_buy_rounds']['ct_wins'] += 1
+            else:
+                analysis['force_buy_rounds']['t_wins'] += 1
+        elif round_data['is_eco']:
+            if round_data['winner'] == 'CT':
+                analysis['eco_rounds']['ct_wins'] += 1
+            else:
+                analysis['eco_rounds']['t_wins'] += 1
+
+        # Analisar retakes
+        if round_data['bomb_planted']:
+            analysis['retakes']['attempts'] += 1
+            if round_data['winner'] == 'CT':
+                analysis['retakes']['successful'] += 1
+
+        # Tempo da round
+        self._round_time += round_data['duration']
+
+        # Razão da vitória
+        reason = round_data['win_reason']
+        analysis['round_win_reasons'][reason] = \
+            analysis['round_win_reasons'].get(reason, 0) + 1
+
+    def _add_round_economy(self, round_data: Dict):
+        """Economia da round por time"""
+        analysis = self.economy
+        for team in ['CT', 'T']:
+            team_value = round_data[f'{team.lower()}_equipment_value']
+
+            # Atualizar médias e máximos
+            analysis['average_team_value'][team] += team_value
+            analysis['max_team_value'][team] = max(
+                analysis['max_team_value'][team],
+                team_value
+            )
+
+            # Classificar valor do equipamento
+            if team_value < 10000:
+                analysis['equipment_value_distribution']['low'] += 1
+            elif team_value < 20000:
+                analysis['equipment_value_distribution']['medium'] += 1
+            else:
+                analysis['equipment_value_distribution']['high'] += 1
+
+            # Análise de ecos e force buys
+            if round_data[f'is_{team.lower()}_eco']:
+                self._eco_rounds[team]['total'] += 1
+                if round_data['winner'] == team:
+                    self._eco_rounds[team]['won'] += 1
+            elif round_data[f'is_{team.lower()}_force']:
+                self._force_rounds[team]['total'] += 1
+                if round_data['winner'] == team:
+                    self._force_rounds[team]['won'] += 1
+
+    def _add_kill(self, kill: Dict):
+        """Posição, ângulo e entry path de um kill"""
+        analysis = self.positions
+        # Mesma posição conta como kill do atacante e morte do outro lado
+        attacker = kill['attacker_team']
+        self._add_point('kills', attacker, kill['x'], kill['y'])
+        self._add_point('deaths', OPPOSITE_SIDE.get(attacker), kill['x'], kill['y'])
+
+        # Registrar ângulos comuns
+        if kill['attacker_team'] == 'CT':
+            analysis['common_angles']['CT'].append(kill['attacker_angle'])
+        else:
+            analysis['common_angles']['T'].append(kill['attacker_angle'])
+
+        # Analisar entry paths
+        if kill['is_entry']:
+            path = kill['attacker_path']
+            if kill['attacker_team'] == kill['winner_team']:
+                analysis['entry_paths']['successful'].append(path)
+            else:
+                analysis['entry_paths']['failed'].append(path)
+
+    def _add_bomb_plant(self, plant: Dict):
+        self._add_point('bomb_plants', 'T', plant['x'], plant['y'])
+
+    def _add_grenade(self, nade: Dict):
+        self._add_point('grenades', nade.get('thrower_team'), nade['x'], nade['y'])
+
+    def heatmap(self) -> Heatmap:
+        """Posições da partida binadas na grade do mapa"""
+        heatmap = Heatmap(self.general.get('map'), matches=1)
+        for (layer, side), (xs, ys) in self._points.items():
+            heatmap.add_points(layer, side, xs, ys)
+        return heatmap
+
+    def result(self) -> Dict:
+        """Estatísticas finais da partida"""
+        general = self.general
+        rounds = economy = positions = {}
+
+        if 'rounds' not in self.failed and self._round_count:
+            rounds = self.rounds
+            rounds['average_round_time'] = self._round_time / self._round_count
+
+        if 'economy' not in self.failed and self._round_count:
+            economy = self.economy
+            for team in ['CT', 'T']:
+                economy['average_team_value'][team] /= self._round_count
+                if self._eco_rounds[team]['total'] > 0:
+                    economy['eco_success_rate'][team] = \
+                        self._eco_rounds[team]['won'] / self._eco_rounds[team]['total']
+                if self._force_rounds[team]['total'] > 0:
+                    economy['force_buy_success_rate'][team] = \
+                        self._force_rounds[team]['won'] / self._force_rounds[team]['total']
+        if 'positions' not in self.failed:
+            try:
+                positions = {'heatmap': self.heatmap(), **self.positions}
+            except Exception as e:
+                self.failed['positions'] = str(e)
+                self.logger.logger.error(f"Erro ao montar heatmap da demo: {e}")
+
+        return {
+            'general': {
+                'map': general['map'],
+                'duration': general['duration'],
+                'rounds_played': self._round_count,
+                'score_team1': general['team1_score'],
+                'score_team2': general['team2_score'],
+                'winner': 'team1' if general['team1_score'] > general['team2_score'] else 'team2'
+            },
+            'players': self.players if 'players' not in self.failed else {},
+            'rounds': rounds,
+            'economy': economy,
+            'positions': positions
+        }
@@ -6,14 +6,28 @@ Created: 2025-02-21 14:00:38
 
 import asyncio
 import aiohttp
+import os
+import signal
 from pathlib import Path
 from typing import Dict, List, Optional
 import subprocess
-import json
 from datetime import datetime
 from .logger import Logger
 from .metrics import MetricsManager
 from .stats_manager import StatsManager
+from .database import DatabaseManager
+from .demo_queue import DemoJobQueue
+from .heatmap_store import HeatmapStore
+from .demo_analysis import KEEP_PATHS, STREAM_PATHS, MatchAnalysis
+from shared.json_stream import aiter_stream
+from .positions import PositionWriter
+from .telemetry import DEMO_PARSE_TIME
+from .tracing import traced
+
+# Prioridades da fila (menor primeiro): demos de partidas ao vivo passam
+# na frente de reprocessamentos/backfill
+PRIORITY_LIVE = 0
+PRIORITY_BACKFILL = 10
 
 class DemoManager:
     def __init__(self,
@@ -21,37 +35,147 @@ class DemoManager:
                  parser_path: str = "/opt/csdm/parser",
                  logger: Optional[Logger] = None,
                  metrics: Optional[MetricsManager] = None,
-                 stats_manager: Optional[StatsManager] = None):
+                 stats_manager: Optional[StatsManager] = None,
+                 db: Optional[DatabaseManager] = None,
+                 workers: int = 2,
+                 demo_timeout: float = 900.0,
+                 lease_seconds: float = 60.0,
+                 max_attempts: int = 3,
+                 poll_interval: float = 5.0):
         self.demos_dir = Path(demos_dir)
+        # Posições por tick das partidas (um arquivo colunar por partida)
+        self.positions_dir = self.demos_dir / 'positions'
         self.parser_path = Path(parser_path)
         self.logger = logger or Logger('demo_manager')
         self.metrics = metrics
         self.stats_manager = stats_manager
-        self.processing_queue = asyncio.Queue()
         self.is_processing = False
 
+        db = db or (stats_manager.db if stats_manager else None)
+        # Fila persistente (tabela demo_jobs): sobrevive a reinícios do bot
+        self.jobs = DemoJobQueue(
+            db,
+            logger=self.logger,
+            lease_seconds=lease_seconds,
+            max_attempts=max_attempts
+        )
+        self.poll_interval = poll_interval
+        # Heatmaps por partida e agregados por mapa
+        self.heatmaps = HeatmapStore(db, logger=self.logger)
+
+        # Pool de workers: cada parse é um processo pesado, então não
+        # passar do número de CPUs
+        self.workers = max(1, min(workers, os.cpu_count() or 1))
+        self.demo_timeout = demo_timeout
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    @property
+    def active(self) -> List[str]:
+        """Partidas com demo em processamento neste processo"""
+        return list(self._running)
+
     async def start_processor(self):
-        """Iniciar processador de demos em background"""
+        """Iniciar workers de processamento de demos em background"""
+        if self._workers:
+            return
         self.is_processing = True
+        self._workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.workers)
+        ]
+        self.logger.logger.info(f"Processador de demos iniciado com {self.workers} workers")
+
+    async def _worker(self, worker_id: int):
+        """Reservar e processar jobs, um por vez"""
+        owner = self.jobs.owner(worker_id)
         while self.is_processing:
             try:
-                demo_path = await self.processing_queue.get()
-                await self._process_demo(demo_path)
-                self.processing_queue.task_done()
+                job = await self.jobs.claim(owner)
+                if job is None:
+                    # Fila vazia: esperar novo job ou o próximo poll
+                    # (retries agendados e leases vencidos)
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+
+                await self._run_job(job, owner)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                self.logger.logger.error(f"Erro no processador de demos: {e}")
-                await asyncio.sleep(5)  # Esperar antes de tentar novamente
+                self.logger.logger.error(f"Erro no worker de demos {worker_id}: {e}")
+                await asyncio.sleep(5)
+
+    async def _run_job(self, job: Dict, owner: str):
+        """Processar um job com timeout, renovando o lease enquanto roda"""
+        match_id = job['match_id']
+
+        if job['attempts'] > job['max_attempts']:
+            # Lease vencido de um job que já esgotou as tentativas
+            await self.jobs.fail(job['id'], owner, "Tentativas esgotadas", retry=False)
+            return
+
+        task = asyncio.create_task(self._process_demo(Path(job['demo_path'])))
+        heartbeat = asyncio.create_task(self._renew_lease(job['id'], owner))
+        self._running[match_id] = task
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.demo_timeout)
+        except asyncio.CancelledError:
+            # Bot encerrando: interromper o parse e devolver o job à fila
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await self.jobs.release(job['id'], owner)
+            raise
+        finally:
+            heartbeat.cancel()
+            self._running.pop(match_id, None)
+
+        if not done:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            state = await self.jobs.fail(
+                job['id'], owner, f"Timeout após {self.demo_timeout:g}s"
+            )
+            self.logger.logger.error(
+                f"Timeout ao processar demo {match_id} ({self.demo_timeout:g}s), "
+                f"tentativa {job['attempts']}/{job['max_attempts']} -> {state}"
+            )
+            if self.metrics:
+                await self.metrics.record_command('demo_timeout')
+        elif task.cancelled():
+            await self.jobs.fail(job['id'], owner, "cancelado", retry=False)
+            self.logger.logger.info(f"Processamento da demo {match_id} cancelado")
+        elif task.exception():
+            state = await self.jobs.fail(job['id'], owner, str(task.exception()))
+            self.logger.logger.error(
+                f"Erro ao processar demo {match_id}: {task.exception()} "
+                f"(tentativa {job['attempts']}/{job['max_attempts']} -> {state})"
+            )
+        else:
+            await self.jobs.complete(job['id'], owner)
+
+    async def _renew_lease(self, job_id: int, owner: str):
+        """Renovar o lease periodicamente enquanto o job roda"""
+        while True:
+            await asyncio.sleep(self.jobs.lease_seconds / 3)
+            await self.jobs.renew(job_id, owner)
 
     async def stop_processor(self):
-        """Parar processador de demos"""
+        """Parar workers; jobs em andamento voltam para a fila"""
         self.is_processing = False
-        while not self.processing_queue.empty():
-            await self.processing_queue.get()
-            self.processing_queue.task_done()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
 
-    async def queue_demo(self, match_id: str, demo_path: Path):
+    async def queue_demo(self, match_id: str, demo_path: Path, priority: int = PRIORITY_LIVE):
         """Adicionar demo à fila de processamento"""
         try:
+            demo_path = Path(demo_path)
             if not demo_path.exists():
                 raise FileNotFoundError(f"Demo não encontrada: {demo_path}")
 
@@ -60,286 +184,124 @@ class DemoManager:
             demo_path.rename(new_path)
 
             # Adicionar à fila
-            await self.processing_queue.put(new_path)
+            job_id = await self.jobs.enqueue(match_id, str(new_path), priority)
+            if job_id is None:
+                return False
+            self._wakeup.set()
 
             if self.metrics:
                 await self.metrics.record_command('demo_queued')
 
-            self.logger.logger.info(f"Demo {match_id} adicionada à fila")
+            self.logger.logger.info(f"Demo {match_id} adicionada à fila (job {job_id})")
             return True
 
         except Exception as e:
             self.logger.logger.error(f"Erro ao enfileirar demo: {e}")
             return False
 
-    async def _process_demo(self, demo_path: Path):
-        """Processar demo usando CS Demo Manager GUI."""
-        try:
-            match_id = demo_path.stem.split('_')[0]
-
-            # Executar GUI em segundo plano
-            process = await asyncio.create_subprocess_shell(
-                f"xvfb-run ./csgo-demoui -demo {demo_path} -json",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
-            stdout, stderr = await process.communicate()
-
-            if process.returncode != 0:
-                raise Exception(f"Erro ao processar demo: {stderr.decode()}")
-
-            # Parsear resultado
-            demo_data = json.loads(stdout.decode())
-            match_stats = await self._extract_match_stats(demo_data)
-
-            # Atualizar banco de dados
-            if self.stats_manager:
-                await self.stats_manager.update_match_stats(match_id, match_stats)
-
-            # Mover demo para pasta processed
-            processed_dir = self.demos_dir / 'processed'
-            processed_dir.mkdir(exist_ok=True)
-            demo_path.rename(processed_dir / demo_path.name)
-
-            self.logger.logger.info(f"Demo {match_id} processada com sucesso")
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao processar demo {match_id}: {e}")
-
-
-    async def _extract_match_stats(self, demo_data: Dict) -> Dict:
-        """Extrair estatísticas detalhadas da demo"""
+    async def cancel_demo(self, match_id: str) -> bool:
+        """Cancelar demo em processamento ou ainda na fila"""
+        task = self._running.get(match_id)
+        if task:
+            task.cancel()
+            return True
+        return await self.jobs.cancel(match_id) > 0
+
+    async def get_queue_status(self) -> Dict:
+        """Resumo da fila para o !demostatus"""
+        return {
+            'counts': await self.jobs.counts(),
+            'running': await self.jobs.list_jobs('running'),
+            'failed': await self.jobs.list_jobs('failed', limit=3)
+        }
+
+    @staticmethod
+    async def _kill_process_group(process):
+        """Matar o grupo do parser (shell + xvfb + parser) e aguardar"""
         try:
-            stats = {
-                'general': {
-                    'map': demo_data['map'],
-                    'duration': demo_data['duration'],
-                    'rounds_played': len(demo_data['rounds']),
-                    'score_team1': demo_data['team1_score'],
-                    'score_team2': demo_data['team2_score'],
-                    'winner': 'team1' if demo_data['team1_score'] > demo_data['team2_score'] else 'team2'
-                },
-                'players': {}
-            }
-
-            # Processar estatísticas por jogador
-            for player_data in demo_data['players']:
-                steam_id = player_data['steam_id']
-                stats['players'][steam_id] = {
-                    'team': player_data['team'],
-                    'name': player_data['name'],
-                    'kills': player_data['kills'],
-                    'deaths': player_data['deaths'],
-                    'assists': player_data['assists'],
-                    'kd_ratio': player_data['kd_ratio'],
-                    'hs_kills': player_data['hs_kills'],
-                    'hs_ratio': player_data['hs_ratio'],
-                    'entry_kills': player_data['entry_kills'],
-                    'clutches_won': player_data['clutches_won'],
-                    'damage_dealt': player_data['damage_dealt'],
-                    'utility_damage': player_data['utility_damage'],
-                    'flash_assists': player_data['flash_assists'],
-                    'enemies_flashed': player_data['enemies_flashed'],
-                    'mvps': player_data['mvps'],
-                    'score': player_data['score'],
-                    'rounds': {
-                        'played': player_data['rounds_played'],
-                        'survived': player_data['rounds_survived'],
-                        'with_kills': player_data['rounds_with_kills'],
-                        'with_damage': player_data['rounds_with_damage'],
-                        'trade_kills': player_data['trade_kills']
-                    },
-                    'weapons': {
-                        'kills_by_weapon': player_data['kills_by_weapon'],
-                        'favorite_weapon': player_data['favorite_weapon']
-                    }
-                }
-
-            # Calcular estatísticas extras
-            stats['rounds'] = await self._analyze_rounds(demo_data['rounds'])
-            stats['economy'] = await self._analyze_economy(demo_data['rounds'])
-            stats['positions'] = await self._analyze_positions(demo_data['positions'])
-
-            return stats
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
 
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao extrair stats da demo: {e}")
-            return {}
+    @traced()
+    async def _process_demo(self, demo_path: Path):
+        """Processar demo usando CS Demo Manager GUI.
+
+        A saída JSON do parser é lida em streaming: rounds, jogadores e
+        posições alimentam a análise conforme chegam, sem montar o
+        documento inteiro em memória, e as amostras por tick vão para o
+        arquivo de posições da partida (ver positions.py).
+        """
+        match_id = demo_path.stem.split('_')[0]
+        positions = PositionWriter(
+            self.positions_dir / f"{match_id}.pos", match_id, logger=self.logger
+        )
+        analysis = MatchAnalysis(logger=self.logger, positions=positions)
 
-    async def _analyze_rounds(self, rounds: List[Dict]) -> Dict:
-        """Analisar detalhes das rounds"""
         try:
-            analysis = {
-                'pistol_rounds': {'ct_wins': 0, 't_wins': 0},
-                'force_buy_rounds': {'ct_wins': 0, 't_wins': 0},
-                'eco_rounds': {'ct_wins': 0, 't_wins': 0},
-                'retakes': {'attempts': 0, 'successful': 0},
-                'average_round_time': 0,
-                'round_win_reasons': {}
-            }
-
-            total_time = 0
-            for round_data in rounds:
-                # Analisar tipo de round
-                if round_data['round_number'] in (1, 16):  # Pistol rounds
-                    if round_data['winner'] == 'CT':
-                        analysis['pistol_rounds']['ct_wins'] += 1
-                    else:
-                        analysis['pistol_rounds']['t_wins'] += 1
-
-                # Analisar compras
-                if round_data['is_force_buy']:
-                    if round_data['winner'] == 'CT':
-                        analysis['force_buy_rounds']['ct_wins'] += 1
-                    else:
-                        analysis['force_buy_rounds']['t_wins'] += 1
-                elif round_data['is_eco']:
-                    if round_data['winner'] == 'CT':
-                        analysis['eco_rounds']['ct_wins'] += 1
-                    else:
-                        analysis['eco_rounds']['t_wins'] += 1
-
-                # Analisar retakes
-                if round_data['bomb_planted']:
-                    analysis['retakes']['attempts'] += 1
-                    if round_data['winner'] == 'CT':
-                        analysis['retakes']['successful'] += 1
-
-                # Tempo da round
-                total_time += round_data['duration']
-
-                # Razão da vitória
-                reason = round_data['win_reason']
-                analysis['round_win_reasons'][reason] = \
-                    analysis['round_win_reasons'].get(reason, 0) + 1
-
-            # Calcular média
-            analysis['average_round_time'] = total_time / len(rounds)
-
-            return analysis
-
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao analisar rounds: {e}")
-            return {}
+            with DEMO_PARSE_TIME.time():
+                # Executar GUI em segundo plano
+                process = await asyncio.create_subprocess_shell(
+                    f"xvfb-run ./csgo-demoui -demo {demo_path} -json",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True
+                )
+                # stderr lido em paralelo para o pipe não encher e travar o parser
+                stderr_task = asyncio.create_task(process.stderr.read())
+
+                parse_error = None
+                try:
+                    async for path, value in aiter_stream(process.stdout, STREAM_PATHS, KEEP_PATHS):
+                        analysis.add(path, value)
+                except ValueError as e:
+                    # Saída inválida/truncada: parar o parser antes de aguardá-lo
+                    parse_error = e
+                    await self._kill_process_group(process)
+                except asyncio.CancelledError:
+                    # Timeout/cancelamento
+                    await self._kill_process_group(process)
+                    stderr_task.cancel()
+                    raise
+
+                await process.wait()
+                stderr = await stderr_task
+
+                if process.returncode != 0 and parse_error is None:
+                    raise Exception(f"Erro ao processar demo: {stderr.decode()}")
+                if parse_error:
+                    raise Exception(f"Saída inválida do parser: {parse_error}")
+
+                match_stats = analysis.result()
+        except BaseException:
+            positions.abort()
+            raise
+
+        # Arquivo de posições só fica se todas as amostras foram gravadas
+        if 'position_samples' in analysis.failed:
+            positions.abort()
+        else:
+            summary = await asyncio.to_thread(positions.close)
+            self.logger.logger.info(
+                f"Posições da demo {match_id}: {summary['samples']} amostras "
+                f"em {summary['rounds']} rounds ({summary['bytes'] / 1024:.0f} KB)"
+            )
 
-    async def _analyze_economy(self, rounds: List[Dict]) -> Dict:
-        """Analisar economia da partida"""
-        try:
-            analysis = {
-                'average_team_value': {'CT': 0, 'T': 0},
-                'max_team_value': {'CT': 0, 'T': 0},
-                'eco_success_rate': {'CT': 0, 'T': 0},
-                'force_buy_success_rate': {'CT': 0, 'T': 0},
-                'equipment_value_distribution': {
-                    'low': 0,    # < $10000
-                    'medium': 0, # $10000-$20000
-                    'high': 0    # > $20000
-                }
-            }
-
-            eco_rounds = {'CT': {'total': 0, 'won': 0}, 'T': {'total': 0, 'won': 0}}
-            force_rounds = {'CT': {'total': 0, 'won': 0}, 'T': {'total': 0, 'won': 0}}
-
-            for round_data in rounds:
-                # Análise por time
-                for team in ['CT', 'T']:
-                    team_value = round_data[f'{team.lower()}_equipment_value']
-                    
-                    # Atualizar médias e máximos
-                    analysis['average_team_value'][team] += team_value
-                    analysis['max_team_value'][team] = max(
-                        analysis['max_team_value'][team],
-                        team_value
-                    )
-
-                    # Classificar valor do equipamento
-                    if team_value < 10000:
-                        analysis['equipment_value_distribution']['low'] += 1
-                    elif team_value < 20000:
-                        analysis['equipment_value_distribution']['medium'] += 1
-                    else:
-                        analysis['equipment_value_distribution']['high'] += 1
-
-                    # Análise de ecos e force buys
-                    if round_data[f'is_{team.lower()}_eco']:
-                        eco_rounds[team]['total'] += 1
-                        if round_data['winner'] == team:
-                            eco_rounds[team]['won'] += 1
-                    elif round_data[f'is_{team.lower()}_force']:
-                        force_rounds[team]['total'] += 1
-                        if round_data['winner'] == team:
-                            force_rounds[team]['won'] += 1
-
-            # Calcular médias finais
-            for team in ['CT', 'T']:
-                analysis['average_team_value'][team] /= len(rounds)
-                if eco_rounds[team]['total'] > 0:
-                    analysis['eco_success_rate'][team] = \
-                        eco_rounds[team]['won'] / eco_rounds[team]['total']
-                if force_rounds[team]['total'] > 0:
-                    analysis['force_buy_success_rate'][team] = \
-                        force_rounds[team]['won'] / force_rounds[team]['total']
-
-            return analysis
+        # Salvar heatmap da partida (reprocessar a demo não soma de novo)
+        heatmap = match_stats['positions'].get('heatmap')
+        if heatmap is not None and heatmap.map_name:
+            if await self.heatmaps.save_match(match_id, heatmap) is None:
+                raise Exception(f"Erro ao salvar heatmap da demo {match_id}")
 
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao analisar economia: {e}")
-            return {}
+        # Atualizar banco de dados (falha volta o job para a fila)
+        if self.stats_manager:
+            if not await self.stats_manager.save_demo_stats(match_id, match_stats):
+                raise Exception(f"Erro ao salvar stats da demo {match_id}")
 
-    async def _analyze_positions(self, positions: Dict) -> Dict:
-        """Analisar posições e movimentação"""
-        try:
-            analysis = {
-                'heatmaps': {
-                    'kills': {},
-                    'deaths': {},
-                    'bomb_plants': {},
-                    'grenades': {}
-                },
-                'common_angles': {
-                    'CT': [],
-                    'T': []
-                },
-                'entry_paths': {
-                    'successful': [],
-                    'failed': []
-                }
-            }
-
-            # Processar posições de kills
-            for kill in positions['kills']:
-                pos = (kill['x'], kill['y'])
-                analysis['heatmaps']['kills'][pos] = \
-                    analysis['heatmaps']['kills'].get(pos, 0) + 1
-
-                # Registrar ângulos comuns
-                if kill['attacker_team'] == 'CT':
-                    analysis['common_angles']['CT'].append(kill['attacker_angle'])
-                else:
-                    analysis['common_angles']['T'].append(kill['attacker_angle'])
-
-                # Analisar entry paths
-                if kill['is_entry']:
-                    path = kill['attacker_path']
-                    if kill['attacker_team'] == kill['winner_team']:
-                        analysis['entry_paths']['successful'].append(path)
-                    else:
-                        analysis['entry_paths']['failed'].append(path)
-
-            # Processar posições de plantas
-            for plant in positions['bomb_plants']:
-                pos = (plant['x'], plant['y'])
-                analysis['heatmaps']['bomb_plants'][pos] = \
-                    analysis['heatmaps']['bomb_plants'].get(pos, 0) + 1
-
-            # Processar uso de granadas
-            for nade in positions['grenades']:
-                pos = (nade['x'], nade['y'])
-                analysis['heatmaps']['grenades'][pos] = \
-                    analysis['heatmaps']['grenades'].get(pos, 0) + 1
-
-            return analysis
+        # Mover demo para pasta processed
+        processed_dir = self.demos_dir / 'processed'
+        processed_dir.mkdir(exist_ok=True)
+        demo_path.rename(processed_dir / demo_path.name)
 
-        except Exception as e:
-            self.logger.logger.error(f"Erro ao analisar posições: {e}")
-            return {}
\ No newline at end of file
+        self.logger.logger.info(f"Demo {match_id} processada com sucesso")
@@ -0,0 +1,210 @@
+"""
+Demo Queue - Persistent demo processing jobs (Postgres)
+Author: adamguedesmtm
+Created: 2025-02-27 15:02:17
+"""
+
+import os
+import socket
+from typing import Dict, List, Optional
+from .logger import Logger
+from .database import DatabaseManager
+
+# Estados de um job
+STATES = ('queued', 'running', 'done', 'failed')
+
+# Reserva o próximo job pendente. Jobs `running` com lease vencido são de
+# um worker que caiu e voltam a ser elegíveis; SKIP LOCKED deixa vários
+# workers (ou processos) reservarem em paralelo sem pegar o mesmo job.
+CLAIM_QUERY = """
+    UPDATE demo_jobs
+    SET state = 'running',
+        attempts = attempts + 1,
+        lease_owner = $1,
+        lease_until = now() + make_interval(secs => $2),
+        updated_at = now()
+    WHERE id = (
+        SELECT id
+        FROM demo_jobs
+        WHERE (state = 'queued' AND run_after <= now())
+           OR (state = 'running' AND lease_until < now())
+        ORDER BY priority, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, match_id, demo_path, priority, attempts, max_attempts
+"""
+
+# Falha: volta para a fila com espera crescente até esgotar as tentativas
+FAIL_QUERY = """
+    UPDATE demo_jobs
+    SET state = CASE
+            WHEN $3 AND attempts < max_attempts THEN 'queued'
+            ELSE 'failed'
+        END,
+        run_after = now() + make_interval(secs => $4 * attempts),
+        lease_owner = NULL,
+        lease_until = NULL,
+        last_error = $5,
+        updated_at = now()
+    WHERE id = $1 AND lease_owner = $2
+    RETURNING state
+"""
+
+
+class DemoJobQueue:
+    """Fila de demos na tabela `demo_jobs` (migração 10).
+
+    Cada job passa por queued -> running -> done/failed. Um worker que
+    reserva um job recebe um lease de `lease_seconds`, renovado enquanto
+    o processamento dura; se o bot cair, o lease vence e o job é
+    reservado de novo na próxima vez que algum worker procurar trabalho.
+    """
+
+    def __init__(self,
+                 db: DatabaseManager,
+                 logger: Optional[Logger] = None,
+                 lease_seconds: float = 60.0,
+                 max_attempts: int = 3,
+                 retry_delay: float = 60.0):
+        self.db = db
+        self.logger = logger or Logger('demo_queue')
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Identifica este processo nos leases
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def owner(self, worker_id: int) -> str:
+        return f"{self.owner_prefix}:{worker_id}"
+
+    async def enqueue(self, match_id: str, demo_path: str, priority: int = 0) -> Optional[int]:
+        """Adicionar job; retorna o id"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                return await conn.fetchval("""
+                    INSERT INTO demo_jobs (match_id, demo_path, priority, max_attempts)
+                    VALUES ($1, $2, $3, $4)
+                    RETURNING id
+                """, match_id, demo_path, priority, self.max_attempts)
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao enfileirar job de demo: {e}")
+            return None
+
+    async def claim(self, owner: str) -> Optional[Dict]:
+        """Reservar o próximo job (maior prioridade, mais antigo)"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                row = await conn.fetchrow(CLAIM_QUERY, owner, self.lease_seconds)
+                return dict(row) if row else None
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao reservar job de demo: {e}")
+            return None
+
+    async def renew(self, job_id: int, owner: str) -> bool:
+        """Estender o lease de um job em processamento"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                result = await conn.execute("""
+                    UPDATE demo_jobs
+                    SET lease_until = now() + make_interval(secs => $3),
+                        updated_at = now()
+                    WHERE id = $1 AND lease_owner = $2 AND state = 'running'
+                """, job_id, owner, self.lease_seconds)
+                return result.endswith(" 1")
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao renovar lease do job {job_id}: {e}")
+            return False
+
+    async def complete(self, job_id: int, owner: str):
+        """Marcar job como concluído"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                await conn.execute("""
+                    UPDATE demo_jobs
+                    SET state = 'done',
+                        lease_owner = NULL,
+                        lease_until = NULL,
+                        last_error = NULL,
+                        updated_at = now()
+                    WHERE id = $1 AND lease_owner = $2
+                """, job_id, owner)
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao concluir job {job_id}: {e}")
+
+    async def fail(self, job_id: int, owner: str, error: str, retry: bool = True) -> Optional[str]:
+        """Registrar falha; retorna o novo estado (queued para nova tentativa)"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                return await conn.fetchval(
+                    FAIL_QUERY, job_id, owner, retry, self.retry_delay, error[:1000]
+                )
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao registrar falha do job {job_id}: {e}")
+            return None
+
+    async def release(self, job_id: int, owner: str):
+        """Devolver job à fila sem gastar tentativa (ex.: bot encerrando)"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                await conn.execute("""
+                    UPDATE demo_jobs
+                    SET state = 'queued',
+                        attempts = GREATEST(attempts - 1, 0),
+                        run_after = now(),
+                        lease_owner = NULL,
+                        lease_until = NULL,
+                        updated_at = now()
+                    WHERE id = $1 AND lease_owner = $2
+                """, job_id, owner)
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao liberar job {job_id}: {e}")
+
+    async def cancel(self, match_id: str) -> int:
+        """Cancelar jobs ainda na fila de uma partida; retorna quantos"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                result = await conn.execute("""
+                    UPDATE demo_jobs
+                    SET state = 'failed',
+                        last_error = 'cancelado',
+                        updated_at = now()
+                    WHERE match_id = $1 AND state = 'queued'
+                """, match_id)
+                return int(result.split()[-1])
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao cancelar jobs da partida {match_id}: {e}")
+            return 0
+
+    async def counts(self) -> Dict[str, int]:
+        """Número de jobs por estado"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT state, COUNT(*) AS total
+                    FROM demo_jobs
+                    GROUP BY state
+                """)
+                counts = dict.fromkeys(STATES, 0)
+                counts.update({r['state']: r['total'] for r in rows})
+                return counts
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao contar jobs de demo: {e}")
+            return dict.fromkeys(STATES, 0)
+
+    async def list_jobs(self, state: str, limit: int = 5) -> List[Dict]:
+        """Jobs mais recentes em um estado"""
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT id, match_id, priority, state, attempts, max_attempts,
+                           lease_owner, last_error, updated_at
+                    FROM demo_jobs
+                    WHERE state = $1
+                    ORDER BY updated_at DESC
+                    LIMIT $2
+                """, state, limit)
+                return [dict(r) for r in rows]
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao listar jobs de demo: {e}")
+            return []
@@ -0,0 +1,192 @@
+"""
+Heatmap - Grid-binned position heatmaps per map
+Author: adamguedesmtm
+Created: 2025-02-28 14:37:52
+"""
+
+import io
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Camadas e lados de um heatmap (eixos 0 e 1 da grade)
+LAYERS = ('kills', 'deaths', 'bomb_plants', 'grenades')
+SIDES = ('CT', 'T')
+
+# Células por eixo; 128 em um radar de 1024px = 8px por célula
+GRID_SIZE = 128
+
+# Overview do radar de cada mapa: (pos_x, pos_y, escala). O radar cobre
+# 1024 * escala unidades a partir do canto superior esquerdo (pos_x, pos_y)
+MAP_OVERVIEWS = {
+    'de_ancient': (-2953.0, 2164.0, 5.0),
+    'de_anubis': (-2796.0, 3328.0, 5.22),
+    'de_dust2': (-2476.0, 3239.0, 4.4),
+    'de_inferno': (-2087.0, 3870.0, 4.9),
+    'de_mirage': (-3230.0, 1713.0, 5.0),
+    'de_nuke': (-3453.0, 2887.0, 7.0),
+    'de_overpass': (-4831.0, 1781.0, 5.2),
+    'de_train': (-2308.0, 2078.0, 4.082077),
+    'de_vertigo': (-3168.0, 1762.0, 4.0)
+}
+# Mapas sem overview conhecido: área de -4096 a 4096 nos dois eixos
+DEFAULT_OVERVIEW = (-4096.0, 4096.0, 8.0)
+RADAR_SIZE = 1024
+
+# Contagens serializadas como uint32 little-endian comprimido (grades
+# esparsas: poucos KB por partida)
+_STORED_DTYPE = np.dtype('<u4')
+
+
+def map_bounds(map_name: Optional[str]) -> Tuple[float, float, float, float]:
+    """Área do mapa em coordenadas do jogo: (x_min, x_max, y_min, y_max)"""
+    pos_x, pos_y, scale = MAP_OVERVIEWS.get(map_name, DEFAULT_OVERVIEW)
+    extent = RADAR_SIZE * scale
+    return pos_x, pos_x + extent, pos_y - extent, pos_y
+
+
+def pack_grid(grid: np.ndarray) -> bytes:
+    """Serializar uma grade de contagens"""
+    return zlib.compress(grid.astype(_STORED_DTYPE, copy=False).tobytes())
+
+
+def unpack_grid(data: bytes, shape: Tuple[int, ...]) -> np.ndarray:
+    """Grade serializada por `pack_grid`"""
+    grid = np.frombuffer(zlib.decompress(data), dtype=_STORED_DTYPE)
+    return grid.reshape(shape).astype(np.uint32)
+
+
+def _colormap() -> np.ndarray:
+    """Tabela RGBA de 256 cores: transparente -> vermelho -> amarelo -> branco"""
+    t = np.linspace(0.0, 3.0, 256)
+    colors = np.empty((256, 4), dtype=np.uint8)
+    colors[:, 0] = np.clip(t, 0, 1) * 255
+    colors[:, 1] = np.clip(t - 1, 0, 1) * 255
+    colors[:, 2] = np.clip(t - 2, 0, 1) * 255
+    colors[:, 3] = np.clip(t, 0, 1) * 210
+    return colors
+
+
+COLORMAP = _colormap()
+
+
+def render_png(grid: np.ndarray, image_size: int = 512,
+               background: Optional[Path] = None) -> bytes:
+    """Desenhar uma grade 2D como PNG, sobre o radar do mapa se houver"""
+    # Escala logarítmica: poucas células muito quentes não apagam o resto
+    values = np.log1p(grid.astype(np.float32))
+    peak = values.max()
+    if peak > 0:
+        values /= peak
+    overlay = Image.fromarray(COLORMAP[(values * 255).astype(np.uint8)], 'RGBA')
+    overlay = overlay.resize((image_size, image_size), Image.BILINEAR)
+    # Suavizar as bordas das células
+    overlay = overlay.filter(ImageFilter.GaussianBlur(image_size / 256))
+
+    if background and background.exists():
+        with Image.open(background) as radar:
+            image = radar.convert('RGBA').resize((image_size, image_size))
+    else:
+        image = Image.new('RGBA', (image_size, image_size), (24, 24, 28, 255))
+    image.alpha_composite(overlay)
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Heatmap:
+    """Contagens de eventos em uma grade fixa do mapa.
+
+    A grade tem forma (camadas, lados, linhas, colunas) em uint32, com a
+    linha 0 no topo do radar (maior y), então o tamanho não depende de
+    quantos eventos ou partidas foram somados. Heatmaps do mesmo mapa e
+    tamanho podem ser somados com `merge`, o que permite agregar muitas
+    partidas com a memória de uma só.
+    """
+
+    def __init__(self, map_name: Optional[str], size: int = GRID_SIZE,
+                 grid: Optional[np.ndarray] = None, matches: int = 0):
+        self.map_name = map_name
+        self.size = size
+        self.bounds = map_bounds(map_name)
+        shape = (len(LAYERS), len(SIDES), size, size)
+        if grid is None:
+            grid = np.zeros(shape, dtype=np.uint32)
+        elif grid.shape != shape:
+            raise ValueError(f"Grade com forma {grid.shape}, esperado {shape}")
+        self.grid = grid
+        # Partidas somadas neste heatmap
+        self.matches = matches
+        # Pontos fora da área do mapa (descartados)
+        self.dropped = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.grid.nbytes
+
+    def to_bytes(self) -> bytes:
+        """Grade comprimida para persistência"""
+        return pack_grid(self.grid)
+
+    @classmethod
+    def from_bytes(cls, map_name: Optional[str], data: bytes,
+                   size: int = GRID_SIZE, matches: int = 1) -> 'Heatmap':
+        """Heatmap salvo com `to_bytes`"""
+        shape = (len(LAYERS), len(SIDES), size, size)
+        return cls(map_name, size, unpack_grid(data, shape), matches)
+
+    def _cells(self, xs: Sequence[float], ys: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Índice linear da célula de cada ponto e máscara dos que caem na grade"""
+        x_min, x_max, y_min, y_max = self.bounds
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        columns = np.floor((xs - x_min) * (self.size / (x_max - x_min)))
+        rows = np.floor((y_max - ys) * (self.size / (y_max - y_min)))
+        inside = (columns >= 0) & (columns < self.size) & (rows >= 0) & (rows < self.size)
+        return rows[inside].astype(np.intp) * self.size + columns[inside].astype(np.intp), inside
+
+    def add_points(self, layer: str, side: str, xs: Sequence[float], ys: Sequence[float]):
+        """Somar pontos (x, y) à camada/lado, todos de uma vez"""
+        cells, inside = self._cells(xs, ys)
+        self.dropped += int(inside.size - np.count_nonzero(inside))
+        # Mesmo resultado de um histogram2d com bordas fixas, sem recalcular bordas
+        counts = np.bincount(cells, minlength=self.size * self.size)
+        self.grid[LAYERS.index(layer), SIDES.index(side)] += \
+            counts.reshape(self.size, self.size).astype(np.uint32)
+
+    def layer(self, layer: str, side: Optional[str] = None) -> np.ndarray:
+        """Grade 2D de uma camada; sem lado, soma CT e T"""
+        grids = self.grid[LAYERS.index(layer)]
+        if side is None:
+            return grids.sum(axis=0, dtype=np.uint32)
+        return grids[SIDES.index(side)]
+
+    def total(self, layer: Optional[str] = None) -> int:
+        """Número de eventos na grade (ou em uma camada)"""
+        if layer is None:
+            return int(self.grid.sum(dtype=np.uint64))
+        return int(self.grid[LAYERS.index(layer)].sum(dtype=np.uint64))
+
+    def merge(self, other: 'Heatmap') -> 'Heatmap':
+        """Somar outro heatmap do mesmo mapa e tamanho a este"""
+        if other.map_name != self.map_name or other.size != self.size:
+            raise ValueError(
+                f"Heatmaps incompatíveis: {other.map_name}/{other.size} "
+                f"em {self.map_name}/{self.size}"
+            )
+        self.grid += other.grid
+        self.matches += other.matches
+        self.dropped += other.dropped
+        return self
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Eventos por camada e lado"""
+        totals = self.grid.sum(axis=(2, 3), dtype=np.uint64).tolist()
+        return {
+            layer: dict(zip(SIDES, totals[i]))
+            for i, layer in enumerate(LAYERS)
+        }
@@ -0,0 +1,215 @@
+"""
+Heatmap Store - Persisted match heatmaps, per-map aggregates and rendered PNG cache
+Author: adamguedesmtm
+Created: 2025-02-28 16:05:38
+"""
+
+import asyncio
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from .logger import Logger
+from .database import DatabaseManager
+from .heatmap import GRID_SIZE, LAYERS, SIDES, Heatmap, pack_grid, render_png, unpack_grid
+from .telemetry import HEATMAP_CACHE, HEATMAP_RENDER_TIME
+
+# Soma a partida nova ao agregado existente (grade já somada em Python)
+UPSERT_AGGREGATE_QUERY = """
+    INSERT INTO heatmap_aggregates (map_name, grid_size, side, layer, grid, matches)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (map_name, grid_size, side, layer) DO UPDATE
+    SET grid = EXCLUDED.grid,
+        matches = heatmap_aggregates.matches + EXCLUDED.matches,
+        updated_at = now()
+"""
+
+
+class HeatmapStore:
+    """Heatmaps por partida (`match_heatmaps`) e agregados por mapa
+    (`heatmap_aggregates`, migração 11).
+
+    Cada partida salva soma sua grade ao agregado do mapa na mesma
+    transação, então "todas as partidas" é uma leitura de uma linha por
+    lado. Recortes das últimas N partidas somam as grades salvas.
+
+    PNGs renderizados ficam em um LRU em memória, validados pelo
+    `updated_at` do agregado do mapa: uma partida nova no mapa invalida
+    as imagens dele, inclusive em outro processo (bot e web).
+    """
+
+    def __init__(self,
+                 db: DatabaseManager,
+                 logger: Optional[Logger] = None,
+                 cache_size: int = 32,
+                 radar_dir: str = "/opt/cs2server/assets/radars",
+                 image_size: int = 512):
+        self.db = db
+        self.logger = logger or Logger('heatmap_store')
+        self.cache_size = cache_size
+        self.radar_dir = Path(radar_dir)
+        self.image_size = image_size
+        # (mapa, camada, lado, últimas) -> (versão, png, partidas)
+        self._cache: OrderedDict = OrderedDict()
+
+    async def save_match(self, match_id: str, heatmap: Heatmap) -> Optional[bool]:
+        """Salvar heatmap da partida e somá-lo ao agregado do mapa.
+
+        Retorna False se a partida já estava salva (demo reprocessada), sem
+        contar a partida duas vezes no agregado, e None se o banco falhou.
+        """
+        try:
+            data = await asyncio.to_thread(heatmap.to_bytes)
+            async with self.db.pool.acquire() as conn:
+                async with conn.transaction():
+                    # Partidas do mesmo mapa atualizam o agregado uma por vez
+                    await conn.execute(
+                        "SELECT pg_advisory_xact_lock(hashtext($1))",
+                        f"heatmap:{heatmap.map_name}"
+                    )
+                    inserted = await conn.fetchval("""
+                        INSERT INTO match_heatmaps (match_id, map_name, grid_size, grid)
+                        VALUES ($1, $2, $3, $4)
+                        ON CONFLICT (match_id) DO NOTHING
+                        RETURNING match_id
+                    """, match_id, heatmap.map_name, heatmap.size, data)
+                    if inserted is None:
+                        return False
+
+                    rows = await conn.fetch("""
+                        SELECT side, layer, grid
+                        FROM heatmap_aggregates
+                        WHERE map_name = $1 AND grid_size = $2
+                    """, heatmap.map_name, heatmap.size)
+                    updates = await asyncio.to_thread(self._merge_aggregate, heatmap, rows)
+                    await conn.executemany(UPSERT_AGGREGATE_QUERY, updates)
+            return True
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao salvar heatmap da partida {match_id}: {e}")
+            return None
+
+    @staticmethod
+    def _merge_aggregate(heatmap: Heatmap, rows) -> List[Tuple]:
+        """Linhas do agregado com a partida somada, uma por (lado, camada)"""
+        shape = (heatmap.size, heatmap.size)
+        current = {(row['layer'], row['side']): row['grid'] for row in rows}
+        updates = []
+        for i, layer in enumerate(LAYERS):
+            for j, side in enumerate(SIDES):
+                grid = heatmap.grid[i, j]
+                if (layer, side) in current:
+                    grid = grid + unpack_grid(current[(layer, side)], shape)
+                updates.append((
+                    heatmap.map_name, heatmap.size, side, layer,
+                    pack_grid(grid), heatmap.matches
+                ))
+        return updates
+
+    async def aggregate(self,
+                        map_name: str,
+                        layer: str,
+                        side: Optional[str] = None,
+                        last: Optional[int] = None) -> Tuple[Optional[np.ndarray], int]:
+        """Grade 2D de uma camada somada em todas as partidas do mapa (ou
+        nas últimas `last`) e o número de partidas; sem lado, CT + T"""
+        try:
+            sides = [side] if side else list(SIDES)
+            async with self.db.pool.acquire() as conn:
+                if last is None:
+                    rows = await conn.fetch("""
+                        SELECT grid, matches
+                        FROM heatmap_aggregates
+                        WHERE map_name = $1 AND grid_size = $2
+                          AND layer = $3 AND side = ANY($4::varchar[])
+                    """, map_name, GRID_SIZE, layer, sides)
+                    if not rows:
+                        return None, 0
+                    matches = max(row['matches'] for row in rows)
+                    grid = await asyncio.to_thread(
+                        self._sum_layers, [row['grid'] for row in rows]
+                    )
+                else:
+                    rows = await conn.fetch("""
+                        SELECT grid
+                        FROM match_heatmaps
+                        WHERE map_name = $1 AND grid_size = $2
+                        ORDER BY created_at DESC
+                        LIMIT $3
+                    """, map_name, GRID_SIZE, last)
+                    if not rows:
+                        return None, 0
+                    matches = len(rows)
+                    grid = await asyncio.to_thread(
+                        self._sum_matches, [row['grid'] for row in rows], map_name, layer, sides
+                    )
+            return grid, matches
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao carregar heatmap de {map_name}: {e}")
+            return None, 0
+
+    @staticmethod
+    def _sum_layers(blobs: List[bytes]) -> np.ndarray:
+        """Somar grades 2D do agregado (um lado por linha)"""
+        total = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint32)
+        for blob in blobs:
+            total += unpack_grid(blob, total.shape)
+        return total
+
+    @staticmethod
+    def _sum_matches(blobs: List[bytes], map_name: str,
+                     layer: str, sides: List[str]) -> np.ndarray:
+        """Somar a camada/lados pedidos dos heatmaps completos das partidas"""
+        total = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint32)
+        layer_index = LAYERS.index(layer)
+        side_indices = [SIDES.index(side) for side in sides]
+        for blob in blobs:
+            heatmap = Heatmap.from_bytes(map_name, blob)
+            total += heatmap.grid[layer_index, side_indices].sum(axis=0, dtype=np.uint32)
+        return total
+
+    async def version(self, map_name: str):
+        """Última atualização dos heatmaps do mapa (None se não houver)"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT max(updated_at)
+                FROM heatmap_aggregates
+                WHERE map_name = $1 AND grid_size = $2
+            """, map_name, GRID_SIZE)
+
+    async def render(self,
+                     map_name: str,
+                     layer: str,
+                     side: Optional[str] = None,
+                     last: Optional[int] = None) -> Optional[Tuple[bytes, int]]:
+        """PNG do heatmap agregado e número de partidas somadas; None se o
+        mapa não tiver partidas"""
+        try:
+            version = await self.version(map_name)
+            if version is None:
+                return None
+
+            key = (map_name, layer, side, last)
+            cached = self._cache.get(key)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(key)
+                HEATMAP_CACHE.inc(result='hit')
+                return cached[1], cached[2]
+            HEATMAP_CACHE.inc(result='miss')
+
+            with HEATMAP_RENDER_TIME.time():
+                grid, matches = await self.aggregate(map_name, layer, side, last)
+                if grid is None:
+                    return None
+                image = await asyncio.to_thread(
+                    render_png, grid, self.image_size, self.radar_dir / f"{map_name}.png"
+                )
+
+            self._cache[key] = (version, image, matches)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return image, matches
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao renderizar heatmap de {map_name}: {e}")
+            return None
@@ -11,17 +11,18 @@ import discord
 from .logger import Logger
 from .metrics import MetricsManager
 from .stats_manager import StatsManager
-from .rcon_manager import RconManager
+from .rcon_manager import RCONManager
 
 class MatchzyManager:
     def __init__(self,
                  logger: Optional[Logger] = None,
                  metrics: Optional[MetricsManager] = None,
-                 stats_manager: Optional[StatsManager] = None):
+                 stats_manager: Optional[StatsManager] = None,
+                 rcon: Optional[RCONManager] = None):
         self.logger = logger or Logger('matchzy')
         self.metrics = metrics
         self.stats_manager = stats_manager
-        self.rcon = RconManager()
+        self.rcon = rcon or RCONManager(logger=self.logger)
         
         # Controle de servidor ativo
         self.active_server = None  # Guarda informações do servidor ativo
@@ -104,14 +105,14 @@ class MatchzyManager:
             match command:
                 case "!ready":
                     if self.match_state['active']:
-                        await self.rcon.execute('say "Partida já está em andamento!"')
+                        await self.rcon.execute_nowait('say "Partida já está em andamento!"')
                         return False
                     if discord_id in self.ready_players:
-                        await self.rcon.execute(f'say "{player_name} já está pronto!"')
+                        await self.rcon.execute_nowait(f'say "{player_name} já está pronto!"')
                         return False
                     self.ready_players.add(discord_id)
                     self.players[discord_id]['ready'] = True
-                    await self.rcon.execute(f'say "{player_name} está pronto! ({len(self.ready_players)}/{len(self.players)} prontos)"')
+                    await self.rcon.execute_nowait(f'say "{player_name} está pronto! ({len(self.ready_players)}/{len(self.players)} prontos)"')
                     
                     # Verificar se todos estão prontos
                     if self._all_players_ready() and self._are_teams_balanced():
@@ -122,35 +123,35 @@ class MatchzyManager:
                     if self.match_state['active']:
                         return False
                     if discord_id not in self.ready_players:
-                        await self.rcon.execute(f'say "{player_name} não estava pronto!"')
+                        await self.rcon.execute_nowait(f'say "{player_name} não estava pronto!"')
                         return False
                     self.ready_players.discard(discord_id)
                     self.players[discord_id]['ready'] = False
-                    await self.rcon.execute(f'say "{player_name} não está mais pronto! ({len(self.ready_players)}/{len(self.players)} prontos)"')
+                    await self.rcon.execute_nowait(f'say "{player_name} não está mais pronto! ({len(self.ready_players)}/{len(self.players)} prontos)"')
                     return True
 
                 case "!pause":
                     if not self.match_state['active']:
                         return False
                     if self.match_state['paused']:
-                        await self.rcon.execute('say "Partida já está pausada!"')
+                        await self.rcon.execute_nowait('say "Partida já está pausada!"')
                         return False
                     await self.rcon.execute('mp_pause_match')
                     self.match_state['paused'] = True
-                    await self.rcon.execute(f'say "Partida pausada por {player_name}"')
+                    await self.rcon.execute_nowait(f'say "Partida pausada por {player_name}"')
                     return True
 
                 case "!tech":
                     if not self.match_state['active'] or self.match_state['paused']:
                         return False
                     if self.match_state[f'tech_pauses_{player_team}'] >= 4:
-                        await self.rcon.execute(f'say "Time {player_team} não tem mais pauses técnicos!"')
+                        await self.rcon.execute_nowait(f'say "Time {player_team} não tem mais pauses técnicos!"')
                         return False
                     await self.rcon.execute('mp_pause_match')
                     self.match_state['paused'] = True
                     self.match_state['tech_pause'] = True
                     self.match_state[f'tech_pauses_{player_team}'] += 1
-                    await self.rcon.execute(f'say "Pause técnico por {player_name} ({self.match_state[f"tech_pauses_{player_team}"]}/4 restantes)"')
+                    await self.rcon.execute_nowait(f'say "Pause técnico por {player_name} ({self.match_state[f"tech_pauses_{player_team}"]}/4 restantes)"')
                     asyncio.create_task(self._tech_pause_timer())
                     return True
 
@@ -158,21 +159,21 @@ class MatchzyManager:
                     if not self.match_state['active'] or not self.match_state['paused']:
                         return False
                     if self.match_state['tech_pause']:
-                        await self.rcon.execute('say "Aguarde o fim do pause técnico!"')
+                        await self.rcon.execute_nowait('say "Aguarde o fim do pause técnico!"')
                         return False
                     self.match_state['unpause_votes'].add(player_team)
                     remaining = 2 - len(self.match_state['unpause_votes'])
-                    await self.rcon.execute(f'say "Time {player_team} votou para despausar! (Faltam {remaining} votos)"')
+                    await self.rcon.execute_nowait(f'say "Time {player_team} votou para despausar! (Faltam {remaining} votos)"')
                     if len(self.match_state['unpause_votes']) == 2:
                         await self.rcon.execute('mp_unpause_match')
                         self.match_state['paused'] = False
                         self.match_state['unpause_votes'].clear()
-                        await self.rcon.execute('say "Partida despausada!"')
+                        await self.rcon.execute_nowait('say "Partida despausada!"')
                     return True
 
                 case "!score":
                     score_message = f"Score: CT {self.match_state['score_ct']} - {self.match_state['score_t']} T (Round {self.match_state['round']})"
-                    await self.rcon.execute(f'say "{score_message}"')
+                    await self.rcon.execute_nowait(f'say "{score_message}"')
                     return True
 
             return False
@@ -194,8 +195,9 @@ class MatchzyManager:
                 'say "!score - Ver placar atual"'
             ]
 
+            # Mensagens de chat não precisam aguardar resposta
             for msg in welcome_message:
-                await self.rcon.execute(msg)
+                await self.rcon.execute_nowait(msg)
 
             if self.metrics:
                 await self.metrics.record_player_stat('cs2_listeners_setup', '1')
@@ -210,11 +212,11 @@ class MatchzyManager:
         """Iniciar partida"""
         try:
             if not self._are_teams_balanced():
-                await self.rcon.execute('say "Times precisam estar balanceados para iniciar!"')
+                await self.rcon.execute_nowait('say "Times precisam estar balanceados para iniciar!"')
                 return False
 
             if not self._all_players_ready():
-                await self.rcon.execute('say "Todos os jogadores precisam estar prontos!"')
+                await self.rcon.execute_nowait('say "Todos os jogadores precisam estar prontos!"')
                 return False
 
             # Bloquear mudanças de equipe
@@ -223,9 +225,8 @@ class MatchzyManager:
             self.match_state['warmup'] = False
 
             # Iniciar partida
-            await self.rcon.execute('mp_warmup_end')
-            await self.rcon.execute('mp_restartgame 1')
-            await self.rcon.execute('say "Partida iniciando! Boa sorte a todos!"')
+            await self.rcon.execute_many(['mp_warmup_end', 'mp_restartgame 1'])
+            await self.rcon.execute_nowait('say "Partida iniciando! Boa sorte a todos!"')
 
             if self.metrics:
                 await self.metrics.record_player_stat('matches_started', '1')
@@ -252,7 +253,7 @@ class MatchzyManager:
 
                 # Finalizar via RCON
                 await self.rcon.execute('mp_endmatch')
-                await self.rcon.execute('say "Partida finalizada!"')
+                await self.rcon.execute_nowait('say "Partida finalizada!"')
 
                 # Limpar servidor ativo
                 self.active_server = None
@@ -332,13 +333,13 @@ class MatchzyManager:
         try:
             await asyncio.sleep(150)  # 2:30 minutos
             if self.match_state.get('tech_pause', False):
-                await self.rcon.execute('say "30 segundos restantes no pause técnico"')
+                await self.rcon.execute_nowait('say "30 segundos restantes no pause técnico"')
                 await asyncio.sleep(30)
                 if self.match_state.get('tech_pause', False):
                     await self.rcon.execute('mp_unpause_match')
                     self.match_state['paused'] = False
                     self.match_state['tech_pause'] = False
-                    await self.rcon.execute('say "Pause técnico finalizado"')
+                    await self.rcon.execute_nowait('say "Pause técnico finalizado"')
 
         except Exception as e:
             self.logger.error(f"Erro no timer de pause técnico: {e}")
@@ -388,7 +389,7 @@ class MatchzyManager:
 
                 # Finalizar via RCON
                 await self.rcon.execute('mp_endmatch')
-                await self.rcon.execute('say "Servidor sendo encerrado!"')
+                await self.rcon.execute_nowait('say "Servidor sendo encerrado!"')
 
                 # Limpar estado
                 self._reset_match_state()
@@ -4,17 +4,29 @@ Author: adamguedesmtm
 Created: 2025-02-21 15:54:36
 """
 
-from typing import Optional, Dict, List, Any, Union
+from typing import Optional, Dict, Iterable, List, Any, Set, Tuple
+import asyncio
+import bisect
 import time
-import json
 from pathlib import Path
 from datetime import datetime
 from .logger import Logger
+from .metrics_store import MetricsStore
+from .rating_history import RatingHistory
+from .telemetry import REGISTRY, write_textfile
+
+# Buckets de duração de partidas, em segundos (5min a 2h)
+MATCH_DURATION_BUCKETS = (300, 600, 900, 1200, 1800, 2400, 3000, 3600, 5400, 7200)
 
 class MetricsManager:
     def __init__(self, 
                  data_dir: str = "/opt/cs2bot/data",
-                 logger: Optional[Logger] = None):
+                 logger: Optional[Logger] = None,
+                 flush_interval: float = 5.0,
+                 flush_threshold: int = 100,
+                 history_raw_days: int = 30,
+                 history_max_points: int = 1000,
+                 history_cache_size: int = 1024):
         self.logger = logger or Logger('metrics')
         self.data_dir = Path(data_dir)
         
@@ -34,40 +46,254 @@ class MetricsManager:
             'score_updates': 0
         }
         self.start_time = time.time()
-        
-        # Arquivos de dados
+
+        # Métricas exportadas no formato Prometheus (data_dir/metrics.prom,
+        # servidas pelo /metrics da web)
+        self.registry = REGISTRY
+        self.metrics_file = self.data_dir / "metrics.prom"
+        self._commands = REGISTRY.counter('commands_total', 'Ações registradas pelos managers')
+        self._events = REGISTRY.counter('events_total', 'Eventos do sistema (record_player_stat)')
+        self._matches_setup = REGISTRY.counter('matches_setup_total', 'Partidas configuradas')
+        self._matches_started = REGISTRY.counter('matches_started_total', 'Partidas iniciadas')
+        self._match_duration = REGISTRY.histogram(
+            'match_duration_seconds',
+            'Duração das partidas',
+            buckets=MATCH_DURATION_BUCKETS
+        )
+        self._matches_active = REGISTRY.gauge('matches_active', 'Partidas em andamento')
+        self._uptime = REGISTRY.gauge('uptime_seconds', 'Tempo desde o início do bot')
+        self._players_tracked = REGISTRY.gauge('players_tracked', 'Jogadores com métricas carregadas')
+        self._pending_writes = REGISTRY.gauge('metrics_pending_writes', 'Registros aguardando flush')
+        # Início das partidas em andamento, por tipo (mais antiga primeiro)
+        self._match_starts: Dict[str, List[float]] = {}
+
+        # Persistência (SQLite WAL; importa os antigos JSON na primeira vez)
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.players_file = self.data_dir / "players.json"
-        self.matches_file = self.data_dir / "matches.json"
-        self.accounts_file = self.data_dir / "accounts.json"
-        
+        self.store = MetricsStore(self.data_dir / "metrics.db", logger=self.logger)
+        self.store.import_json(
+            self.data_dir / "players.json",
+            self.data_dir / "matches.json",
+            self.data_dir / "accounts.json"
+        )
+
         # Carregar dados
-        self.players = self._load_json(self.players_file, {})
-        self.matches = self._load_json(self.matches_file, [])
-        self.accounts = self._load_json(self.accounts_file, {})
+        self.players = self.store.load_players()
+        self.rating_history = RatingHistory(
+            self.store,
+            raw_days=history_raw_days,
+            max_points=history_max_points,
+            cache_size=history_cache_size
+        )
+        self.accounts = self.store.load_accounts()
+
+        # Índice reverso steam_id -> discord_id (mantido por link_accounts)
+        self._discord_by_steam: Dict[str, str] = {
+            account['steam_id']: discord_id
+            for discord_id, account in self.accounts.items()
+            if account.get('steam_id')
+        }
+        self._next_match_id = self.store.next_match_id()
+
+        # Ranking ordenado em cache (invalidado quando ratings mudam)
+        self._ranking: Optional[List[Tuple[float, str]]] = None
+
+        # Buffer write-behind: registros alterados desde o último flush
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._dirty_players: Set[str] = set()
+        self._dirty_accounts: Set[str] = set()
+        self._pending_matches: List[Dict] = []
+        self._flush_lock = asyncio.Lock()
+        # Registros marcados durante um flush: ele grava de novo ao terminar
+        self._flush_again = False
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Converter listas `history` antigas, guardadas dentro do jogador
+        legacy = [steam_id for steam_id, player in self.players.items() if 'history' in player]
+        for steam_id in legacy:
+            self.rating_history.import_legacy(steam_id, self.players[steam_id].pop('history'))
+        if legacy:
+            self._persist(players=legacy)
+
+    def _persist(self,
+                 players: Iterable[str] = (),
+                 accounts: Iterable[str] = (),
+                 matches: Iterable[Dict] = ()):
+        """Marcar registros alterados para gravação (write-behind).
+
+        Com o loop de flush ativo, as alterações são agrupadas e gravadas
+        em background; sem ele (ex.: scripts), são gravadas na hora.
+        """
+        self._dirty_players.update(players)
+        self._dirty_accounts.update(accounts)
+        self._pending_matches.extend(matches)
+
+        if self._flush_lock.locked():
+            # Flush em andamento (ex.: encerramento): ele grava de novo
+            # antes de soltar o lock
+            self._flush_again = True
+            return
+        if self._flush_task is None or self._flush_task.done():
+            batch, pending = self._take_pending()
+            try:
+                self.store.write_batch(batch)
+            except Exception as e:
+                self.logger.error(f"Erro ao salvar métricas: {e}")
+                self._requeue(pending)
+        elif self._pending_count() >= self.flush_threshold:
+            self._flush_wakeup.set()
+
+    def _pending_count(self) -> int:
+        """Número de registros aguardando gravação"""
+        return (
+            len(self._dirty_players) + len(self._dirty_accounts)
+            + len(self._pending_matches) + len(self.rating_history.dirty)
+        )
+
+    def _take_pending(self) -> Tuple[Dict, Tuple]:
+        """Serializar e esvaziar o buffer; devolve o lote e o que reenfileirar se a gravação falhar"""
+        players, accounts, matches = self._dirty_players, self._dirty_accounts, self._pending_matches
+        self._dirty_players, self._dirty_accounts, self._pending_matches = set(), set(), []
+
+        history = self.rating_history.take_dirty()
+        batch = self.store.encode(
+            players=[(steam_id, self.players[steam_id]) for steam_id in players],
+            accounts=[(discord_id, self.accounts[discord_id]) for discord_id in accounts],
+            matches=matches,
+            history=history
+        )
+        return batch, (players, accounts, matches, history)
+
+    def _requeue(self, pending: Tuple):
+        """Devolver ao buffer um lote cuja gravação falhou"""
+        players, accounts, matches, history = pending
+        self._dirty_players.update(players)
+        self._dirty_accounts.update(accounts)
+        self._pending_matches[:0] = matches
+        self.rating_history.restore(history)
+
+    def start(self):
+        """Iniciar loop de flush em background"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Gravar o buffer a cada `flush_interval` ou ao atingir `flush_threshold`"""
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_wakeup.clear()
+                await self.flush()
+                await self.export()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Erro no flush de métricas: {e}")
+
+    async def flush(self):
+        """Gravar buffer pendente sem bloquear o loop (I/O em thread).
+
+        Registros marcados enquanto o lote é gravado entram em outro lote
+        na sequência, antes de soltar o lock.
+        """
+        async with self._flush_lock:
+            while True:
+                self._flush_again = False
+                if not self._pending_count():
+                    return
+
+                batch, pending = self._take_pending()
+                try:
+                    await asyncio.to_thread(self.store.write_batch, batch)
+                except Exception as e:
+                    self.logger.error(f"Erro ao salvar métricas: {e}")
+                    # Reenfileirar para a próxima tentativa
+                    self._requeue(pending)
+                    return
+
+                if not self._flush_again:
+                    return
+
+    async def close(self):
+        """Parar flush, gravar pendências e fechar armazenamento"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
 
-    def _load_json(self, file: Path, default: Union[Dict, List]) -> Union[Dict, List]:
-        """Carregar arquivo JSON"""
         try:
-            if file.exists():
-                with open(file, 'r') as f:
-                    return json.load(f)
+            await self.flush()
+            await self.export()
+            self.store.close()
         except Exception as e:
-            self.logger.error(f"Erro ao carregar {file}: {e}")
-        return default
-    
-    def _save_json(self, file: Path, data: Union[Dict, List]):
-        """Salvar arquivo JSON"""
+            self.logger.error(f"Erro ao fechar métricas: {e}")
+
+    def render_metrics(self) -> str:
+        """Atualizar gauges e exportar todas as métricas (formato Prometheus)"""
+        self._uptime.set(round(time.time() - self.start_time, 3))
+        self._players_tracked.set(len(self.players))
+        self._pending_writes.set(self._pending_count())
+        return self.registry.render()
+
+    async def export(self):
+        """Gravar metrics.prom (render no loop, escrita em thread)"""
         try:
-            with open(file, 'w') as f:
-                json.dump(data, f, indent=2)
+            await asyncio.to_thread(write_textfile, self.metrics_file, self.render_metrics())
         except Exception as e:
-            self.logger.error(f"Erro ao salvar {file}: {e}")
+            self.logger.error(f"Erro ao exportar métricas: {e}")
+
+    async def record_command(self, command: str, value: float = 1):
+        """Registrar ação de um manager (ex.: demo_queued, map_rotation)"""
+        try:
+            self._commands.inc(value, command=command)
+        except Exception as e:
+            self.logger.error(f"Erro ao registrar comando {command}: {e}")
+
+    def record_match_setup(self, match_type: str, is_bo3: bool = False):
+        """Registrar configuração de partida (chamado fora de corrotinas)"""
+        try:
+            self.metrics['matches_setup'] += 1
+            self._matches_setup.inc(type=match_type, bo3=str(bool(is_bo3)).lower())
+        except Exception as e:
+            self.logger.error(f"Erro ao registrar setup de partida: {e}")
+
+    async def record_match_start(self, match_type: str):
+        """Registrar início de partida"""
+        try:
+            self._match_starts.setdefault(match_type, []).append(time.monotonic())
+            self._matches_started.inc(type=match_type)
+            self._matches_active.inc(type=match_type)
+        except Exception as e:
+            self.logger.error(f"Erro ao registrar início de partida: {e}")
+
+    async def record_match_duration(self, match_type: str):
+        """Registrar fim de partida e sua duração.
+
+        Os chamadores informam só o tipo, então com partidas simultâneas do
+        mesmo tipo a duração é medida a partir do início mais antigo.
+        """
+        try:
+            starts = self._match_starts.get(match_type)
+            if not starts:
+                return
+            self._match_duration.observe(time.monotonic() - starts.pop(0), type=match_type)
+            self._matches_active.dec(type=match_type)
+        except Exception as e:
+            self.logger.error(f"Erro ao registrar duração de partida: {e}")
 
     # Métodos existentes do sistema
     async def record_player_stat(self, stat_type: str, value: Any):
         """Registrar estatística do sistema"""
         try:
+            self._events.inc(event=stat_type)
             if stat_type in self.metrics:
                 if isinstance(self.metrics[stat_type], dict):
                     if value in self.metrics[stat_type]:
@@ -96,23 +322,25 @@ class MetricsManager:
     def update_player_rating(self, steam_id: str, new_rating: float, rating_change: float):
         """Atualizar rating de um jogador"""
         if steam_id not in self.players:
-            self.players[steam_id] = {
-                'rating': 1000,
-                'games_played': 0,
-                'wins': 0,
-                'losses': 0,
-                'history': []
-            }
+            self.players[steam_id] = self.get_player_stats(steam_id)
         
         player = self.players[steam_id]
         player['rating'] = new_rating
-        player['history'].append({
-            'timestamp': datetime.utcnow().isoformat(),
-            'rating_change': rating_change,
-            'new_rating': new_rating
-        })
+        self._ranking = None
+        self.rating_history.append(steam_id, new_rating)
         
-        self._save_json(self.players_file, self.players)
+        self._persist(players=[steam_id])
+
+    def get_rating_history(self,
+                           steam_id: str,
+                           since: Optional[float] = None,
+                           until: Optional[float] = None) -> Dict[str, List[float]]:
+        """Histórico de rating para gráficos (timestamps em epoch)"""
+        try:
+            return self.rating_history.query(steam_id, since, until)
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar histórico de rating: {e}")
+            return {'timestamps': [], 'ratings': []}
 
     def get_player_stats(self, steam_id: str) -> Dict:
         """Buscar estatísticas de um jogador"""
@@ -132,13 +360,19 @@ class MetricsManager:
 
     def link_accounts(self, steam_id: str, discord_id: str, discord_name: str):
         """Vincular conta Steam ao Discord"""
+        # Remover vínculo anterior desta conta Discord do índice reverso
+        if previous := self.accounts.get(discord_id):
+            if self._discord_by_steam.get(previous.get('steam_id')) == discord_id:
+                del self._discord_by_steam[previous['steam_id']]
+
+        self._discord_by_steam[steam_id] = discord_id
         self.accounts[discord_id] = {
             'steam_id': steam_id,
             'discord_name': discord_name,
             'linked_at': datetime.utcnow().isoformat(),
             'last_updated': datetime.utcnow().isoformat()
         }
-        self._save_json(self.accounts_file, self.accounts)
+        self._persist(accounts=[discord_id])
 
     def get_steam_id(self, discord_id: str) -> Optional[str]:
         """Buscar Steam ID vinculado ao Discord ID"""
@@ -148,29 +382,46 @@ class MetricsManager:
 
     def get_discord_id(self, steam_id: str) -> Optional[str]:
         """Buscar Discord ID vinculado ao Steam ID"""
-        for discord_id, account in self.accounts.items():
-            if account.get('steam_id') == steam_id:
-                return discord_id
-        return None
+        return self._discord_by_steam.get(steam_id)
 
-    def get_top_players(self, limit: int = 10, page: int = 1) -> List[Dict]:
-        """Buscar top jogadores"""
+    def _get_ranking(self) -> List[Tuple[float, str]]:
+        """Ranking ordenado como chaves (-rating, steam_id), reconstruído só após mudanças"""
+        if self._ranking is None:
+            self._ranking = sorted(
+                (-stats.get('rating', 1000), steam_id)
+                for steam_id, stats in self.players.items()
+            )
+        return self._ranking
+
+    def get_top_players(self,
+                        limit: int = 10,
+                        page: int = 1,
+                        after: Optional[Tuple[float, str]] = None) -> List[Dict]:
+        """Buscar top jogadores.
+
+        `after` é o par (rating, steam_id) do último jogador da página
+        anterior (keyset); sem ele, `page` é usado. Só os jogadores da
+        página são montados.
+        """
         try:
-            players_list = [
-                {
+            ranking = self._get_ranking()
+            if after is not None:
+                start = bisect.bisect_right(ranking, (-after[0], after[1]))
+            else:
+                start = (page - 1) * limit
+
+            players_list = []
+            for _, steam_id in ranking[start:start + limit]:
+                stats = self.players[steam_id]
+                players_list.append({
                     'steam_id': steam_id,
                     'name': self.accounts.get(self.get_discord_id(steam_id), {}).get('discord_name', f"Player_{steam_id[-4:]}"),
                     'rating': stats.get('rating', 1000),
                     'wins': stats.get('wins', 0),
                     'losses': stats.get('losses', 0),
                     'games_played': stats.get('games_played', 0)
-                }
-                for steam_id, stats in self.players.items()
-            ]
-            
-            players_list.sort(key=lambda x: x['rating'], reverse=True)
-            start = (page - 1) * limit
-            return players_list[start:start + limit]
+                })
+            return players_list
             
         except Exception as e:
             self.logger.error(f"Erro ao buscar top players: {e}")
@@ -179,7 +430,8 @@ class MetricsManager:
     def record_match(self, match_data: Dict):
         """Registrar uma partida"""
         try:
-            match_id = len(self.matches)
+            match_id = self._next_match_id
+            self._next_match_id += 1
             
             # Adicionar partida ao histórico
             match = {
@@ -191,10 +443,10 @@ class MetricsManager:
                 'players': match_data.get('players', [])
             }
             
-            self.matches.append(match)
-            self._save_json(self.matches_file, self.matches)
+            self._ranking = None
             
             # Atualizar stats dos jogadores
+            updated = []
             for player_data in match_data.get('players', []):
                 steam_id = player_data.get('steam_id')
                 if not steam_id:
@@ -204,6 +456,7 @@ class MetricsManager:
                     self.players[steam_id] = self.get_player_stats(steam_id)
                 
                 player = self.players[steam_id]
+                updated.append(steam_id)
                 player['games_played'] += 1
                 player['wins'] += 1 if player_data.get('won') else 0
                 player['losses'] += 0 if player_data.get('won') else 1
@@ -223,7 +476,8 @@ class MetricsManager:
                 if player_data.get('won'):
                     player['maps'][map_name]['wins'] += 1
             
-            self._save_json(self.players_file, self.players)
+            # Partida e jogadores afetados gravados juntos
+            self._persist(players=updated, matches=[match])
             
         except Exception as e:
             self.logger.error(f"Erro ao registrar partida: {e}")
\ No newline at end of file
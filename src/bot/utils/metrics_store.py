@@ -0,0 +1,178 @@
+"""
+Metrics Store - SQLite persistence for MetricsManager
+Author: adamguedesmtm
+Created: 2025-02-26 14:08:21
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from .logger import Logger
+
+
+class MetricsStore:
+    """Armazenamento dos dados de jogadores, partidas e contas vinculadas.
+
+    Usa SQLite em modo WAL: cada gravação altera só as linhas envolvidas
+    dentro de uma transação, em vez de reescrever arquivos JSON inteiros,
+    e uma queda no meio da escrita nunca deixa dados pela metade.
+    """
+
+    def __init__(self, path: Path, logger: Optional[Logger] = None):
+        self.path = Path(path)
+        self.logger = logger or Logger('metrics_store')
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Gravações podem rodar em thread (flush do MetricsManager), sempre
+        # uma por vez
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """Criar tabelas (documentos JSON por chave)"""
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS players (
+                    steam_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS accounts (
+                    discord_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS matches (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+
+                -- Séries de rating em colunas (array('d') serializado)
+                CREATE TABLE IF NOT EXISTS rating_history (
+                    steam_id TEXT PRIMARY KEY,
+                    timestamps BLOB NOT NULL,
+                    ratings BLOB NOT NULL
+                );
+            """)
+
+    def is_empty(self) -> bool:
+        """Verificar se o banco ainda não tem dados"""
+        return not any(
+            self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+            for table in ('players', 'accounts', 'matches')
+        )
+
+    def load_players(self) -> Dict[str, Dict]:
+        """Carregar todos os jogadores"""
+        return {
+            steam_id: json.loads(data)
+            for steam_id, data in self.conn.execute("SELECT steam_id, data FROM players")
+        }
+
+    def load_accounts(self) -> Dict[str, Dict]:
+        """Carregar todas as contas vinculadas"""
+        return {
+            discord_id: json.loads(data)
+            for discord_id, data in self.conn.execute("SELECT discord_id, data FROM accounts")
+        }
+
+    def next_match_id(self) -> int:
+        """Próximo id de partida (mantém a numeração a partir de 0)"""
+        last, = self.conn.execute("SELECT MAX(id) FROM matches").fetchone()
+        return 0 if last is None else last + 1
+
+    def get_match(self, match_id: int) -> Optional[Dict]:
+        """Buscar partida pelo id"""
+        row = self.conn.execute(
+            "SELECT data FROM matches WHERE id = ?", (match_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_rating_history(self, steam_id: str) -> Optional[Tuple[bytes, bytes]]:
+        """Buscar série de rating do jogador (timestamps, ratings)"""
+        return self.conn.execute(
+            "SELECT timestamps, ratings FROM rating_history WHERE steam_id = ?",
+            (steam_id,)
+        ).fetchone()
+
+    @staticmethod
+    def encode(players: Iterable[Tuple[str, Dict]] = (),
+               accounts: Iterable[Tuple[str, Dict]] = (),
+               matches: Iterable[Dict] = (),
+               history: Iterable[Tuple[str, bytes, bytes]] = ()) -> Dict[str, List[Tuple]]:
+        """Serializar registros em linhas prontas para gravação.
+
+        Separado de `write_batch` para que a serialização aconteça no
+        loop (documentos consistentes) e só o I/O vá para outra thread.
+        """
+        return {
+            'players': [(steam_id, json.dumps(data)) for steam_id, data in players],
+            'accounts': [(discord_id, json.dumps(data)) for discord_id, data in accounts],
+            'matches': [(match['id'], json.dumps(match)) for match in matches],
+            'history': list(history)
+        }
+
+    def write_batch(self, batch: Dict[str, List[Tuple]]):
+        """Gravar lote serializado em uma única transação"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO players (steam_id, data) VALUES (?, ?)",
+                batch['players']
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO accounts (discord_id, data) VALUES (?, ?)",
+                batch['accounts']
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO matches (id, data) VALUES (?, ?)",
+                batch['matches']
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rating_history (steam_id, timestamps, ratings) "
+                "VALUES (?, ?, ?)",
+                batch['history']
+            )
+
+    def write(self,
+              players: Iterable[Tuple[str, Dict]] = (),
+              accounts: Iterable[Tuple[str, Dict]] = (),
+              matches: Iterable[Dict] = ()):
+        """Gravar jogadores, contas e partidas em uma única transação"""
+        self.write_batch(self.encode(players, accounts, matches))
+
+    def import_json(self, players_file: Path, matches_file: Path, accounts_file: Path):
+        """Importar os antigos arquivos JSON (uma vez, banco vazio)"""
+        files = [f for f in (players_file, matches_file, accounts_file) if f.exists()]
+        if not files or not self.is_empty():
+            return
+
+        def load(file: Path, default):
+            if not file.exists():
+                return default
+            with open(file, 'r') as f:
+                return json.load(f)
+
+        players = load(players_file, {})
+        matches: List[Dict] = load(matches_file, [])
+        accounts = load(accounts_file, {})
+
+        for match_id, match in enumerate(matches):
+            match.setdefault('id', match_id)
+
+        self.write(players.items(), accounts.items(), matches)
+
+        # Manter os originais como backup, fora do caminho de leitura
+        for file in files:
+            file.rename(file.with_name(file.name + '.bak'))
+
+        self.logger.logger.info(
+            f"Métricas importadas dos arquivos JSON: {len(players)} jogadores, "
+            f"{len(matches)} partidas, {len(accounts)} contas"
+        )
+
+    def close(self):
+        """Fechar banco (faz checkpoint do WAL)"""
+        self.conn.close()
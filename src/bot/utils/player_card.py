@@ -8,8 +8,11 @@ from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from typing import Dict, Optional
 import aiohttp
 import io
+import time
 from .logger import Logger
 from .metrics import MetricsManager
+from .telemetry import CARD_RENDER_TIME
+from .tracing import traced
 
 class PlayerCard:
     def __init__(self, assets_dir: str = "/opt/cs2server/assets", logger: Optional[Logger] = None, metrics: Optional[MetricsManager] = None):
@@ -45,8 +48,10 @@ class PlayerCard:
             self.logger.logger.error(f"Erro ao carregar ranks: {e}")
             return {}
 
+    @traced()
     async def generate(self, player_id: int, player_name: str, steam_id: str, avatar_url: Optional[str] = None) -> Optional[io.BytesIO]:
         """Gerar card do jogador"""
+        started = time.perf_counter()
         try:
             # Obter estatísticas
             stats = await self.get_player_stats(player_id)
@@ -144,6 +149,7 @@ class PlayerCard:
             card.save(output, format='PNG')
             output.seek(0)
 
+            CARD_RENDER_TIME.observe(time.perf_counter() - started)
             if self.metrics:
                 await self.metrics.record_command('player_card_generated')
 
@@ -0,0 +1,389 @@
+"""
+Positions - Compact columnar storage for per-tick player positions
+Author: adamguedesmtm
+Created: 2025-03-01 10:21:47
+"""
+
+import json
+import os
+import re
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from .logger import Logger
+
+# Array da saída do parser com uma amostra por (tick, jogador)
+POSITION_PATH = 'positions.ticks'
+
+# Arquivo: blocos de colunas por round, depois o índice (JSON) e o rodapé
+# <tamanho do índice: uint64><MAGIC>. O índice no fim permite gravar as
+# rounds conforme chegam, sem saber os offsets antes.
+MAGIC = b'CS2POS01'
+_FOOTER = struct.Struct('<Q8s')
+FORMAT_VERSION = 1
+
+# Quantização: posição em 0.5 unidade, ângulos em 0.01 grau (cabem em int16)
+POSITION_SCALE = 2
+ANGLE_SCALE = 100
+# Ângulos normalizados para [-180, 180) antes de quantizar: o yaw das
+# demos vai de 0 a 360, o que não cabe em int16 a 0.01 grau
+ANGLE_COLUMNS = ('view_x', 'view_y')
+
+# Coluna -> (dtype, escala); `tick` é gravado como deslocamento desde o
+# primeiro tick da round, em uint16 quando couber
+COLUMNS = {
+    'player': ('<u1', None),
+    'x': ('<i2', POSITION_SCALE),
+    'y': ('<i2', POSITION_SCALE),
+    'z': ('<i2', POSITION_SCALE),
+    'view_x': ('<i2', ANGLE_SCALE),
+    'view_y': ('<i2', ANGLE_SCALE),
+    'health': ('<u1', None),
+    'armor': ('<u1', None),
+    'weapon': ('<u1', None)
+}
+
+# Blocos alinhados para leitura direta como arrays
+_ALIGN = 8
+
+# Ids de partida aceitos como nome de arquivo
+_MATCH_ID = re.compile(r'[\w-]+')
+
+
+def _quantize(values: List[float], dtype: str, scale: Optional[int],
+              angle: bool = False) -> Tuple[np.ndarray, int]:
+    """Valores no tipo da coluna e quantos ficaram fora da faixa (saturados)"""
+    info = np.iinfo(np.dtype(dtype))
+    array = np.asarray(values, dtype=np.float64)
+    if angle:
+        array = np.mod(array + 180.0, 360.0) - 180.0
+    if scale:
+        array = np.rint(array * scale)
+    clipped = int(np.count_nonzero((array < info.min) | (array > info.max)))
+    return np.clip(array, info.min, info.max).astype(dtype), clipped
+
+
+class PositionWriter:
+    """Grava as amostras de posição de uma partida em um arquivo colunar.
+
+    As amostras chegam em ordem de round (streaming do parser); só a round
+    atual fica em memória. Cada round vira um bloco com uma coluna por
+    campo, ordenado por (tick, jogador), e jogadores e armas são
+    guardados como índices em dicionários do arquivo.
+
+    O arquivo é escrito em `<caminho>.tmp` e renomeado em `close`, então
+    um processamento interrompido não deixa arquivo pela metade. Valores
+    fora da faixa da coluna são saturados, contados em `clipped` e
+    registrados no log.
+    """
+
+    def __init__(self, path, match_id: str, logger: Optional[Logger] = None):
+        self.path = Path(path)
+        self.match_id = match_id
+        self.logger = logger or Logger('positions')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self._file = open(self._tmp_path, 'wb')
+
+        self.players: Dict[str, int] = {}
+        self.weapons: Dict[str, int] = {}
+        self.rounds: List[Dict] = []
+        self._round: Optional[int] = None
+        self._ticks: List[int] = []
+        self._columns: Dict[str, List] = {name: [] for name in COLUMNS}
+        # Coluna -> amostras saturadas na partida
+        self.clipped: Dict[str, int] = {}
+
+    def add(self, sample: Dict):
+        """Adicionar uma amostra (round_number, tick, steam_id, x, y, z,
+        view_x, view_y, health, armor, active_weapon)"""
+        round_number = sample['round_number']
+        if round_number != self._round:
+            self._flush_round()
+            if any(r['round'] == round_number for r in self.rounds):
+                raise ValueError(f"Round {round_number} repetida nas posições")
+            self._round = round_number
+
+        player = self.players.setdefault(str(sample['steam_id']), len(self.players))
+        weapon = self.weapons.setdefault(sample.get('active_weapon') or '', len(self.weapons))
+        if player > 255 or weapon > 255:
+            raise ValueError("Mais de 256 jogadores/armas na partida")
+
+        self._ticks.append(sample['tick'])
+        columns = self._columns
+        columns['player'].append(player)
+        columns['x'].append(sample['x'])
+        columns['y'].append(sample['y'])
+        columns['z'].append(sample['z'])
+        columns['view_x'].append(sample['view_x'])
+        columns['view_y'].append(sample['view_y'])
+        columns['health'].append(sample['health'])
+        columns['armor'].append(sample['armor'])
+        columns['weapon'].append(weapon)
+
+    def _write(self, array: np.ndarray) -> int:
+        """Gravar um array alinhado; retorna o offset"""
+        padding = -self._file.tell() % _ALIGN
+        if padding:
+            self._file.write(b'\0' * padding)
+        offset = self._file.tell()
+        self._file.write(array.tobytes())
+        return offset
+
+    def _flush_round(self):
+        if not self._ticks:
+            return
+
+        ticks = np.asarray(self._ticks, dtype=np.int64)
+        players = np.asarray(self._columns['player'], dtype=np.uint8)
+        order = np.lexsort((players, ticks))
+        start_tick = int(ticks.min())
+        offsets = ticks[order] - start_tick
+        tick_dtype = '<u2' if offsets.max() <= np.iinfo(np.uint16).max else '<u4'
+
+        columns = {
+            'tick': {
+                'dtype': tick_dtype,
+                'offset': self._write(offsets.astype(tick_dtype))
+            }
+        }
+        clipped = {}
+        for name, (dtype, scale) in COLUMNS.items():
+            array, count = _quantize(self._columns[name], dtype, scale, name in ANGLE_COLUMNS)
+            columns[name] = {'dtype': dtype, 'offset': self._write(array[order])}
+            if count:
+                clipped[name] = count
+                self.clipped[name] = self.clipped.get(name, 0) + count
+        if clipped:
+            self.logger.logger.warning(
+                f"Posições da partida {self.match_id}, round {self._round}: "
+                f"amostras fora da faixa saturadas {clipped}"
+            )
+
+        self.rounds.append({
+            'round': self._round,
+            'start_tick': start_tick,
+            'end_tick': int(ticks.max()),
+            'samples': len(ticks),
+            'columns': columns
+        })
+        self._ticks = []
+        self._columns = {name: [] for name in COLUMNS}
+
+    def close(self) -> Dict:
+        """Finalizar o arquivo; retorna um resumo (rounds, amostras, bytes)"""
+        self._flush_round()
+        index = json.dumps({
+            'version': FORMAT_VERSION,
+            'match_id': self.match_id,
+            'position_scale': POSITION_SCALE,
+            'angle_scale': ANGLE_SCALE,
+            'players': list(self.players),
+            'weapons': list(self.weapons),
+            'rounds': self.rounds
+        }).encode('utf-8')
+        self._file.write(index)
+        self._file.write(_FOOTER.pack(len(index), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+        return {
+            'rounds': len(self.rounds),
+            'samples': sum(r['samples'] for r in self.rounds),
+            'bytes': self.path.stat().st_size,
+            'clipped': dict(self.clipped)
+        }
+
+    def abort(self):
+        """Descartar o arquivo parcial"""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class PositionFile:
+    """Leitura de um arquivo gravado pelo PositionWriter.
+
+    Só o índice é lido ao abrir; cada round é carregada com uma única
+    leitura do seu bloco (`read_round`), ou só o intervalo de ticks pedido
+    via memmap (`read_ticks`), sem ler o resto da partida.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            footer_offset = f.tell()
+            length, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} não é um arquivo de posições")
+            f.seek(footer_offset - length)
+            self.header = json.loads(f.read(length))
+
+        self.match_id: str = self.header['match_id']
+        self.players: List[str] = self.header['players']
+        self.weapons: List[str] = self.header['weapons']
+        self.rounds: Dict[int, Dict] = {r['round']: r for r in self.header['rounds']}
+        self.mtime = self.path.stat().st_mtime
+        # Arquivo inteiro mapeado (bytes); páginas só são lidas quando tocadas
+        self._map: Optional[np.memmap] = None
+
+    def _round_meta(self, round_number: int) -> Dict:
+        meta = self.rounds.get(round_number)
+        if meta is None:
+            raise KeyError(f"Round {round_number} sem posições em {self.match_id}")
+        return meta
+
+    def _block(self, meta: Dict):
+        """Início e fim do bloco de colunas da round no arquivo"""
+        columns = meta['columns'].values()
+        start = min(c['offset'] for c in columns)
+        end = max(c['offset'] + np.dtype(c['dtype']).itemsize * meta['samples'] for c in columns)
+        return start, end
+
+    def read_round(self, round_number: int) -> Dict[str, np.ndarray]:
+        """Colunas da round, já decodificadas (tick absoluto, coordenadas em
+        unidades do jogo, ângulos em graus em [-180, 180), jogador/arma como índices de
+        `players`/`weapons`)"""
+        meta = self._round_meta(round_number)
+        start, end = self._block(meta)
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            block = f.read(end - start)
+
+        raw = {
+            name: np.frombuffer(
+                block, dtype=column['dtype'], count=meta['samples'],
+                offset=column['offset'] - start
+            )
+            for name, column in meta['columns'].items()
+        }
+        return self.decode(meta, raw)
+
+    def _column(self, meta: Dict, name: str, start: int = 0,
+                stop: Optional[int] = None) -> np.ndarray:
+        """Fatia [start:stop] de uma coluna da round, sem copiar (memmap)"""
+        mapped = self._map
+        if mapped is None:
+            mapped = self._map = np.memmap(self.path, dtype=np.uint8, mode='r')
+        column = meta['columns'][name]
+        dtype = np.dtype(column['dtype'])
+        stop = meta['samples'] if stop is None else stop
+        begin = column['offset'] + start * dtype.itemsize
+        return mapped[begin:column['offset'] + stop * dtype.itemsize].view(dtype)
+
+    def tick_range(self, round_number: int, start_tick: Optional[int] = None,
+                   end_tick: Optional[int] = None) -> Tuple[int, int]:
+        """Índices [início, fim) das amostras com start_tick <= tick <= end_tick"""
+        meta = self._round_meta(round_number)
+        # Coluna de ticks ordenada: busca binária só toca as páginas necessárias
+        ticks = self._column(meta, 'tick')
+        first = 0
+        last = meta['samples']
+        if start_tick is not None:
+            offset = max(start_tick - meta['start_tick'], 0)
+            first = int(np.searchsorted(ticks, offset, side='left'))
+        if end_tick is not None:
+            offset = end_tick - meta['start_tick']
+            last = int(np.searchsorted(ticks, offset, side='right')) if offset >= 0 else 0
+        return first, max(first, last)
+
+    def read_ticks(self, round_number: int, start_tick: Optional[int] = None,
+                   end_tick: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Amostras da round entre start_tick e end_tick (inclusive), já
+        decodificadas como em `read_round`"""
+        meta = self._round_meta(round_number)
+        first, last = self.tick_range(round_number, start_tick, end_tick)
+        raw = {
+            name: self._column(meta, name, first, last)
+            for name in meta['columns']
+        }
+        return self.decode(meta, raw)
+
+    def close(self):
+        # O mapeamento é liberado quando não houver mais fatias apontando para ele
+        self._map = None
+
+    def decode(self, meta: Dict, raw: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Converter colunas gravadas (quantizadas) de volta para valores"""
+        position_scale = self.header['position_scale']
+        angle_scale = self.header['angle_scale']
+        return {
+            'tick': raw['tick'].astype(np.int64) + meta['start_tick'],
+            'player': np.array(raw['player']),
+            'x': raw['x'] / np.float32(position_scale),
+            'y': raw['y'] / np.float32(position_scale),
+            'z': raw['z'] / np.float32(position_scale),
+            'view_x': raw['view_x'] / np.float32(angle_scale),
+            'view_y': raw['view_y'] / np.float32(angle_scale),
+            'health': np.array(raw['health']),
+            'armor': np.array(raw['armor']),
+            'weapon': np.array(raw['weapon'])
+        }
+
+
+class PositionStore:
+    """Posições de todas as partidas em `positions_dir`, por intervalo de ticks.
+
+    Mantém até `max_open` arquivos abertos (índice lido e arquivo mapeado)
+    em um LRU; um arquivo regravado (demo reprocessada) é reaberto. Cada
+    consulta copia só as amostras pedidas, então o custo de memória de um
+    pedido não depende do tamanho da partida.
+    """
+
+    def __init__(self, positions_dir: str, max_open: int = 16):
+        self.positions_dir = Path(positions_dir)
+        self.max_open = max_open
+        self._files: OrderedDict = OrderedDict()
+
+    def path(self, match_id: str) -> Path:
+        if not _MATCH_ID.fullmatch(match_id):
+            raise ValueError(f"Id de partida inválido: {match_id!r}")
+        return self.positions_dir / f"{match_id}.pos"
+
+    def open(self, match_id: str) -> PositionFile:
+        """Arquivo de posições da partida (FileNotFoundError se não houver)"""
+        path = self.path(match_id)
+        cached = self._files.get(match_id)
+        if cached is not None:
+            if cached.mtime == path.stat().st_mtime:
+                self._files.move_to_end(match_id)
+                return cached
+            cached.close()
+            del self._files[match_id]
+
+        position_file = PositionFile(path)
+        self._files[match_id] = position_file
+        while len(self._files) > self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return position_file
+
+    def rounds(self, match_id: str) -> List[Dict]:
+        """Rounds com posições: número, primeiro/último tick e amostras"""
+        return [
+            {key: meta[key] for key in ('round', 'start_tick', 'end_tick', 'samples')}
+            for meta in self.open(match_id).rounds.values()
+        ]
+
+    def positions(self, match_id: str, round_number: int,
+                  start_tick: Optional[int] = None,
+                  end_tick: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Posições de todos os jogadores na round entre os ticks pedidos"""
+        return self.open(match_id).read_ticks(round_number, start_tick, end_tick)
+
+    def count(self, match_id: str, round_number: int,
+              start_tick: Optional[int] = None,
+              end_tick: Optional[int] = None) -> int:
+        """Número de amostras no intervalo (só lê a coluna de ticks)"""
+        first, last = self.open(match_id).tick_range(round_number, start_tick, end_tick)
+        return last - first
+
+    def close(self):
+        for position_file in self._files.values():
+            position_file.close()
+        self._files.clear()
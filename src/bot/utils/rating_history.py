@@ -0,0 +1,175 @@
+"""
+Rating History - Compact per-player rating series
+Author: adamguedesmtm
+Created: 2025-02-26 17:21:44
+"""
+
+import bisect
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# Segundos em um dia (tamanho do bucket de downsampling)
+DAY = 86400
+
+
+class RatingSeries:
+    """Série de rating de um jogador em colunas (timestamps e ratings).
+
+    Cada coluna é um `array('d')`, 8 bytes por valor, serializado direto
+    para o banco com `tobytes()`.
+    """
+
+    __slots__ = ('timestamps', 'ratings')
+
+    def __init__(self, timestamps: Optional[array] = None, ratings: Optional[array] = None):
+        self.timestamps = timestamps if timestamps is not None else array('d')
+        self.ratings = ratings if ratings is not None else array('d')
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_bytes(cls, timestamps: bytes, ratings: bytes) -> 'RatingSeries':
+        series = cls()
+        series.timestamps.frombytes(timestamps)
+        series.ratings.frombytes(ratings)
+        return series
+
+    def to_bytes(self) -> Tuple[bytes, bytes]:
+        return self.timestamps.tobytes(), self.ratings.tobytes()
+
+    def append(self, timestamp: float, rating: float):
+        self.timestamps.append(timestamp)
+        self.ratings.append(rating)
+
+    def downsample(self, before: float):
+        """Reduzir pontos anteriores a `before` a um por dia (último do dia)"""
+        timestamps, ratings = array('d'), array('d')
+        last_day = None
+
+        for timestamp, rating in zip(self.timestamps, self.ratings):
+            if timestamp >= before:
+                timestamps.append(timestamp)
+                ratings.append(rating)
+                continue
+
+            day = int(timestamp // DAY)
+            if day == last_day:
+                # Mesmo dia: manter só o último valor
+                timestamps[-1] = timestamp
+                ratings[-1] = rating
+            else:
+                timestamps.append(timestamp)
+                ratings.append(rating)
+                last_day = day
+
+        self.timestamps, self.ratings = timestamps, ratings
+
+    def trim(self, max_points: int):
+        """Descartar os pontos mais antigos além de `max_points`"""
+        if len(self) > max_points:
+            del self.timestamps[:-max_points]
+            del self.ratings[:-max_points]
+
+
+class RatingHistory:
+    """Histórico de rating de todos os jogadores, carregado sob demanda.
+
+    Pontos recentes (até `raw_days`) ficam com resolução total; os mais
+    antigos são agrupados em um ponto por dia quando a série passa de
+    `max_points`, e só então o excedente mais antigo é descartado.
+
+    Até `cache_size` séries ficam em memória (LRU por jogador); séries
+    com alterações ainda não gravadas só saem depois do flush.
+    """
+
+    def __init__(self,
+                 store,
+                 raw_days: int = 30,
+                 max_points: int = 1000,
+                 cache_size: int = 1024):
+        self.store = store
+        self.raw_days = raw_days
+        self.max_points = max_points
+        self.cache_size = cache_size
+        self._series: OrderedDict = OrderedDict()
+        self.dirty: set = set()
+
+    def _get_series(self, steam_id: str) -> RatingSeries:
+        """Obter série do jogador (do cache ou do banco)"""
+        series = self._series.get(steam_id)
+        if series is None:
+            row = self.store.load_rating_history(steam_id)
+            series = RatingSeries.from_bytes(*row) if row else RatingSeries()
+            self._series[steam_id] = series
+            self._evict()
+        else:
+            self._series.move_to_end(steam_id)
+        return series
+
+    def _evict(self):
+        """Descartar as séries menos usadas além de `cache_size`, exceto as sujas"""
+        excess = len(self._series) - self.cache_size
+        if excess <= 0:
+            return
+        for steam_id in [
+            steam_id for steam_id in self._series if steam_id not in self.dirty
+        ][:excess]:
+            del self._series[steam_id]
+
+    def append(self, steam_id: str, rating: float, timestamp: Optional[float] = None):
+        """Registrar novo rating do jogador"""
+        series = self._get_series(steam_id)
+        series.append(timestamp if timestamp is not None else time.time(), rating)
+
+        if len(series) > self.max_points:
+            series.downsample(time.time() - self.raw_days * DAY)
+            series.trim(self.max_points)
+
+        self.dirty.add(steam_id)
+
+    def import_legacy(self, steam_id: str, history: List[Dict]):
+        """Converter a antiga lista `history` (dicts com ISO timestamp)"""
+        for entry in history:
+            try:
+                moment = datetime.fromisoformat(entry['timestamp'])
+                if moment.tzinfo is None:
+                    # Gravado com utcnow()
+                    moment = moment.replace(tzinfo=timezone.utc)
+                timestamp = moment.timestamp()
+                self.append(steam_id, float(entry['new_rating']), timestamp)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def query(self,
+              steam_id: str,
+              since: Optional[float] = None,
+              until: Optional[float] = None) -> Dict[str, List[float]]:
+        """Série para gráficos: {'timestamps': [...], 'ratings': [...]}"""
+        series = self._get_series(steam_id)
+        # Timestamps em ordem crescente: recorte por busca binária
+        start = bisect.bisect_left(series.timestamps, since) if since is not None else 0
+        end = bisect.bisect_right(series.timestamps, until) if until is not None else len(series)
+        return {
+            'timestamps': series.timestamps[start:end].tolist(),
+            'ratings': series.ratings[start:end].tolist()
+        }
+
+    def take_dirty(self) -> List[Tuple[str, bytes, bytes]]:
+        """Serializar séries alteradas e limpar o conjunto"""
+        dirty, self.dirty = self.dirty, set()
+        return [(steam_id, *self._series[steam_id].to_bytes()) for steam_id in dirty]
+
+    def restore(self, batch: List[Tuple[str, bytes, bytes]]):
+        """Marcar de novo como sujas as séries de um lote que não foi gravado.
+
+        Uma série descartada do cache enquanto o lote era gravado volta a
+        partir dos bytes do lote, sem reler a versão antiga do banco.
+        """
+        for steam_id, timestamps, ratings in batch:
+            if steam_id not in self._series:
+                self._series[steam_id] = RatingSeries.from_bytes(timestamps, ratings)
+            self.dirty.add(steam_id)
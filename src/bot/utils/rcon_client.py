@@ -0,0 +1,284 @@
+"""
+Async RCON Client - Source RCON Protocol over asyncio
+Author: adamguedesmtm
+Created: 2025-02-24 10:12:31
+"""
+
+import asyncio
+import itertools
+import struct
+from typing import Dict, List, Optional, Tuple
+from .logger import Logger
+
+# Tipos de pacote do protocolo Source RCON
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+# Cabeçalho: tamanho, id e tipo (int32 little-endian)
+_HEADER = struct.Struct('<iii')
+_SIZE = struct.Struct('<i')
+
+# Tamanho mínimo de um pacote (id + tipo + dois terminadores nulos)
+_MIN_PACKET_SIZE = 10
+_MAX_PACKET_SIZE = 4096 + _MIN_PACKET_SIZE
+
+
+class RCONError(Exception):
+    """Erro de conexão ou protocolo RCON"""
+
+
+class RCONAuthError(RCONError):
+    """Senha RCON rejeitada pelo servidor"""
+
+
+def encode_packet(request_id: int, packet_type: int, body: str) -> bytes:
+    """Montar pacote RCON"""
+    payload = body.encode('utf-8') + b'\x00\x00'
+    return _HEADER.pack(8 + len(payload), request_id, packet_type) + payload
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, int, str]:
+    """Ler um pacote RCON completo do stream"""
+    size, = _SIZE.unpack(await reader.readexactly(_SIZE.size))
+    if size < _MIN_PACKET_SIZE or size > _MAX_PACKET_SIZE:
+        raise RCONError(f"Tamanho de pacote inválido: {size}")
+
+    data = await reader.readexactly(size)
+    request_id, packet_type = struct.unpack_from('<ii', data)
+    body = data[8:-2].decode('utf-8', errors='replace')
+    return request_id, packet_type, body
+
+
+class AsyncRCON:
+    """Cliente RCON não bloqueante.
+
+    Cada comando é seguido de um pacote vazio do tipo RESPONSE_VALUE; o
+    servidor ecoa esse pacote depois de enviar toda a resposta, o que
+    permite remontar respostas divididas em vários pacotes.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 password: str,
+                 timeout: float = 5.0,
+                 logger: Optional[Logger] = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.logger = logger or Logger('rcon_client')
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+
+        # id do comando -> pacotes recebidos / future da resposta
+        self._buffers: Dict[int, List[str]] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        # id do pacote terminador -> id do comando
+        self._terminators: Dict[int, int] = {}
+
+    @property
+    def connected(self) -> bool:
+        """Verificar se a conexão está aberta"""
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    def _next_id(self) -> int:
+        """Gerar próximo id de pacote (int32 positivo)"""
+        request_id = next(self._ids)
+        if request_id >= 2 ** 31 - 1:
+            self._ids = itertools.count(1)
+            request_id = next(self._ids)
+        return request_id
+
+    async def connect(self):
+        """Abrir conexão TCP e autenticar"""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port),
+            timeout=self.timeout
+        )
+
+        try:
+            await asyncio.wait_for(self._authenticate(), timeout=self.timeout)
+        except Exception:
+            await self.close()
+            raise
+
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _authenticate(self):
+        """Realizar handshake de autenticação"""
+        auth_id = self._next_id()
+        self._writer.write(encode_packet(auth_id, SERVERDATA_AUTH, self.password))
+        await self._writer.drain()
+
+        # O servidor envia um RESPONSE_VALUE vazio antes do AUTH_RESPONSE
+        while True:
+            request_id, packet_type, _ = await read_packet(self._reader)
+            if packet_type != SERVERDATA_AUTH_RESPONSE:
+                continue
+            if request_id == -1:
+                raise RCONAuthError("Senha RCON inválida")
+            if request_id == auth_id:
+                return
+
+    async def _read_loop(self):
+        """Ler pacotes e despachar para os comandos pendentes"""
+        try:
+            while True:
+                request_id, packet_type, body = await read_packet(self._reader)
+
+                if packet_type != SERVERDATA_RESPONSE_VALUE:
+                    continue
+
+                if request_id in self._terminators:
+                    command_id = self._terminators.pop(request_id)
+                    self._resolve(command_id)
+                elif request_id in self._buffers:
+                    self._buffers[request_id].append(body)
+                # Demais pacotes (ex.: segundo eco do terminador) são ignorados
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not isinstance(e, asyncio.IncompleteReadError):
+                self.logger.logger.error(f"Erro na leitura RCON: {e}")
+            self._fail_pending(RCONError(f"Conexão RCON encerrada: {e}"))
+
+    def _resolve(self, command_id: int):
+        """Completar comando com a resposta remontada"""
+        future = self._pending.pop(command_id, None)
+        chunks = self._buffers.pop(command_id, [])
+        if future and not future.done():
+            future.set_result(''.join(chunks))
+
+    def _fail_pending(self, error: Exception):
+        """Falhar todos os comandos pendentes"""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._buffers.clear()
+        self._terminators.clear()
+
+    def _register(self, command: str) -> Tuple[int, int, asyncio.Future, bytes]:
+        """Registrar comando pendente e montar seus pacotes"""
+        command_id = self._next_id()
+        terminator_id = self._next_id()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        self._buffers[command_id] = []
+        self._terminators[terminator_id] = command_id
+
+        packets = (
+            encode_packet(command_id, SERVERDATA_EXECCOMMAND, command)
+            + encode_packet(terminator_id, SERVERDATA_RESPONSE_VALUE, '')
+        )
+        return command_id, terminator_id, future, packets
+
+    def _collect(self, command: str, command_id: int, future: asyncio.Future) -> Optional[str]:
+        """Obter resposta de um comando após a espera (None em timeout)"""
+        if future.done():
+            return future.result()
+
+        # Servidores que não ecoam o terminador: usar o que chegou
+        chunks = self._buffers.get(command_id)
+        if chunks:
+            return ''.join(chunks)
+        self.logger.logger.warning(f"Timeout aguardando resposta de '{command}'")
+        return None
+
+    async def execute(self, command: str) -> str:
+        """Executar comando e aguardar resposta completa"""
+        response = (await self.execute_many([command]))[0]
+        if response is None:
+            raise RCONError(f"Timeout aguardando resposta de '{command}'")
+        return response
+
+    async def execute_many(self, commands: List[str]) -> List[Optional[str]]:
+        """Executar vários comandos em pipeline na mesma conexão.
+
+        Todos os pacotes são enviados de uma vez e as respostas são
+        associadas pelo id do pacote, custando aproximadamente um RTT.
+        O resultado é por comando: quem estourar o timeout fica como None
+        sem descartar as respostas que já chegaram. Queda da conexão
+        continua levantando RCONError.
+        """
+        if not self.connected:
+            raise RCONError("RCON não conectado")
+        if not commands:
+            return []
+
+        requests = [self._register(command) for command in commands]
+        self._writer.write(b''.join(packets for *_, packets in requests))
+
+        try:
+            await self._writer.drain()
+            await asyncio.wait(
+                [future for _, _, future, _ in requests],
+                timeout=self.timeout
+            )
+            return [
+                self._collect(command, command_id, future)
+                for command, (command_id, _, future, _) in zip(commands, requests)
+            ]
+        finally:
+            for command_id, terminator_id, _, _ in requests:
+                self._pending.pop(command_id, None)
+                self._buffers.pop(command_id, None)
+                self._terminators.pop(terminator_id, None)
+
+    async def execute_nowait(self, command: str):
+        """Enviar comando sem aguardar resposta (fire-and-forget).
+
+        A resposta do servidor é descartada pelo loop de leitura, já que
+        o id do pacote não fica registrado.
+        """
+        if not self.connected:
+            raise RCONError("RCON não conectado")
+
+        self._writer.write(
+            encode_packet(self._next_id(), SERVERDATA_EXECCOMMAND, command)
+        )
+        await self._writer.drain()
+
+    async def close(self):
+        """Fechar conexão"""
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+
+        self._fail_pending(RCONError("Conexão RCON fechada"))
+
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+            self._reader = None
+
+    def abort(self):
+        """Fechar conexão sem aguardar (uso em finalizadores)"""
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer:
+            self._writer.transport.abort()
+            self._writer = None
+            self._reader = None
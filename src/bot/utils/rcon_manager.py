@@ -4,55 +4,204 @@ Author: adamguedesmtm
 Created: 2025-02-21 14:39:11
 """
 
-import valve.rcon
-from typing import Optional
+from typing import Dict, List, Optional
 import asyncio
+import random
+import time
 from .logger import Logger
+from .rcon_client import AsyncRCON, RCONError
+from .server_status import ServerStatusCache
+from .telemetry import RCON_ERRORS, RCON_RTT
+from .tracing import traced
 
 class RCONManager:
     def __init__(self, 
                  host: str = 'localhost', 
                  port: int = 27015, 
                  password: str = '', 
-                 logger: Optional[Logger] = None):
+                 logger: Optional[Logger] = None,
+                 timeout: float = 5.0,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 status_interval: float = 10.0,
+                 status_ttl: float = 10.0):
         self.host = host
         self.port = port
         self.password = password
+        self.timeout = timeout
         self.logger = logger or Logger('rcon_manager')
         self._rcon = None
         self._lock = asyncio.Lock()
 
+        # Backoff exponencial com jitter / circuit breaker
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failures = 0
+        self._retry_at = 0.0
+        self.last_activity = 0.0
+
+        # Snapshot do `status` compartilhado pelos getters
+        self.status_cache = ServerStatusCache(
+            self,
+            interval=status_interval,
+            ttl=status_ttl,
+            logger=self.logger
+        )
+
+    @property
+    def server_label(self) -> str:
+        """Identificação do servidor nas métricas"""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def connected(self) -> bool:
+        """Verificar se há conexão RCON ativa."""
+        return bool(self._rcon and self._rcon.connected)
+
+    @property
+    def circuit_open(self) -> bool:
+        """Servidor marcado como indisponível até o próximo retry."""
+        return self.failures > 0 and time.monotonic() < self._retry_at
+
+    def _record_failure(self):
+        """Registrar falha e agendar próxima tentativa de conexão."""
+        self.failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        delay *= random.uniform(0.5, 1.0)  # Jitter evita reconexões em massa
+        self._retry_at = time.monotonic() + delay
+        self.logger.logger.warning(
+            f"RCON {self.host}:{self.port} indisponível, "
+            f"nova tentativa em {delay:.1f}s (falhas: {self.failures})"
+        )
+
+    def _record_success(self):
+        """Fechar circuito após comando bem-sucedido."""
+        self.failures = 0
+        self._retry_at = 0.0
+        self.last_activity = time.monotonic()
+
     async def connect(self):
         """Estabelecer conexão RCON."""
         try:
-            if not self._rcon:
-                self._rcon = valve.rcon.RCON((self.host, self.port), self.password)
-                self._rcon.connect()
+            if not self._rcon or not self._rcon.connected:
+                self._rcon = AsyncRCON(
+                    self.host,
+                    self.port,
+                    self.password,
+                    timeout=self.timeout,
+                    logger=self.logger
+                )
+                await self._rcon.connect()
                 self.logger.logger.info("Conexão RCON estabelecida")
         except Exception as e:
+            self._rcon = None
             self.logger.logger.error(f"Erro ao conectar RCON: {e}")
             raise
 
+    async def disconnect(self):
+        """Encerrar conexão RCON."""
+        if self._rcon:
+            rcon, self._rcon = self._rcon, None
+            await rcon.close()
+
+    async def _get_client(self) -> AsyncRCON:
+        """Obter cliente conectado (o lock protege apenas a conexão)."""
+        async with self._lock:
+            if not self._rcon or not self._rcon.connected:
+                if self.circuit_open:
+                    raise RCONError(f"Circuito aberto para {self.host}:{self.port}")
+                try:
+                    await self.connect()
+                except Exception:
+                    self._record_failure()
+                    raise
+            return self._rcon
+
+    async def _drop_client(self, rcon: Optional[AsyncRCON]):
+        """Descartar cliente com falha para reconectar na próxima chamada."""
+        if rcon is not None and rcon is self._rcon:
+            self._record_failure()
+            await self.disconnect()
+
+    async def health_check(self) -> bool:
+        """Verificar se o servidor responde (usado como keepalive)."""
+        rcon = None
+        try:
+            rcon = await self._get_client()
+            await rcon.execute("echo keepalive")
+            self._record_success()
+            return True
+        except Exception as e:
+            self.logger.logger.debug(f"Health check RCON falhou: {e}")
+            await self._drop_client(rcon)
+            return False
+
+    @traced()
     async def execute(self, command: str) -> str:
         """Executar comando RCON."""
+        rcon = None
         try:
-            async with self._lock:
-                if not self._rcon:
-                    await self.connect()
-                response = self._rcon.execute(command)
-                return response.decode('utf-8').strip()
+            rcon = await self._get_client()
+            with RCON_RTT.time(server=self.server_label):
+                response = await rcon.execute(command)
+            self._record_success()
+            return response.strip()
         except Exception as e:
             self.logger.logger.error(f"Erro ao executar comando RCON: {e}")
-            await self.connect()  # Tentar reconectar
+            RCON_ERRORS.inc(server=self.server_label)
+            await self._drop_client(rcon)  # Reconectar na próxima chamada
             return ""
 
+    @traced()
+    async def execute_many(self, commands: List[str]) -> List[str]:
+        """Executar vários comandos RCON em pipeline (aprox. um RTT).
+
+        Comandos sem resposta (timeout) voltam como "", mantendo as
+        respostas dos demais.
+        """
+        rcon = None
+        try:
+            rcon = await self._get_client()
+            with RCON_RTT.time(server=self.server_label):
+                responses = await rcon.execute_many(commands)
+
+            missing = responses.count(None)
+            if responses and missing == len(responses):
+                raise RCONError("Timeout aguardando respostas RCON")
+            if missing:
+                RCON_ERRORS.inc(missing, server=self.server_label)
+            self._record_success()
+            return [response.strip() if response is not None else "" for response in responses]
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao executar comandos RCON: {e}")
+            RCON_ERRORS.inc(server=self.server_label)
+            await self._drop_client(rcon)
+            return [""] * len(commands)
+
+    async def execute_nowait(self, command: str) -> bool:
+        """Enviar comando RCON sem aguardar resposta (ex.: say)."""
+        rcon = None
+        try:
+            rcon = await self._get_client()
+            await rcon.execute_nowait(command)
+            self.last_activity = time.monotonic()
+            return True
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao enviar comando RCON: {e}")
+            await self._drop_client(rcon)
+            return False
+
+    async def say(self, message: str) -> bool:
+        """Enviar mensagem no chat do servidor (fire-and-forget)."""
+        return await self.execute_nowait(f'say "{message}"')
+
     async def get_server_ip(self) -> str:
         """Obter IP do servidor."""
         try:
-            response = await self.execute("net_address")
-            if "address" in response:
-                parts = response.split()
-                return parts[1]  # Formato: "address 192.168.1.100:27015"
+            status = await self.status_cache.get()
+            ip = status.get('public_ip') or status.get('ip')
+            if ip and ip != '0.0.0.0':
+                return ip
             return self.host
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter IP do servidor: {e}")
@@ -61,10 +210,8 @@ class RCONManager:
     async def get_server_port(self) -> int:
         """Obter porta do servidor."""
         try:
-            response = await self.execute("net_port")
-            if response.isdigit():
-                return int(response)
-            return self.port
+            status = await self.status_cache.get()
+            return status.get('port') or self.port
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter porta do servidor: {e}")
             return self.port
@@ -72,19 +219,27 @@ class RCONManager:
     async def get_server_password(self) -> str:
         """Obter senha do servidor."""
         try:
-            response = await self.execute("sv_password")
-            return response.strip() or "Sem senha"
+            status = await self.status_cache.get()
+            return status.get('password') or "Sem senha"
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter senha do servidor: {e}")
             return "Sem senha"
 
+    async def set_password(self, password: str) -> bool:
+        """Definir senha do servidor."""
+        try:
+            await self.execute(f'sv_password "{password}"')
+            self.status_cache.invalidate()
+            return True
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao definir senha do servidor: {e}")
+            return False
+
     async def get_gotv_port(self) -> int:
         """Obter porta GOTV."""
         try:
-            response = await self.execute("tv_port")
-            if response.isdigit():
-                return int(response)
-            return self.port + 1
+            status = await self.status_cache.get()
+            return status.get('gotv_port') or self.port + 1
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter porta GOTV: {e}")
             return self.port + 1
@@ -101,23 +256,9 @@ class RCONManager:
             return ""
 
     async def get_status(self) -> Dict:
-        """Obter status do servidor."""
+        """Obter status do servidor (snapshot em cache)."""
         try:
-            response = await self.execute("status")
-            lines = response.split("\n")
-
-            status = {}
-            for line in lines:
-                if "udp/ip" in line.lower():
-                    parts = line.split()
-                    status["ip"] = parts[1]
-                    status["port"] = int(parts[2].split('/')[0])
-                elif "map" in line.lower():
-                    status["map"] = line.split(":")[1].strip()
-                elif "players" in line.lower():
-                    status["players_online"] = int(line.split(":")[1].split("/")[0].strip())
-
-            return status
+            return await self.status_cache.get()
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter status: {e}")
             return {}
@@ -126,6 +267,7 @@ class RCONManager:
         """Kickar jogador do servidor."""
         try:
             await self.execute(f"kickid {steam_id} {reason}")
+            self.status_cache.invalidate()
             self.logger.logger.info(f"Jogador {steam_id} kickado")
             return True
         except Exception as e:
@@ -136,6 +278,7 @@ class RCONManager:
         """Trocar mapa do servidor."""
         try:
             await self.execute(f"changelevel {map_name}")
+            self.status_cache.invalidate()
             self.logger.logger.info(f"Mapa trocado para {map_name}")
             return True
         except Exception as e:
@@ -165,25 +308,8 @@ class RCONManager:
     async def get_player_list(self) -> List[Dict]:
         """Obter lista de jogadores conectados."""
         try:
-            response = await self.execute("status")
-            lines = response.split("\n")
-            players = []
-
-            for line in lines:
-                if line.startswith("#"):
-                    parts = line.split()
-                    if len(parts) >= 6:
-                        player = {
-                            "index": parts[0],
-                            "steam_id": parts[1],
-                            "name": " ".join(parts[2:-3]),
-                            "ping": parts[-3],
-                            "loss": parts[-2],
-                            "state": parts[-1]
-                        }
-                        players.append(player)
-
-            return players
+            status = await self.status_cache.get()
+            return status.get('players', [])
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter lista de jogadores: {e}")
             return []
@@ -192,6 +318,6 @@ class RCONManager:
         """Cleanup ao destruir objeto."""
         if self._rcon:
             try:
-                self._rcon.disconnect()
+                self._rcon.abort()
             except:
                 pass
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+RCON Pool - Shared RCON connections per server
+Author: adamguedesmtm
+Created: 2025-02-24 16:05:48
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from .logger import Logger
+from .rcon_manager import RCONManager
+
+class RCONPool:
+    """Pool compartilhado de conexões RCON, uma por (host, porta).
+
+    Todos os managers que falam com o mesmo servidor recebem o mesmo
+    RCONManager, evitando sessões TCP duplicadas. Um loop em background
+    envia keepalives para conexões ociosas e detecta servidores caídos.
+    """
+
+    def __init__(self,
+                 logger: Optional[Logger] = None,
+                 timeout: float = 5.0,
+                 keepalive_interval: float = 30.0,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 status_interval: float = 10.0,
+                 status_ttl: float = 10.0):
+        self.logger = logger or Logger('rcon_pool')
+        self.timeout = timeout
+        self.keepalive_interval = keepalive_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.status_interval = status_interval
+        self.status_ttl = status_ttl
+        self._managers: Dict[Tuple[str, int], RCONManager] = {}
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def get(self, host: str, port: int, password: str = '') -> RCONManager:
+        """Obter RCONManager compartilhado do servidor"""
+        key = (host, int(port))
+        manager = self._managers.get(key)
+
+        if manager is None:
+            manager = RCONManager(
+                host=host,
+                port=int(port),
+                password=password,
+                logger=self.logger,
+                timeout=self.timeout,
+                backoff_base=self.backoff_base,
+                backoff_max=self.backoff_max,
+                status_interval=self.status_interval,
+                status_ttl=self.status_ttl
+            )
+            self._managers[key] = manager
+            if self._keepalive_task is not None:
+                manager.status_cache.start()
+        elif password and manager.password != password:
+            self.logger.logger.warning(
+                f"Senha RCON divergente para {host}:{port}, usando a mais recente"
+            )
+            manager.password = password
+
+        return manager
+
+    def start(self):
+        """Iniciar loop de keepalive e polling de status"""
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+        for manager in self._managers.values():
+            manager.status_cache.start()
+
+    async def _keepalive_loop(self):
+        """Enviar keepalive para conexões ociosas"""
+        while True:
+            try:
+                await asyncio.sleep(self.keepalive_interval)
+                now = time.monotonic()
+                idle = [
+                    manager for manager in self._managers.values()
+                    if now - manager.last_activity >= self.keepalive_interval
+                    and not manager.circuit_open
+                ]
+                if idle:
+                    await asyncio.gather(*(m.health_check() for m in idle))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.logger.error(f"Erro no keepalive RCON: {e}")
+
+    def get_status(self) -> Dict[str, Dict]:
+        """Obter estado das conexões do pool"""
+        return {
+            f"{host}:{port}": {
+                'connected': manager.connected,
+                'circuit_open': manager.circuit_open,
+                'failures': manager.failures
+            }
+            for (host, port), manager in self._managers.items()
+        }
+
+    async def close(self):
+        """Parar keepalive e fechar todas as conexões"""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+
+        for manager in self._managers.values():
+            await manager.status_cache.stop()
+            await manager.disconnect()
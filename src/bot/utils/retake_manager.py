@@ -10,17 +10,18 @@ import asyncio
 from .logger import Logger
 from .metrics import MetricsManager
 from .stats_manager import StatsManager
-from .rcon_manager import RconManager
+from .rcon_manager import RCONManager
 
 class MatchzyManager:
     def __init__(self, 
                  logger: Optional[Logger] = None,
                  metrics: Optional[MetricsManager] = None,
-                 stats_manager: Optional[StatsManager] = None):
+                 stats_manager: Optional[StatsManager] = None,
+                 rcon: Optional[RCONManager] = None):
         self.logger = logger or Logger('matchzy')
         self.metrics = metrics
         self.stats_manager = stats_manager
-        self.rcon = RconManager()
+        self.rcon = rcon or RCONManager(logger=self.logger)
         
         # Estado do servidor
         self.active_server = None
@@ -168,12 +169,14 @@ class MatchzyManager:
 
             # Aplicar configurações
             settings = config[match_type]
-            await self.rcon.execute(f"maxplayers {settings['maxplayers']}")
-            await self.rcon.execute(f"mp_maxrounds {settings['maxrounds']}")
-            
-            # Aplicar configurações específicas
-            for cmd in settings['configs']:
-                await self.rcon.execute(cmd)
+            commands = [
+                f"maxplayers {settings['maxplayers']}",
+                f"mp_maxrounds {settings['maxrounds']}",
+                *settings['configs']
+            ]
+
+            # Enviar todas as configurações em pipeline
+            await self.rcon.execute_many(commands)
 
             # Obter informações do servidor
             server_info = await self.rcon.get_server_info()
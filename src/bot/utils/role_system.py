@@ -9,6 +9,7 @@ import discord
 from .logger import Logger
 from .metrics import MetricsManager
 from .stats_manager import StatsManager
+from .tracing import traced
 
 class RoleSystem:
     def __init__(self, 
@@ -67,6 +68,7 @@ class RoleSystem:
             'Accuracy God 🎯': {'metric': 'accuracy', 'priority': 6, 'color': 0x4169E1}
         }
 
+    @traced()
     async def update_roles(self, guild: discord.Guild):
         """Atualizar roles dinamicamente."""
         try:
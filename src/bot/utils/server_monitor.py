@@ -11,7 +11,6 @@ from datetime import datetime
 from typing import Optional, Dict
 from .logger import Logger
 from .matchzy_manager import MatchzyManager
-from .rcon_manager import RconManager
 
 class ServerMonitor:
     def __init__(self, 
@@ -92,8 +91,8 @@ class ServerMonitor:
             if not self.matchzy.active_server:
                 return
 
-            # Verificar conexão RCON
-            response = await self.matchzy.rcon.execute('status')
+            # Verificar conexão RCON (também atualiza o snapshot de status)
+            response = await self.matchzy.rcon.status_cache.refresh()
             if not response:
                 self.logger.error("Servidor não responde ao comando status")
                 await self._handle_server_issue("RCON não responde")
@@ -149,9 +148,9 @@ class ServerMonitor:
             # Registrar problema
             self.logger.error(f"Problema detectado: {issue}")
 
-            # Se servidor não responde, tentar reconectar RCON
+            # Se servidor não responde, tentar reconectar RCON (respeitando backoff)
             if issue == "RCON não responde":
-                await self.matchzy.rcon.connect()
+                await self.matchzy.rcon.health_check()
 
             # Se servidor está sobrecarregado, notificar admin
             elif issue == "Servidor sobrecarregado":
@@ -0,0 +1,223 @@
+"""
+Server Status Cache - Cached snapshot of the CS2 `status` command
+Author: adamguedesmtm
+Created: 2025-02-25 09:41:17
+"""
+
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+from .logger import Logger
+
+# Uma regex para a resposta inteira, ancorada pelo `\n` literal em vez de
+# `^` com re.M: o motor do `re` usa o literal como prefixo e pula direto para
+# o início de cada linha. Cada linha casa com no máximo um dos ramos:
+_STATUS_LINE = re.compile(
+    r"\n[ \t]*(?:"
+    # Jogador do CS2: `id time ping loss state rate adr 'nome'`; o slot de
+    # conexão pendente (65535) fica de fora
+    r"(?!65535 )(\d+) +\S+ +(\d+) +(\d+) +(\S+)[^'\n]*'(.*)'"
+    # Jogador do CS:GO: `# userid [slot] "nome" steamid tempo ping loss estado`
+    r'|#[ \t]*(\d+)[ \t]+(?:\d+[ \t]+)?"(.*?)"[ \t]+(STEAM_\S+|\[U:\S+|BOT)'
+    r"[ \t]+\S+[ \t]+(\d+)[ \t]+(\d+)[ \t]+(\w+)"
+    # Cabeçalho: pares `chave : valor` (hostname, udp/ip, players, map, ...)
+    r"|(hostname|udp/ip|players|map|loaded spawngroup[^:\n]*|gotv\[\d+\])[ \t]*:[ \t]*([^\r\n]*)"
+    r")"
+)
+_ADDRESS = re.compile(
+    r"(\d+\.\d+\.\d+\.\d+):(\d+)(?:.*?public(?:[ \t]+ip)?:?[ \t]*(\d+\.\d+\.\d+\.\d+))?"
+)
+_PLAYER_COUNT = re.compile(r"(\d+)[ \t]+humans?,[ \t]*(\d+)[ \t]+bots?[ \t]*\((\d+)")
+_SPAWNGROUP_MAP = re.compile(r"\[\d+:[ \t]*([^\s|\]]+)[ \t]*\|[ \t]*main lump")
+_GOTV_PORT = re.compile(r"port[ \t]+(\d+)")
+
+_CVAR_VALUE = re.compile(r'=\s*"([^"]*)"')
+
+
+def parse_cvar(response: str) -> str:
+    """Extrair valor de uma cvar (formato `"nome" = "valor"` ou valor puro)"""
+    match = _CVAR_VALUE.search(response)
+    return match.group(1) if match else response.strip()
+
+
+def empty_status() -> Dict:
+    """Snapshot vazio do servidor"""
+    return {
+        'hostname': None,
+        'map': None,
+        'ip': None,
+        'port': None,
+        'public_ip': None,
+        'gotv_port': None,
+        'players_online': 0,
+        'bots': 0,
+        'max_players': 0,
+        'players': []
+    }
+
+
+def parse_status(response: str) -> Dict:
+    """Parsear saída do comando `status` (CS2 ou CS:GO) em uma única passada.
+
+    Cabeçalho e tabela de jogadores saem do mesmo `findall` da regex
+    pré-compilada. Jogadores são dicts como os do antigo get_player_list
+    (index, steam_id, name, ping, loss, state); o CS2 não mostra steam_id.
+    """
+    status = empty_status()
+    players = status['players']
+
+    # Prefixo garante que a primeira linha também comece com `\n`
+    for (index, ping, loss, state, name,
+         csgo_index, csgo_name, steam_id, csgo_ping, csgo_loss, csgo_state,
+         key, value) in _STATUS_LINE.findall('\n' + response):
+        if index:
+            players.append({
+                'index': index, 'steam_id': None, 'name': name,
+                'ping': ping, 'loss': loss, 'state': state
+            })
+        elif csgo_index:
+            players.append({
+                'index': csgo_index, 'steam_id': steam_id, 'name': csgo_name,
+                'ping': csgo_ping, 'loss': csgo_loss, 'state': csgo_state
+            })
+        elif key == 'hostname':
+            status['hostname'] = value
+        elif key == 'udp/ip':
+            match = _ADDRESS.search(value)
+            if match:
+                status['ip'] = match[1]
+                status['port'] = int(match[2])
+                status['public_ip'] = match[3]
+        elif key == 'players':
+            match = _PLAYER_COUNT.search(value)
+            if match:
+                status['players_online'] = int(match[1])
+                status['bots'] = int(match[2])
+                status['max_players'] = int(match[3])
+        elif key == 'map':
+            status['map'] = value.split(None, 1)[0] if value else None
+        elif key.startswith('gotv'):
+            match = _GOTV_PORT.search(value)
+            if match:
+                status['gotv_port'] = int(match[1])
+        elif status['map'] is None:
+            match = _SPAWNGROUP_MAP.search(value)
+            if match:
+                status['map'] = match[1]
+
+    if not status['players_online'] and players:
+        status['players_online'] = len(players)
+
+    return status
+
+
+class ServerStatusCache:
+    """Snapshot em memória do `status` de um servidor.
+
+    O snapshot é atualizado em background a cada `interval` segundos e,
+    sob demanda, quando estiver mais velho que `ttl`. Atualizações
+    concorrentes compartilham a mesma requisição RCON.
+    """
+
+    def __init__(self,
+                 rcon,
+                 interval: float = 10.0,
+                 ttl: float = 10.0,
+                 logger: Optional[Logger] = None):
+        self.rcon = rcon
+        self.interval = interval
+        self.ttl = ttl
+        self.logger = logger or Logger('server_status')
+        self.snapshot: Optional[Dict] = None
+        self.updated_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._poll_task: Optional[asyncio.Task] = None
+
+    @property
+    def fresh(self) -> bool:
+        """Verificar se o snapshot ainda está dentro do TTL"""
+        return self.snapshot is not None and time.monotonic() - self.updated_at < self.ttl
+
+    @staticmethod
+    def _copy(snapshot: Dict) -> Dict:
+        """Cópia do snapshot para quem chamou (inclui a lista de jogadores)"""
+        if not snapshot:
+            return {}
+        copy = dict(snapshot)
+        copy['players'] = [dict(player) for player in snapshot['players']]
+        return copy
+
+    async def get(self) -> Dict:
+        """Obter snapshot, atualizando se expirado; {} se o servidor não
+        responder"""
+        if self.fresh:
+            return self._copy(self.snapshot)
+        return await self.refresh()
+
+    async def refresh(self) -> Dict:
+        """Forçar atualização (chamadas simultâneas são agrupadas); {} se o
+        servidor não responder"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._copy(await asyncio.shield(self._refresh_task))
+
+    async def _refresh(self) -> Dict:
+        """Buscar status, porta GOTV e senha em um único RTT.
+
+        Em falha retorna {} em vez do último snapshot, para que quem checa
+        a conexão (ex.: ServerMonitor) perceba que o servidor não respondeu.
+        O snapshot antigo continua em `self.snapshot`, já expirado.
+        """
+        try:
+            response, tv_port, password = await self.rcon.execute_many(
+                ['status', 'tv_port', 'sv_password']
+            )
+            if not response:
+                return {}
+
+            snapshot = parse_status(response)
+            tv_port = parse_cvar(tv_port)
+            if tv_port.isdigit():
+                snapshot['gotv_port'] = int(tv_port)
+            snapshot['password'] = parse_cvar(password) if password else ''
+
+            self.snapshot = snapshot
+            self.updated_at = time.monotonic()
+            return snapshot
+
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao atualizar status do servidor: {e}")
+            return {}
+
+    def invalidate(self):
+        """Marcar snapshot como expirado (ex.: após trocar mapa)"""
+        self.updated_at = 0.0
+
+    def start(self):
+        """Iniciar atualização periódica"""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def _poll_loop(self):
+        """Loop de atualização periódica"""
+        while True:
+            try:
+                if not self.rcon.circuit_open:
+                    await self.refresh()
+                await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.logger.error(f"Erro no polling de status: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        """Parar atualização periódica"""
+        if self._poll_task:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
@@ -4,85 +4,146 @@ Author: adamguedesmtm
 Created: 2025-02-21 13:58:35
 """
 
-import asyncpg
+import time
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from .logger import Logger
+from .database import DatabaseManager
 from .metrics import MetricsManager
+from .telemetry import DB_QUERY_TIME
+from .tracing import traced
+
+# Ordem das colunas usada no COPY de player_stats
+PLAYER_STATS_COLUMNS = [
+    'player_id', 'match_id', 'team', 'kills', 'deaths',
+    'assists', 'headshots', 'score', 'mvps'
+]
+
+# Perfil completo do jogador: ratings, totais e mapas mais jogados.
+# Texto constante, então o asyncpg reaproveita o prepared statement do
+# cache de cada conexão do pool.
+PROFILE_QUERY = """
+    WITH ratings AS (
+        SELECT COALESCE(
+            json_object_agg(
+                rating_type,
+                json_build_object(
+                    'rating', rating,
+                    'games', games_played,
+                    'wins', wins
+                )
+            ),
+            '{}'::json
+        ) AS ratings
+        FROM player_ratings
+        WHERE player_id = $1
+    ),
+    maps AS (
+        SELECT COALESCE(
+            json_agg(json_build_array(map, matches) ORDER BY matches DESC),
+            '[]'::json
+        ) AS maps
+        FROM (
+            SELECT map, matches
+            FROM player_map_totals
+            WHERE player_id = $1
+            ORDER BY matches DESC
+            LIMIT 3
+        ) top_maps
+    )
+    SELECT
+        ratings.ratings,
+        maps.maps,
+        COALESCE(t.matches, 0) AS matches,
+        COALESCE(t.wins, 0) AS wins,
+        COALESCE(t.kills, 0) AS kills,
+        COALESCE(t.deaths, 0) AS deaths,
+        COALESCE(t.assists, 0) AS assists,
+        COALESCE(t.headshots, 0) AS headshots,
+        COALESCE(t.mvps, 0) AS mvps
+    FROM ratings
+    CROSS JOIN maps
+    LEFT JOIN player_totals t ON t.player_id = $1
+"""
+
+# Melhores atuações em um mapa (idx_matches_map + idx_player_stats_match)
+TOP_PLAYERS_BY_MAP_QUERY = """
+    SELECT
+        p.name AS player_name,
+        ps.kills,
+        ps.deaths,
+        ps.headshots,
+        ps.mvps
+    FROM player_stats ps
+    JOIN matches m ON ps.match_id = m.id
+    JOIN players p ON ps.player_id = p.id
+    WHERE m.map = $1
+    ORDER BY ps.kills DESC, ps.headshots DESC
+    LIMIT $2
+"""
+
+# Ranking por tipo de rating, paginado por keyset (rating, player_id).
+# Ambas as consultas são leituras ordenadas em idx_player_ratings_leaderboard.
+LEADERBOARD_QUERY = """
+    SELECT
+        pr.player_id,
+        p.name,
+        pr.rating,
+        pr.games_played,
+        pr.wins
+    FROM player_ratings pr
+    JOIN players p ON pr.player_id = p.id
+    WHERE pr.rating_type = $1
+    ORDER BY pr.rating DESC, pr.player_id DESC
+    LIMIT $2
+"""
+
+LEADERBOARD_AFTER_QUERY = """
+    SELECT
+        pr.player_id,
+        p.name,
+        pr.rating,
+        pr.games_played,
+        pr.wins
+    FROM player_ratings pr
+    JOIN players p ON pr.player_id = p.id
+    WHERE pr.rating_type = $1
+      AND (pr.rating, pr.player_id) < ($2, $3)
+    ORDER BY pr.rating DESC, pr.player_id DESC
+    LIMIT $4
+"""
+
+# Máximo de páginas do leaderboard em cache antes de limpar as expiradas
+LEADERBOARD_CACHE_SIZE = 256
 
 class StatsManager:
     def __init__(self, 
-                 db_config: Dict,
+                 db: DatabaseManager,
                  logger: Optional[Logger] = None,
-                 metrics: Optional[MetricsManager] = None):
-        self.db_config = db_config
+                 metrics: Optional[MetricsManager] = None,
+                 leaderboard_ttl: float = 30.0):
+        self.db = db
         self.logger = logger or Logger('stats_manager')
         self.metrics = metrics
-        self.pool = None
+        self.leaderboard_ttl = leaderboard_ttl
+
+        # (rating_type, limit, cursor) -> (expira_em, página)
+        self._leaderboard_pages: Dict[Tuple, Tuple[float, Dict]] = {}
+
+    @property
+    def pool(self):
+        """Pool compartilhado do DatabaseManager"""
+        return self.db.pool
 
     async def init(self):
-        """Inicializar conexão com banco de dados"""
+        """Garantir que o banco foi inicializado e migrado"""
         try:
-            self.pool = await asyncpg.create_pool(**self.db_config)
-            await self._create_tables()
+            await self.db.init()
             self.logger.logger.info("Conexão com banco de dados estabelecida")
         except Exception as e:
             self.logger.logger.error(f"Erro ao conectar ao banco: {e}")
             raise
 
-    async def _create_tables(self):
-        """Criar tabelas necessárias"""
-        async with self.pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS players (
-                    id BIGINT PRIMARY KEY,
-                    discord_id BIGINT UNIQUE,
-                    name VARCHAR(64),
-                    steam_id VARCHAR(32) UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS matches (
-                    id SERIAL PRIMARY KEY,
-                    match_type VARCHAR(16),
-                    map VARCHAR(32),
-                    start_time TIMESTAMP,
-                    end_time TIMESTAMP,
-                    winner_team VARCHAR(16),
-                    score_team1 INTEGER,
-                    score_team2 INTEGER
-                )
-            """)
-
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS player_stats (
-                    player_id BIGINT REFERENCES players(id),
-                    match_id INTEGER REFERENCES matches(id),
-                    team VARCHAR(16),
-                    kills INTEGER DEFAULT 0,
-                    deaths INTEGER DEFAULT 0,
-                    assists INTEGER DEFAULT 0,
-                    headshots INTEGER DEFAULT 0,
-                    score INTEGER DEFAULT 0,
-                    mvps INTEGER DEFAULT 0,
-                    PRIMARY KEY (player_id, match_id)
-                )
-            """)
-
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS player_ratings (
-                    player_id BIGINT REFERENCES players(id),
-                    rating_type VARCHAR(16),
-                    rating FLOAT DEFAULT 1000,
-                    games_played INTEGER DEFAULT 0,
-                    wins INTEGER DEFAULT 0,
-                    last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (player_id, rating_type)
-                )
-            """)
-
     async def register_player(self, discord_id: int, name: str, steam_id: str) -> bool:
         """Registrar novo jogador"""
         try:
@@ -98,76 +159,170 @@ class StatsManager:
             self.logger.logger.error(f"Erro ao registrar jogador: {e}")
             return False
 
+    @traced()
     async def record_match(self, match_data: Dict) -> Optional[int]:
         """Registrar partida completa"""
         try:
             async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    # Inserir partida
-                    match_id = await conn.fetchval("""
-                        INSERT INTO matches (
-                            match_type, map, start_time, end_time,
-                            winner_team, score_team1, score_team2
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7)
-                        RETURNING id
-                    """, match_data['type'], match_data['map'],
-                        match_data['start_time'], match_data['end_time'],
-                        match_data['winner_team'], 
-                        match_data['score_team1'],
-                        match_data['score_team2'])
-
-                    # Registrar stats dos jogadores
-                    for player_stats in match_data['player_stats']:
-                        await conn.execute("""
-                            INSERT INTO player_stats (
-                                player_id, match_id, team, kills, deaths,
-                                assists, headshots, score, mvps
-                            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                        """, player_stats['player_id'], match_id,
-                            player_stats['team'], player_stats['kills'],
-                            player_stats['deaths'], player_stats['assists'],
-                            player_stats['headshots'], player_stats['score'],
-                            player_stats['mvps'])
-
-                    # Atualizar ratings
-                    await self._update_ratings(conn, match_data)
-
-                    if self.metrics:
-                        await self.metrics.record_command('match_recorded')
-
-                    return match_id
+                with DB_QUERY_TIME.time(query='record_match'):
+                    async with conn.transaction():
+                        match_id = await self._insert_match(conn, match_data)
+
+            if self.metrics:
+                await self.metrics.record_command('match_recorded')
+
+            # Ratings mudaram: páginas do leaderboard em cache ficam obsoletas
+            self.invalidate_leaderboard()
+            return match_id
 
         except Exception as e:
             self.logger.logger.error(f"Erro ao registrar partida: {e}")
             return None
 
+    @traced()
+    async def record_matches(self, matches: List[Dict]) -> List[int]:
+        """Registrar várias partidas em uma única transação (ex.: replay de demos)"""
+        try:
+            async with self.pool.acquire() as conn:
+                with DB_QUERY_TIME.time(query='record_matches'):
+                    async with conn.transaction():
+                        match_ids = [
+                            await self._insert_match(conn, match_data)
+                            for match_data in matches
+                        ]
+
+            self.invalidate_leaderboard()
+            return match_ids
+
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao registrar partidas: {e}")
+            return []
+
+    @traced()
+    async def save_demo_stats(self, match_id: str, match_stats: Dict) -> bool:
+        """Salvar a análise da demo da partida (reprocessar substitui)"""
+        try:
+            general = match_stats['general']
+            async with self.pool.acquire() as conn:
+                with DB_QUERY_TIME.time(query='save_demo_stats'):
+                    await conn.execute("""
+                        INSERT INTO match_demo_stats (
+                            match_id, map_name, rounds_played,
+                            score_team1, score_team2, players, rounds, economy
+                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                        ON CONFLICT (match_id) DO UPDATE
+                        SET map_name = EXCLUDED.map_name,
+                            rounds_played = EXCLUDED.rounds_played,
+                            score_team1 = EXCLUDED.score_team1,
+                            score_team2 = EXCLUDED.score_team2,
+                            players = EXCLUDED.players,
+                            rounds = EXCLUDED.rounds,
+                            economy = EXCLUDED.economy,
+                            processed_at = now()
+                    """, match_id, general['map'], general['rounds_played'],
+                        general['score_team1'], general['score_team2'],
+                        match_stats['players'], match_stats['rounds'],
+                        match_stats['economy'])
+            return True
+
+        except Exception as e:
+            self.logger.logger.error(f"Erro ao salvar stats da demo {match_id}: {e}")
+            return False
+
+    async def _insert_match(self, conn, match_data: Dict) -> int:
+        """Inserir partida, stats e ratings com um número fixo de comandos"""
+        # Inserir partida
+        match_id = await conn.fetchval("""
+            INSERT INTO matches (
+                match_type, map, start_time, end_time,
+                winner_team, score_team1, score_team2
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+            RETURNING id
+        """, match_data['type'], match_data['map'],
+            match_data['start_time'], match_data['end_time'],
+            match_data['winner_team'],
+            match_data['score_team1'],
+            match_data['score_team2'])
+
+        # Registrar stats dos jogadores via COPY (um único comando)
+        await conn.copy_records_to_table(
+            'player_stats',
+            records=[
+                (
+                    ps['player_id'], match_id, ps['team'], ps['kills'],
+                    ps['deaths'], ps['assists'], ps['headshots'],
+                    ps['score'], ps['mvps']
+                )
+                for ps in match_data['player_stats']
+            ],
+            columns=PLAYER_STATS_COLUMNS
+        )
+
+        # Atualizar ratings e agregados
+        await self._update_ratings(conn, match_data)
+        await self._update_totals(conn, match_id, match_data)
+
+        return match_id
+
     async def _update_ratings(self, conn, match_data: Dict):
-        """Atualizar ratings dos jogadores"""
+        """Atualizar ratings dos jogadores com um único upsert via unnest"""
         try:
+            player_ids, changes, wins = [], [], []
             for player_stats in match_data['player_stats']:
-                # Calcular novo rating
-                rating_change = self._calculate_rating_change(
-                    player_stats,
-                    match_data['winner_team'] == player_stats['team']
-                )
+                won = match_data['winner_team'] == player_stats['team']
+                player_ids.append(player_stats['player_id'])
+                changes.append(self._calculate_rating_change(player_stats, won))
+                wins.append(1 if won else 0)
 
-                # Atualizar na base
-                await conn.execute("""
-                    INSERT INTO player_ratings (
-                        player_id, rating_type, rating, games_played, wins
-                    ) VALUES ($1, $2, 1000 + $3, 1, $4)
-                    ON CONFLICT (player_id, rating_type) DO UPDATE
-                    SET rating = player_ratings.rating + $3,
-                        games_played = player_ratings.games_played + 1,
-                        wins = player_ratings.wins + $4,
-                        last_update = CURRENT_TIMESTAMP
-                """, player_stats['player_id'], match_data['type'],
-                    rating_change, 
-                    1 if match_data['winner_team'] == player_stats['team'] else 0)
+            await conn.execute("""
+                INSERT INTO player_ratings (
+                    player_id, rating_type, rating, games_played, wins
+                )
+                SELECT r.player_id, $1, 1000 + r.change, 1, r.won
+                FROM unnest($2::bigint[], $3::float8[], $4::int[])
+                    AS r(player_id, change, won)
+                ON CONFLICT (player_id, rating_type) DO UPDATE
+                SET rating = player_ratings.rating + (EXCLUDED.rating - 1000),
+                    games_played = player_ratings.games_played + 1,
+                    wins = player_ratings.wins + EXCLUDED.wins,
+                    last_update = CURRENT_TIMESTAMP
+            """, match_data['type'], player_ids, changes, wins)
 
         except Exception as e:
             self.logger.logger.error(f"Erro ao atualizar ratings: {e}")
 
+    async def _update_totals(self, conn, match_id: int, match_data: Dict):
+        """Somar a partida em player_totals e player_map_totals"""
+        await conn.execute("""
+            INSERT INTO player_totals (
+                player_id, matches, wins, kills, deaths,
+                assists, headshots, mvps
+            )
+            SELECT
+                player_id, 1, CASE WHEN team = $2 THEN 1 ELSE 0 END,
+                kills, deaths, assists, headshots, mvps
+            FROM player_stats
+            WHERE match_id = $1
+            ON CONFLICT (player_id) DO UPDATE
+            SET matches = player_totals.matches + 1,
+                wins = player_totals.wins + EXCLUDED.wins,
+                kills = player_totals.kills + EXCLUDED.kills,
+                deaths = player_totals.deaths + EXCLUDED.deaths,
+                assists = player_totals.assists + EXCLUDED.assists,
+                headshots = player_totals.headshots + EXCLUDED.headshots,
+                mvps = player_totals.mvps + EXCLUDED.mvps
+        """, match_id, match_data['winner_team'])
+
+        if match_data['map']:
+            await conn.execute("""
+                INSERT INTO player_map_totals (player_id, map, matches)
+                SELECT player_id, $2, 1
+                FROM player_stats
+                WHERE match_id = $1
+                ON CONFLICT (player_id, map) DO UPDATE
+                SET matches = player_map_totals.matches + 1
+            """, match_id, match_data['map'])
+
     def _calculate_rating_change(self, stats: Dict, won: bool) -> float:
         """Calcular mudança de rating baseado na performance"""
         try:
@@ -186,91 +341,41 @@ class StatsManager:
             self.logger.logger.error(f"Erro ao calcular rating: {e}")
             return 0
 
+    @traced()
     async def get_player_stats(self, player_id: int) -> Optional[Dict]:
-        """Obter estatísticas completas do jogador"""
+        """Obter estatísticas completas do jogador (uma única ida ao banco)"""
         try:
             async with self.pool.acquire() as conn:
-                stats = {}
-                
-                # Ratings
-                ratings = await conn.fetch("""
-                    SELECT rating_type, rating, games_played, wins
-                    FROM player_ratings
-                    WHERE player_id = $1
-                """, player_id)
-                
-                stats['ratings'] = {
-                    r['rating_type']: {
-                        'rating': r['rating'],
-                        'games': r['games_played'],
-                        'wins': r['wins']
-                    } for r in ratings
+                with DB_QUERY_TIME.time(query='profile'):
+                    profile = await conn.fetchrow(PROFILE_QUERY, player_id)
+
+                stats = {
+                    'ratings': profile['ratings'],
+                    'matches': profile['matches'],
+                    'wins': profile['wins'],
+                    'kills': profile['kills'],
+                    'deaths': profile['deaths'],
+                    'assists': profile['assists'],
+                    'headshots': profile['headshots'],
+                    'mvps': profile['mvps'],
+                    'most_played_maps': [
+                        (map_name, count) for map_name, count in profile['maps']
+                    ]
                 }
 
-                # Estatísticas gerais
-                overall = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) as total_matches,
-                        SUM(CASE WHEN team = winner_team THEN 1 ELSE 0 END) as wins,
-                        SUM(kills) as total_kills,
-                        SUM(deaths) as total_deaths,
-                        SUM(assists) as total_assists,
-                        SUM(headshots) as total_headshots,
-                        SUM(mvps) as total_mvps
-                    FROM player_stats ps
-                    JOIN matches m ON ps.match_id = m.id
-                    WHERE player_id = $1
-                """, player_id)
-
-                if overall:
-                    stats.update({
-                        'matches': overall['total_matches'],
-                        'wins': overall['wins'],
-                        'kills': overall['total_kills'],
-                        'deaths': overall['total_deaths'],
-                        'assists': overall['total_assists'],
-                        'headshots': overall['total_headshots'],
-                        'mvps': overall['total_mvps']
-                    })
-
-                # Mapas mais jogados
-                maps = await conn.fetch("""
-                    SELECT map, COUNT(*) as count
-                    FROM player_stats ps
-                    JOIN matches m ON ps.match_id = m.id
-                    WHERE player_id = $1
-                    GROUP BY map
-                    ORDER BY count DESC
-                    LIMIT 3
-                """, player_id)
-
-                stats['most_played_maps'] = [
-                    (m['map'], m['count']) for m in maps
-                ]
-
                 return stats
 
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter stats do jogador: {e}")
             return None
 
+    @traced()
     async def get_top_players_by_map(self, map_name: str, limit: int = 5) -> List[Dict]:
         """Buscar melhores jogadores por mapa."""
         try:
             async with self.pool.acquire() as conn:
-                results = await conn.fetch("""
-                    SELECT 
-                        p.name AS player_name,
-                        ps.kills,
-                        ps.deaths,
-                        ps.headshots,
-                        ps.mvps
-                    FROM player_stats ps
-                    JOIN players p ON ps.player_id = p.id
-                    WHERE ps.map = $1
-                    ORDER BY ps.kills DESC, ps.headshots DESC
-                    LIMIT $2
-                """, map_name, limit)
+                with DB_QUERY_TIME.time(query='top_by_map'):
+                    results = await conn.fetch(TOP_PLAYERS_BY_MAP_QUERY, map_name, limit)
 
                 return [
                     {
@@ -288,35 +393,76 @@ class StatsManager:
             return []
 
     async def get_leaderboard(self, rating_type: str, limit: int = 10) -> List[Dict]:
-        """Obter ranking dos jogadores"""
+        """Obter ranking dos jogadores (primeira página)"""
+        page = await self.get_leaderboard_page(rating_type, limit)
+        return page['players']
+
+    @traced()
+    async def get_leaderboard_page(self,
+                                   rating_type: str,
+                                   limit: int = 10,
+                                   cursor: Optional[Tuple[float, int]] = None) -> Dict:
+        """Obter página do ranking por keyset.
+
+        `cursor` é o `next_cursor` da página anterior, ou seja, o par
+        (rating, player_id) do último jogador já exibido. Qualquer página
+        custa o mesmo que a primeira: uma leitura ordenada no índice a
+        partir do cursor.
+        """
+        key = (rating_type, limit, cursor)
+        cached = self._leaderboard_pages.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
         try:
             async with self.pool.acquire() as conn:
-                leaders = await conn.fetch("""
-                    SELECT 
-                        p.name,
-                        pr.rating,
-                        pr.games_played,
-                        pr.wins
-                    FROM player_ratings pr
-                    JOIN players p ON pr.player_id = p.id
-                    WHERE pr.rating_type = $1
-                    ORDER BY pr.rating DESC
-                    LIMIT $2
-                """, rating_type, limit)
-
-                return [
+                # Um registro a mais indica se existe próxima página
+                with DB_QUERY_TIME.time(query='leaderboard'):
+                    if cursor is None:
+                        rows = await conn.fetch(LEADERBOARD_QUERY, rating_type, limit + 1)
+                    else:
+                        rows = await conn.fetch(
+                            LEADERBOARD_AFTER_QUERY,
+                            rating_type, cursor[0], cursor[1], limit + 1
+                        )
+
+            rows, has_next = rows[:limit], len(rows) > limit
+            page = {
+                'players': [
                     {
+                        'player_id': l['player_id'],
                         'name': l['name'],
                         'rating': round(l['rating'], 2),
                         'games': l['games_played'],
                         'wins': l['wins']
-                    } for l in leaders
-                ]
+                    } for l in rows
+                ],
+                'next_cursor': (
+                    (rows[-1]['rating'], rows[-1]['player_id'])
+                    if has_next else None
+                )
+            }
+
+            self._store_leaderboard_page(key, page)
+            return page
 
         except Exception as e:
             self.logger.logger.error(f"Erro ao obter leaderboard: {e}")
-            return []
-        
+            return {'players': [], 'next_cursor': None}
+
+    def _store_leaderboard_page(self, key: Tuple, page: Dict):
+        """Guardar página no cache, descartando as expiradas"""
+        now = time.monotonic()
+        if len(self._leaderboard_pages) >= LEADERBOARD_CACHE_SIZE:
+            self._leaderboard_pages = {
+                k: v for k, v in self._leaderboard_pages.items() if v[0] > now
+            }
+        self._leaderboard_pages[key] = (now + self.leaderboard_ttl, page)
+
+    def invalidate_leaderboard(self):
+        """Descartar páginas do leaderboard em cache"""
+        self._leaderboard_pages.clear()
+
     async def get_rank_info(self, rating: float) -> Dict:
         """Obter informações sobre o rank atual."""
         ranks = [
@@ -0,0 +1,184 @@
+"""
+Telemetry - Counters, gauges and latency histograms (Prometheus format)
+Author: adamguedesmtm
+Created: 2025-02-27 09:12:35
+"""
+
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Buckets padrão de latência, em segundos (1ms a 30s)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    """Chave ordenada e imutável para um conjunto de labels"""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """Formatar labels como {a="1",b="2"}"""
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Valor instantâneo (pode subir e descer)"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Histograma com buckets fixos (contagens por bucket, soma e total)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # label -> [contagens por bucket (+Inf no fim), soma]
+        self._series: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Medir a duração do bloco `with`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas exportadas pelo processo"""
+
+    def __init__(self, prefix: str = 'cs2bot_'):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+
+    def _get_or_create(self, cls, name: str, documentation: str, **kwargs):
+        full_name = self.prefix + name
+        metric = self._metrics.get(full_name)
+        if metric is None:
+            metric = self._metrics[full_name] = cls(full_name, documentation, **kwargs)
+        elif type(metric) is not cls:
+            raise ValueError(f"Métrica {full_name} já registrada como {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str = '') -> Counter:
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name: str, documentation: str = '') -> Gauge:
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self,
+                  name: str,
+                  documentation: str = '',
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def render(self) -> str:
+        """Exportar no formato texto do Prometheus (0.0.4)"""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path: Path, text: str):
+    """Gravar exportação em arquivo de forma atômica (lido pelo /metrics da web)"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+# Registro padrão do bot
+REGISTRY = Registry()
+
+RCON_RTT = REGISTRY.histogram('rcon_rtt_seconds', 'Tempo de ida e volta de comandos RCON')
+RCON_ERRORS = REGISTRY.counter('rcon_errors_total', 'Comandos RCON que falharam')
+DB_QUERY_TIME = REGISTRY.histogram('db_query_seconds', 'Duração das consultas ao Postgres')
+DEMO_PARSE_TIME = REGISTRY.histogram('demo_parse_seconds', 'Duração do processamento de demos')
+CARD_RENDER_TIME = REGISTRY.histogram('card_render_seconds', 'Duração da geração de player cards')
+HEATMAP_RENDER_TIME = REGISTRY.histogram('heatmap_render_seconds', 'Duração da geração de heatmaps agregados')
+HEATMAP_CACHE = REGISTRY.counter('heatmap_cache_total', 'Pedidos de heatmap por resultado do cache (hit/miss)')
@@ -0,0 +1,120 @@
+"""
+Tracing - Opt-in spans for hot paths with a ring buffer of recent calls
+Author: adamguedesmtm
+Created: 2025-02-27 11:46:03
+"""
+
+import functools
+import heapq
+import inspect
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+# Span em andamento na task atual (para registrar o pai de spans aninhados)
+_current_span: ContextVar[Optional[str]] = ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """Coletor de spans (nome, duração, pai, erro).
+
+    Desligado por padrão: os decoradores só testam `enabled` e chamam a
+    função original. Ligado, cada chamada vira um span guardado em um
+    buffer circular das chamadas mais recentes, de onde saem as mais
+    lentas para o comando de admin.
+    """
+
+    def __init__(self, capacity: int = 500, enabled: bool = False):
+        self.enabled = enabled
+        self.spans: deque = deque(maxlen=capacity)
+
+    def configure(self, enabled: Optional[bool] = None, capacity: Optional[int] = None):
+        """Ligar/desligar e redimensionar o buffer (mantém os spans mais novos)"""
+        if capacity is not None and capacity != self.spans.maxlen:
+            self.spans = deque(self.spans, maxlen=capacity)
+        if enabled is not None:
+            self.enabled = enabled
+
+    def record(self, name: str, started_at: float, duration: float,
+               parent: Optional[str] = None, error: Optional[str] = None):
+        self.spans.append({
+            'name': name,
+            'started_at': started_at,
+            'duration': duration,
+            'parent': parent,
+            'error': error
+        })
+
+    @contextmanager
+    def span(self, name: str):
+        """Medir um bloco `with` como span (sem custo com o tracer desligado)"""
+        if not self.enabled:
+            yield
+            return
+
+        token = _current_span.set(name)
+        started_at = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.record(name, started_at, time.perf_counter() - start, _current_span.get(), error)
+
+    def slowest(self, limit: int = 10) -> List[Dict]:
+        """Chamadas mais lentas entre as recentes"""
+        return heapq.nlargest(limit, self.spans, key=lambda span: span['duration'])
+
+    def summary(self) -> Dict[str, Dict]:
+        """Contagem, média e máximo por nome de span"""
+        summary: Dict[str, Dict] = {}
+        for span in self.spans:
+            entry = summary.setdefault(span['name'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += span['duration']
+            entry['max'] = max(entry['max'], span['duration'])
+        for entry in summary.values():
+            entry['avg'] = entry.pop('total') / entry['count']
+        return summary
+
+    def clear(self):
+        self.spans.clear()
+
+
+# Tracer padrão do bot (configurado em main.py a partir de `tracing.*`)
+TRACER = Tracer()
+
+
+def traced(name: Optional[str] = None, tracer: Tracer = TRACER) -> Callable:
+    """Decorador que registra cada chamada da função como span.
+
+    Funciona com funções síncronas e corrotinas; o nome padrão é
+    `Classe.metodo`.
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
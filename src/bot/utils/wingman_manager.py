@@ -44,9 +44,11 @@ class WingmanManager:
             team2 = players[2:]
 
             # Configurar servidor
-            await self.rcon.execute("mp_teamsize 2")
-            await self.rcon.execute("mp_maxrounds 16")
-            await self.rcon.execute("mp_overtime_enable 1")
+            await self.rcon.execute_many([
+                "mp_teamsize 2",
+                "mp_maxrounds 16",
+                "mp_overtime_enable 1"
+            ])
             
             # Gerar senha única
             match_password = f"wm_{match_id}"
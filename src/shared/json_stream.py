@@ -0,0 +1,263 @@
+"""
+JSON Stream - Incremental parsing of large JSON documents
+Author: adamguedesmtm
+Created: 2025-02-27 18:31:09
+"""
+
+import asyncio
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Tamanho dos blocos lidos de arquivos/pipes
+CHUNK_SIZE = 64 * 1024
+
+# Descartar o início já consumido do buffer a partir deste tamanho
+_COMPACT_AT = 256 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+Event = Tuple[str, Any]
+
+
+def _prefixes(paths: Iterable[str]) -> set:
+    """Todos os caminhos intermediários ('' é a raiz): 'a.b.c' -> {'', 'a', 'a.b'}"""
+    prefixes = set()
+    for path in paths:
+        parts = path.split('.')
+        for i in range(len(parts)):
+            prefixes.add('.'.join(parts[:i]))
+    return prefixes
+
+
+def _child(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+class JSONStreamParser:
+    """Parser incremental de um documento JSON, alimentado por blocos.
+
+    Emite eventos `(caminho, valor)` sem montar o documento inteiro:
+
+    - arrays em `stream` (ex.: 'positions.kills') têm cada elemento
+      emitido separadamente, com o caminho do array;
+    - valores em `keep` (ou todos, se `keep` for None) são emitidos
+      inteiros;
+    - o resto é percorrido e descartado.
+
+    A memória fica limitada ao maior elemento individual, não ao tamanho
+    do documento.
+    """
+
+    def __init__(self, stream: Iterable[str] = (), keep: Optional[Iterable[str]] = None):
+        self.stream = set(stream)
+        self.keep = None if keep is None else set(keep)
+        self._descend = _prefixes(self.stream)
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+
+        self._buf = ''
+        self._pos = 0
+        # Só tentar decodificar de novo um valor incompleto quando o buffer
+        # crescer (evita reprocessar o mesmo trecho a cada bloco)
+        self._need = 0
+        # Pilha de containers abertos: [tipo, caminho, modo, estado, chave]
+        self._stack: List[List] = []
+        self._done = False
+        self._events: List[Event] = []
+
+    def feed(self, data) -> List[Event]:
+        """Adicionar bloco (bytes ou str) e devolver os eventos completos"""
+        self._buf += self._text.decode(data) if isinstance(data, bytes) else data
+        if len(self._buf) - self._pos >= self._need:
+            self._parse(eof=False)
+        return self._take_events()
+
+    def close(self) -> List[Event]:
+        """Finalizar; falha se o documento estiver incompleto"""
+        self._buf += self._text.decode(b'', final=True)
+        self._parse(eof=True)
+        if not self._done:
+            raise ValueError("JSON incompleto")
+        return self._take_events()
+
+    def _take_events(self) -> List[Event]:
+        events, self._events = self._events, []
+        return events
+
+    def _decode(self, eof: bool) -> Tuple[bool, Any]:
+        """Decodificar um valor completo na posição atual"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"JSON inválido: {e}") from None
+            self._need = 2 * (len(self._buf) - self._pos)
+            return False, None
+
+        if not eof and (
+            end == len(self._buf)
+            or (isinstance(value, (int, float)) and self._buf[end] in '.eE+-')
+        ):
+            # Número cortado no fim do bloco ('12' de '123', '1.' de '1.5')
+            self._need = len(self._buf) - self._pos + 1
+            return False, None
+
+        self._pos = end
+        self._need = 0
+        return True, value
+
+    def _value(self, path: str, mode: str, eof: bool) -> bool:
+        """Tratar o valor que começa na posição atual"""
+        char = self._buf[self._pos]
+
+        if mode == 'stream':
+            # Elemento de array em streaming: emitido inteiro
+            complete, value = self._decode(eof)
+            if complete:
+                self._events.append((path, value))
+            return complete
+
+        if mode == 'skip' or not (
+            (path in self.stream and char == '[')
+            or (path in self._descend and char == '{')
+            or self.keep is None or path in self.keep
+        ):
+            if char in '{[':
+                self._open(char, path, 'skip')
+                return True
+            complete, _ = self._decode(eof)
+            return complete
+
+        if path in self.stream and char == '[':
+            self._open(char, path, 'stream')
+            return True
+        if path in self._descend and char == '{':
+            self._open(char, path, 'descend')
+            return True
+
+        complete, value = self._decode(eof)
+        if complete:
+            self._events.append((path, value))
+        return complete
+
+    def _open(self, char: str, path: str, mode: str):
+        kind = 'object' if char == '{' else 'array'
+        self._stack.append([kind, path, mode, 'start', None])
+        self._pos += 1
+
+    def _close(self):
+        self._stack.pop()
+        self._pos += 1
+        if not self._stack:
+            self._done = True
+        else:
+            self._stack[-1][3] = 'next'
+
+    def _parse(self, eof: bool):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos >= len(self._buf):
+                break
+            char = self._buf[self._pos]
+
+            if self._done:
+                raise ValueError(f"Dados após o fim do JSON: {char!r}")
+
+            if not self._stack:
+                if not self._value('', 'descend', eof):
+                    break
+                if not self._stack:
+                    self._done = True
+                continue
+
+            frame = self._stack[-1]
+            kind, path, mode, state, key = frame
+
+            if state == 'next':
+                if char == ',':
+                    frame[3] = 'key' if kind == 'object' else 'value'
+                    self._pos += 1
+                elif char == ('}' if kind == 'object' else ']'):
+                    self._close()
+                else:
+                    raise ValueError(f"JSON inválido: {char!r} inesperado")
+                continue
+
+            if kind == 'object':
+                if state == 'start' and char == '}':
+                    self._close()
+                elif state in ('start', 'key'):
+                    if char != '"':
+                        raise ValueError(f"JSON inválido: chave esperada, {char!r}")
+                    complete, key = self._decode(eof)
+                    if not complete:
+                        break
+                    frame[3], frame[4] = 'colon', key
+                elif state == 'colon':
+                    if char != ':':
+                        raise ValueError(f"JSON inválido: ':' esperado, {char!r}")
+                    frame[3] = 'value'
+                    self._pos += 1
+                else:
+                    # Marcar como lido antes: o valor pode abrir outro container
+                    frame[3] = 'next'
+                    if not self._value(_child(path, key), mode, eof):
+                        frame[3] = 'value'
+                        break
+            else:
+                if state == 'start' and char == ']':
+                    self._close()
+                else:
+                    frame[3] = 'next'
+                    if not self._value(path, mode, eof):
+                        frame[3] = 'value'
+                        break
+
+        if self._pos >= _COMPACT_AT:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+
+
+def iter_file(path, stream: Iterable[str] = (), keep: Optional[Iterable[str]] = None,
+              chunk_size: int = CHUNK_SIZE) -> Iterator[Event]:
+    """Eventos de um arquivo JSON, lido em blocos"""
+    parser = JSONStreamParser(stream, keep)
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_stream(reader, stream: Iterable[str] = (), keep: Optional[Iterable[str]] = None,
+                       chunk_size: int = CHUNK_SIZE) -> AsyncIterator[Event]:
+    """Eventos de um asyncio.StreamReader (ex.: stdout de um subprocesso).
+
+    Cada bloco é tokenizado em uma thread: a saída pode ter centenas de MB
+    e o loop continua livre entre um bloco e outro.
+    """
+    parser = JSONStreamParser(stream, keep)
+    while chunk := await reader.read(chunk_size):
+        for event in await asyncio.to_thread(parser.feed, chunk):
+            yield event
+    for event in await asyncio.to_thread(parser.close):
+        yield event
+
+
+def iter_document(document: Dict, stream: Iterable[str] = (),
+                  keep: Optional[Iterable[str]] = None, path: str = '') -> Iterator[Event]:
+    """Mesmos eventos a partir de um documento já carregado"""
+    stream = set(stream)
+    keep = None if keep is None else set(keep)
+    descend = _prefixes(stream)
+
+    for key, value in document.items():
+        child = _child(path, key)
+        if child in stream and isinstance(value, list):
+            for item in value:
+                yield child, item
+        elif child in descend and isinstance(value, dict):
+            yield from iter_document(value, stream, keep, child)
+        elif keep is None or child in keep:
+            yield child, value
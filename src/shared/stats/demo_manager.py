@@ -8,9 +8,14 @@ import asyncio
 import subprocess
 from pathlib import Path
 from typing import Dict, List, Optional
-import json
 from datetime import datetime
 from ...web.models.stats import MatchStats, MapStats, PlayerStats, RoundStats
+from ..json_stream import iter_file
+
+# Campos do analysis.json usados; o resto (posições, eventos) é descartado
+# durante a leitura
+ANALYSIS_STREAM = ('rounds', 'players')
+ANALYSIS_KEEP = ('matchStartTime', 'matchId', 'mapName', 'scoreTeams', 'matchDuration')
 
 class DemoManager:
     def __init__(self, cs_demo_manager_path: str, demos_dir: str):
@@ -43,8 +48,10 @@ class DemoManager:
             if process.returncode != 0:
                 raise Exception(f"Erro ao processar demo: {stderr.decode()}")
 
-            with open(output_dir / "analysis.json") as f:
-                analysis = json.load(f)
+            # Leitura em streaming (em thread): o arquivo pode ter centenas de MB
+            analysis = await asyncio.to_thread(
+                self._load_analysis, output_dir / "analysis.json"
+            )
 
             return await self._convert_analysis(analysis, demo_path)
 
@@ -52,38 +59,45 @@ class DemoManager:
             print(f"Erro ao processar demo {demo_path}: {e}")
             return None
 
+    def _load_analysis(self, analysis_file: Path) -> Dict:
+        """Ler analysis.json em blocos, convertendo rounds e jogadores um a um"""
+        analysis = {'rounds': [], 'players': []}
+
+        for path, value in iter_file(analysis_file, ANALYSIS_STREAM, ANALYSIS_KEEP):
+            if path == 'rounds':
+                analysis['rounds'].append(RoundStats(
+                    round_number=value["number"],
+                    winner_side=value["winnerSide"],
+                    win_type=value["winType"],
+                    duration=value["duration"],
+                    winning_play=value.get("winningPlay")
+                ))
+            elif path == 'players':
+                analysis['players'].append(PlayerStats(
+                    steam_id=value["steamId"],
+                    name=value["name"],
+                    kills=value["kills"],
+                    deaths=value["deaths"],
+                    assists=value["assists"],
+                    kd_ratio=value["kdRatio"],
+                    hs_percentage=value["headshotPercentage"],
+                    adr=value["averageDamagePerRound"],
+                    kast=value["kast"],
+                    rating=value["rating"]
+                ))
+            else:
+                analysis[path] = value
+
+        return analysis
+
     async def _convert_analysis(self, analysis: Dict, demo_path: str) -> MatchStats:
         """Converter análise do CS Demo Manager para nosso formato"""
         try:
             match_date = datetime.fromtimestamp(analysis["matchStartTime"])
             match_type = self._determine_match_type(analysis)
 
-            rounds = []
-            for round_data in analysis["rounds"]:
-                round_stats = RoundStats(
-                    round_number=round_data["number"],
-                    winner_side=round_data["winnerSide"],
-                    win_type=round_data["winType"],
-                    duration=round_data["duration"],
-                    winning_play=round_data.get("winningPlay")
-                )
-                rounds.append(round_stats)
-
-            players = []
-            for player_data in analysis["players"]:
-                player_stats = PlayerStats(
-                    steam_id=player_data["steamId"],
-                    name=player_data["name"],
-                    kills=player_data["kills"],
-                    deaths=player_data["deaths"],
-                    assists=player_data["assists"],
-                    kd_ratio=player_data["kdRatio"],
-                    hs_percentage=player_data["headshotPercentage"],
-                    adr=player_data["averageDamagePerRound"],
-                    kast=player_data["kast"],
-                    rating=player_data["rating"]
-                )
-                players.append(player_stats)
+            rounds = analysis["rounds"]
+            players = analysis["players"]
 
             map_stats = MapStats(
                 map_name=analysis["mapName"],
@@ -0,0 +1,63 @@
+"""
+Heatmap API - Aggregated map heatmaps as PNG
+Author: adamguedesmtm
+Created: 2025-02-28 16:48:20
+"""
+
+import asyncio
+from fastapi import APIRouter, HTTPException, Response
+from typing import Optional
+from ...bot.utils.database import DatabaseManager
+from ...bot.utils.heatmap import LAYERS, SIDES
+from ...bot.utils.heatmap_store import HeatmapStore
+from ..config import settings
+
+router = APIRouter()
+heatmap_store = HeatmapStore(
+    DatabaseManager(settings.database),
+    cache_size=settings.HEATMAP_CACHE_SIZE,
+    radar_dir=str(settings.RADAR_DIR)
+)
+# Pool criado no primeiro pedido (o resto do site funciona sem o banco)
+_db_lock = asyncio.Lock()
+
+async def _ensure_database():
+    if heatmap_store.db.pool is not None:
+        return
+    async with _db_lock:
+        # Outro pedido pode ter aberto o pool enquanto este esperava
+        if heatmap_store.db.pool is not None:
+            return
+        try:
+            await heatmap_store.db.init()
+        except Exception:
+            # Pool parcial (ex.: migração falhou): tentar de novo no próximo pedido
+            await heatmap_store.db.close()
+            raise HTTPException(503, "Banco de dados indisponível")
+
+@router.get("/{map_name}/{layer}.png")
+async def get_heatmap(map_name: str, layer: str, side: Optional[str] = None, last: Optional[int] = None):
+    """Heatmap de um mapa (camada, lado CT/T e últimas N partidas opcionais)"""
+    if layer not in LAYERS:
+        raise HTTPException(400, f"Camada deve ser uma de: {', '.join(LAYERS)}")
+    if side is not None and side.upper() not in SIDES:
+        raise HTTPException(400, "Lado deve ser CT ou T")
+    if last is not None and last <= 0:
+        raise HTTPException(400, "last deve ser positivo")
+
+    await _ensure_database()
+    result = await heatmap_store.render(
+        map_name,
+        layer,
+        side=side.upper() if side else None,
+        last=last
+    )
+    if not result:
+        raise HTTPException(404, f"Nenhum heatmap registrado para {map_name}")
+
+    image, matches = result
+    return Response(
+        content=image,
+        media_type="image/png",
+        headers={"X-Heatmap-Matches": str(matches)}
+    )
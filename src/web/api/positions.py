@@ -0,0 +1,61 @@
+"""
+Positions API - Tick-range access to match position data
+Author: adamguedesmtm
+Created: 2025-03-01 14:12:36
+"""
+
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional
+from ...bot.utils.positions import PositionStore
+from ..config import settings
+
+router = APIRouter()
+position_store = PositionStore(str(settings.POSITIONS_DIR))
+
+def _open(match_id: str):
+    try:
+        return position_store.open(match_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except FileNotFoundError:
+        raise HTTPException(404, f"Partida {match_id} sem posições")
+
+@router.get("/{match_id}")
+async def get_position_rounds(match_id: str):
+    """Rounds com posições, jogadores e armas da partida"""
+    position_file = _open(match_id)
+    return JSONResponse({
+        "match_id": match_id,
+        "players": position_file.players,
+        "weapons": position_file.weapons,
+        "rounds": position_store.rounds(match_id)
+    })
+
+@router.get("/{match_id}/{round_number}")
+async def get_positions(match_id: str, round_number: int,
+                        start_tick: Optional[int] = None, end_tick: Optional[int] = None):
+    """Posições de todos os jogadores na round entre start_tick e end_tick"""
+    position_file = _open(match_id)
+    if round_number not in position_file.rounds:
+        raise HTTPException(404, f"Round {round_number} sem posições")
+
+    # Conferir o tamanho pela coluna de ticks antes de ler o resto
+    samples = position_store.count(match_id, round_number, start_tick, end_tick)
+    if samples > settings.MAX_POSITION_SAMPLES:
+        raise HTTPException(
+            413,
+            f"Intervalo com {samples} amostras (máximo {settings.MAX_POSITION_SAMPLES}); "
+            f"use start_tick/end_tick"
+        )
+
+    columns = await asyncio.to_thread(
+        position_store.positions, match_id, round_number, start_tick, end_tick
+    )
+    return JSONResponse({
+        "match_id": match_id,
+        "round": round_number,
+        "samples": samples,
+        "columns": {name: values.tolist() for name, values in columns.items()}
+    })
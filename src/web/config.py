@@ -12,7 +12,22 @@ class Settings(BaseSettings):
     BASE_DIR: Path = Path(__file__).parent.parent.parent
     DEMOS_DIR: Path = BASE_DIR / "data" / "demos"
     ANALYSIS_DIR: Path = BASE_DIR / "data" / "analysis"
+    # Exportação do bot (MetricsManager grava em src/data/metrics.prom)
+    METRICS_FILE: Path = BASE_DIR / "src" / "data" / "metrics.prom"
     
+    # Banco de dados (o mesmo do bot; usado pelos heatmaps)
+    DB_HOST: str = "localhost"
+    DB_PORT: int = 5432
+    DB_NAME: str = "cs2bot"
+    DB_USER: str = "cs2bot"
+    DB_PASSWORD: str = ""
+    # Radares dos mapas (fundo dos heatmaps) e PNGs mantidos em cache
+    RADAR_DIR: Path = Path("/opt/cs2server/assets/radars")
+    HEATMAP_CACHE_SIZE: int = 64
+    # Arquivos de posições gravados pelo bot (DemoManager)
+    POSITIONS_DIR: Path = Path("/opt/cs2server/demos/positions")
+    MAX_POSITION_SAMPLES: int = 100_000
+
     # CS Demo Manager
     CS_DEMO_MANAGER_PATH: str = "/usr/local/bin/cs-demo-manager"
     
@@ -28,6 +43,17 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 100 * 1024 * 1024  # 100MB
     MAX_CONCURRENT_UPLOADS: int = 3
     
+    @property
+    def database(self) -> dict:
+        """Configuração no formato do DatabaseManager do bot"""
+        return {
+            'host': self.DB_HOST,
+            'port': self.DB_PORT,
+            'name': self.DB_NAME,
+            'user': self.DB_USER,
+            'password': self.DB_PASSWORD
+        }
+
     class Config:
         env_prefix = "CS2STATS_"
 
@@ -7,10 +7,15 @@ Created: 2025-02-21 15:15:42
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pathlib import Path
 import uvicorn
-from .api import demos
+from .api import demos, heatmaps, positions
+from .config import settings
+
+# Content type do formato texto do Prometheus
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOCAL_CLIENTS = {"127.0.0.1", "::1", "localhost"}
 
 app = FastAPI(
     title="CS2 Stats",
@@ -27,6 +32,13 @@ templates = Jinja2Templates(directory=str(templates_path))
 
 # Adicionar rotas da API
 app.include_router(demos.router, prefix="/api/demos", tags=["demos"])
+app.include_router(heatmaps.router, prefix="/api/heatmaps", tags=["heatmaps"])
+app.include_router(positions.router, prefix="/api/positions", tags=["positions"])
+
+@app.on_event("shutdown")
+async def close_database():
+    """Fechar pool do banco usado pelos heatmaps"""
+    await heatmaps.heatmap_store.db.close()
 
 @app.get("/")
 async def home(request: Request):
@@ -36,6 +48,19 @@ async def home(request: Request):
         {"request": request, "title": "CS2 Stats"}
     )
 
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Métricas do bot no formato Prometheus (apenas acesso local)"""
+    if not request.client or request.client.host not in LOCAL_CLIENTS:
+        return PlainTextResponse("Acesso negado\n", status_code=403)
+
+    try:
+        content = settings.METRICS_FILE.read_text()
+    except FileNotFoundError:
+        return PlainTextResponse("Métricas indisponíveis (bot parado?)\n", status_code=503)
+
+    return PlainTextResponse(content, media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
 